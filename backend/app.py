@@ -2,15 +2,24 @@ import eventlet
 eventlet.monkey_patch()
 
 import os
+from dotenv import load_dotenv
+
+# Load environment variables before any project import: services, routes and
+# extensions read their settings from os.environ at module level
+load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+
+import time
 import logging
 import sys
-from flask import Flask
+
+_import_started = time.perf_counter()
+from flask import Flask, Response, request, send_from_directory
+from werkzeug.middleware.proxy_fix import ProxyFix
 from extensions import db, jwt, mail, limiter, socketio, cors, migrate, init_extensions
 from routes.auth import auth_bp
 from routes.book import book_bp
 from routes.user import user_bp
 from routes.message import message_bp, init_socketio, register_socketio_events
-from routes.bot import bot_bp, init_rag_chatbot
 from routes.admin import admin_bp
 from models.user import User
 from models.book import Book
@@ -32,8 +41,28 @@ from models.chat_room_member import ChatRoomMember
 from models.recommendation import Recommendation
 from models.favorite import Favorite
 from models.post import Post
+from models.daily_stat import DailyStat
+from models.daily_room_stat import DailyRoomStat
+from models.image_asset import ImageAsset
+from models.view_history_daily import ViewHistoryDaily
+from services.jobs import jobs
+from services.worker_bus import worker_bus
+from services.stats_rollup import refresh_daily_stats, ROLLUP_INTERVAL
+from services.book_popularity import refresh_book_popularity, REFRESH_INTERVAL as POPULARITY_REFRESH_INTERVAL
+from services.distinct_metrics import distinct_metrics, FLUSH_INTERVAL as SKETCH_FLUSH_INTERVAL
+from models.activity_sketch import ActivitySketch
+from services.system_stats import system_stats, REFRESH_INTERVAL as SYSTEM_STATS_REFRESH_INTERVAL
+from services.identity_cache import identity_cache, validate_token_lifetime, POLL_INTERVAL as IDENTITY_POLL_INTERVAL
+from services.refresh_tokens import cleanup_refresh_tokens, ACCESS_TOKEN_LIFETIME, CLEANUP_INTERVAL as TOKEN_CLEANUP_INTERVAL
+from services.view_history import maintain_view_history, MAINTENANCE_INTERVAL as VIEW_HISTORY_MAINTENANCE_INTERVAL
+from services.storage import STORAGE_BACKEND, LOCAL_ROOT, LOCAL_PUBLIC_URL
 from utils.error_handler import create_error_response
-from dotenv import load_dotenv
+from utils.log_config import configure_logging
+from utils.db import log_slow_queries
+from middleware.logging import init_request_metrics
+from services.database import database_config, init_engines, init_read_routing, replica_monitor, REPLICA_URL, REPLICA_CHECK_INTERVAL
+from services.loading import init_nplusone_detector
+from services.metrics import metrics
 from sqlalchemy.sql import text
 from routes.chat_room import chat_room_bp
 from routes.post import post_bp
@@ -41,19 +70,30 @@ from routes.post import post_bp
 # Ensure the backend directory is in sys.path
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s'
-)
+# Configure logging (JSON, written by a background listener; see utils/log_config.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Load environment variables explicitly
-load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
+# The chatbot pulls in torch / sentence_transformers / chromadb; with it
+# disabled, routes/bot.py is never imported
+CHATBOT_ENABLED = os.getenv('CHATBOT_ENABLED', 'true').lower() == 'true'
+# Load the chatbot in the background right after startup instead of on first use
+CHATBOT_PRELOAD = os.getenv('CHATBOT_PRELOAD', 'false').lower() == 'true'
+# Reverse proxies in front of the app (Render: 1). request.remote_addr,
+# scheme and host come from their X-Forwarded-* headers; 0 trusts none
+PROXY_FIX_HOPS = int(os.getenv('PROXY_FIX_HOPS', 0))
+
+_imports_done = time.perf_counter()
 
 def create_app():
     """Create and configure the Flask application"""
+    started = time.perf_counter()
     app = Flask(__name__)
+    if PROXY_FIX_HOPS > 0:
+        # Client IPs key rate limits and logs; behind a proxy remote_addr is the proxy
+        app.wsgi_app = ProxyFix(
+            app.wsgi_app, x_for=PROXY_FIX_HOPS, x_proto=PROXY_FIX_HOPS, x_host=PROXY_FIX_HOPS
+        )
 
     # Load configuration from .env
     database_url = os.getenv('DATABASE_URL')
@@ -66,14 +106,8 @@ def create_app():
         JWT_SECRET_KEY=os.getenv('JWT_SECRET_KEY'),
         SQLALCHEMY_DATABASE_URI=database_url,
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
-        SQLALCHEMY_ECHO=True,
-        SQLALCHEMY_ENGINE_OPTIONS={
-            'pool_pre_ping': True,
-            'pool_recycle': 1800,
-            'connect_args': {
-                'sslmode': 'require' if os.getenv('FLASK_ENV') == 'production' else 'disable'
-            }
-        },
+        # Pool sizing, per-role timeouts, replica/analytics binds (services/database.py)
+        **database_config(database_url),
         MAIL_SERVER=os.getenv('MAIL_SERVER'),
         MAIL_PORT=int(os.getenv('MAIL_PORT', 587)),
         MAIL_USE_TLS=True,
@@ -92,6 +126,14 @@ def create_app():
             logger.error(f"Missing required configuration: {config}")
             raise ValueError(f"Missing required configuration: {config}")
 
+    # Claims-based authorization is only safe while access tokens expire within
+    # the identity cache's version window (services/identity_cache.py)
+    try:
+        validate_token_lifetime(ACCESS_TOKEN_LIFETIME)
+    except ValueError as e:
+        logger.error(str(e))
+        raise
+
     # Initialize extensions
     try:
         init_extensions(app)
@@ -106,7 +148,9 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(book_bp, url_prefix='/api/books')
     app.register_blueprint(user_bp, url_prefix='/api/users')
-    app.register_blueprint(bot_bp, url_prefix='/api')
+    if CHATBOT_ENABLED:
+        from routes.bot import bot_bp
+        app.register_blueprint(bot_bp, url_prefix='/api')
     app.register_blueprint(message_bp, url_prefix='/api')
     app.register_blueprint(chat_room_bp, url_prefix='/api')
     app.register_blueprint(post_bp, url_prefix='/api')
@@ -116,24 +160,40 @@ def create_app():
     # Initialize SocketIO
     init_socketio(socketio)
     register_socketio_events(socketio)
+    # Per-worker state (compact sessions, message cache) hears about other workers' changes
+    worker_bus.start(socketio)
     logger.info("SocketIO events registered successfully")
 
-    # Create database tables if they don't exist
+    # Opt-in slow query log (SLOW_QUERY_MS) instead of echoing every statement
     with app.app_context():
-        try:
-            db.create_all()
-            logger.info("Database tables created successfully")
-        except Exception as e:
-            logger.error(f"Failed to create database tables: {e}")
-            raise
+        init_engines(db.engines)
+        for engine in db.engines.values():
+            log_slow_queries(engine)
+        # Per-request query count / DB time / spans -> Server-Timing and /metrics
+        init_request_metrics(app, db.engines.values())
+    init_read_routing(app)
+    # NPLUSONE_DETECT=log|raise: report relationships lazy-loaded per row
+    init_nplusone_detector(app, db.session)
 
-    # Initialize rag_chatbot
-    try:
-        app.rag_chatbot = init_rag_chatbot()
-        logger.info("RAG chatbot initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize RAG chatbot: {e}")
-        app.rag_chatbot = None
+    # Schema is managed by Alembic (flask db upgrade), not created on boot
+
+    # Background jobs
+    jobs.register('daily_stats_rollup', ROLLUP_INTERVAL, refresh_daily_stats, initial_delay=5)
+    jobs.register('book_popularity_refresh', POPULARITY_REFRESH_INTERVAL, refresh_book_popularity, initial_delay=15)
+    jobs.register('activity_sketch_flush', SKETCH_FLUSH_INTERVAL, distinct_metrics.flush, initial_delay=10, exclusive=False)
+    jobs.register('system_stats_refresh', SYSTEM_STATS_REFRESH_INTERVAL, system_stats.refresh, initial_delay=20, exclusive=False)
+    jobs.register('identity_version_poll', IDENTITY_POLL_INTERVAL, identity_cache.poll, exclusive=False)
+    jobs.register('refresh_token_cleanup', TOKEN_CLEANUP_INTERVAL, cleanup_refresh_tokens, initial_delay=60)
+    jobs.register('view_history_maintenance', VIEW_HISTORY_MAINTENANCE_INTERVAL, maintain_view_history, initial_delay=30)
+    if REPLICA_URL:
+        jobs.register('replica_health_check', REPLICA_CHECK_INTERVAL, replica_monitor.check, exclusive=False)
+    jobs.start(app, socketio)
+    logger.info("Background jobs started")
+
+    # rag_chatbot is initialized on first use (routes/bot.py get_chatbot, in a native thread)
+    if CHATBOT_ENABLED and CHATBOT_PRELOAD:
+        from routes.bot import get_chatbot
+        socketio.start_background_task(get_chatbot)
 
     # JWT error handlers
     @jwt.unauthorized_loader
@@ -154,12 +214,27 @@ def create_app():
         logger.error(f"Unhandled error: {e}")
         return create_error_response(str(e), 500)
 
+    # Local storage backend: serve uploaded assets from disk
+    if STORAGE_BACKEND == 'local' and LOCAL_PUBLIC_URL.startswith('/'):
+        @app.route(f"{LOCAL_PUBLIC_URL.rstrip('/')}/<path:path>", methods=['GET'])
+        def serve_upload(path):
+            return send_from_directory(LOCAL_ROOT, path)
+
+    # Prometheus metrics (this worker only); set METRICS_TOKEN to require a bearer token
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        token = os.getenv('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return create_error_response('Unauthorized', 401)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
     # Health check route
     @app.route('/health', methods=['GET'])
     def health_check():
         try:
             db.session.execute(text("SELECT 1"))
-            vector_db_stats = app.rag_chatbot.get_vector_db_stats() if app.rag_chatbot else {}
+            rag_chatbot = sys.modules['routes.bot'].chatbot if CHATBOT_ENABLED else None
+            vector_db_stats = rag_chatbot.get_vector_db_stats() if rag_chatbot else {}
             return {
                 'status': 'success',
                 'message': 'Server is running',
@@ -169,7 +244,11 @@ def create_app():
         except Exception as e:
             logger.error(f"Health check error: {e}")
             return create_error_response(str(e), 500)
-    
+
+    logger.info(
+        f"App ready in {(time.perf_counter() - started) * 1000:.0f}ms "
+        f"(imports {(_imports_done - _import_started) * 1000:.0f}ms, chatbot {'enabled' if CHATBOT_ENABLED else 'disabled'})"
+    )
     return app
 
 if __name__ == '__main__':
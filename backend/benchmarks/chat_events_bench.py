@@ -0,0 +1,83 @@
+# benchmarks/chat_events_bench.py
+"""
+Outbound packet count for typing/presence events: per-event broadcast vs the
+tick-based coalescer in services/chat_events.py.
+
+Every room broadcast costs one packet per connected member, so the numbers
+below are room broadcasts multiplied by room size.
+
+Usage:
+    python benchmarks/chat_events_bench.py --members 200 --typists 5 --seconds 30
+"""
+import sys
+import os
+import argparse
+import random
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chat_events import ChatEventCoalescer
+
+
+def simulate(members, typists, keystrokes_per_sec, joins_per_sec, seconds, tick_ms):
+    room_id = 1
+    coalescer = ChatEventCoalescer(tick_ms=tick_ms)
+    rng = random.Random(42)
+
+    # Build a time-ordered event stream
+    events = []
+    for user_id in range(typists):
+        t = rng.random() / keystrokes_per_sec
+        while t < seconds:
+            events.append((t, 'typing', user_id))
+            t += rng.expovariate(keystrokes_per_sec)
+    t = 0.0
+    next_user = typists
+    while joins_per_sec and t < seconds:
+        t += rng.expovariate(joins_per_sec)
+        events.append((t, 'join', next_user))
+        next_user += 1
+    events.sort()
+
+    legacy_broadcasts = 0
+    coalesced_broadcasts = 0
+    next_tick = coalescer.tick
+    for t, kind, user_id in events:
+        while t >= next_tick:
+            coalesced_broadcasts += len(coalescer.flush(now=next_tick))
+            next_tick += coalescer.tick
+        legacy_broadcasts += 1
+        if kind == 'typing':
+            coalescer.set_typing(room_id, user_id, f'user{user_id}', True, now=t)
+        else:
+            coalescer.user_online(room_id, user_id, f'user{user_id}')
+    while next_tick <= seconds + coalescer.typing_ttl:
+        coalesced_broadcasts += len(coalescer.flush(now=next_tick))
+        next_tick += coalescer.tick
+
+    return legacy_broadcasts * members, coalesced_broadcasts * members
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--typists', type=int, default=5)
+    parser.add_argument('--keystrokes-per-sec', type=float, default=4.0)
+    parser.add_argument('--joins-per-sec', type=float, default=1.0)
+    parser.add_argument('--seconds', type=int, default=30)
+    parser.add_argument('--tick-ms', type=int, default=500)
+    args = parser.parse_args()
+
+    legacy, coalesced = simulate(
+        args.members, args.typists, args.keystrokes_per_sec,
+        args.joins_per_sec, args.seconds, args.tick_ms
+    )
+    print(f"Room of {args.members} members, {args.typists} typists @ {args.keystrokes_per_sec}/s, "
+          f"{args.joins_per_sec} joins/s, {args.seconds}s, tick {args.tick_ms}ms")
+    print(f"  per-event broadcast : {legacy:>10,} packets ({legacy / args.seconds:,.0f}/s)")
+    print(f"  coalesced           : {coalesced:>10,} packets ({coalesced / args.seconds:,.0f}/s)")
+    if coalesced:
+        print(f"  reduction           : {legacy / coalesced:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/chat_payload_bench.py
+"""
+Bytes and encode time per 1,000 ``new_message`` events for the full JSON
+payload vs the compact protocol in services/chat_protocol.py (JSON and, if
+installed, MessagePack).
+
+Compact numbers include the one-off ``users`` dictionary entries a fresh
+connection receives for every distinct author.
+
+Usage:
+    python benchmarks/chat_payload_bench.py --messages 1000 --authors 50
+"""
+import sys
+import os
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chat_protocol import compact_message, compact_user
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def make_messages(count, authors):
+    rng = random.Random(7)
+    words = "the quick brown fox jumps over a lazy dog while reading books together".split()
+    users = [{
+        'id': i,
+        'username': f'reader_{i}',
+        'avatar_url': f'https://example.supabase.co/storage/v1/object/public/user-assets/avatars/avatar_{i}_1730000000.webp',
+        'role': 'member',
+        'is_banned': False
+    } for i in range(1, authors + 1)]
+    start = datetime(2026, 10, 1, 12, 0, 0)
+    messages = []
+    for i in range(count):
+        created = (start + timedelta(seconds=i * 7)).isoformat()
+        messages.append({
+            'id': 10000 + i,
+            'content': " ".join(rng.choice(words) for _ in range(rng.randint(3, 20))),
+            'image_url': '',
+            'room_id': 1,
+            'parent_id': None,
+            'is_deleted': False,
+            'replies_count': 0,
+            'created_at': created,
+            'updated_at': created,
+            'user': rng.choice(users)
+        })
+    return messages
+
+
+def encode_json(obj):
+    # python-socketio uses the stdlib json module for packets
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def measure(label, messages, encode, compact):
+    seen = set()
+    total = 0
+    started = time.perf_counter()
+    for data in messages:
+        if compact:
+            user = data['user']
+            if user['id'] not in seen:
+                seen.add(user['id'])
+                total += len(encode([compact_user(user)]))
+            total += len(encode(compact_message(data)))
+        else:
+            total += len(encode(data))
+    elapsed = time.perf_counter() - started
+    return label, total, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--authors', type=int, default=50)
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages, args.authors)
+    results = [
+        measure('full JSON', messages, encode_json, compact=False),
+        measure('compact JSON', messages, encode_json, compact=True),
+    ]
+    if msgpack is not None:
+        results.append(measure('compact msgpack', messages, msgpack.packb, compact=True))
+
+    scale = 1000 / args.messages
+    baseline = results[0][1]
+    print(f"{args.messages} messages from {args.authors} authors (per 1,000 messages, per recipient)")
+    for label, total, elapsed in results:
+        print(f"  {label:<16} {total * scale / 1024:>8.1f} KiB  "
+              f"{elapsed * scale * 1000:>6.2f} ms encode  "
+              f"({total / baseline:.0%} of full)")
+    if msgpack is None:
+        print("  (msgpack not installed - MessagePack row skipped)")
+
+
+if __name__ == '__main__':
+    main()
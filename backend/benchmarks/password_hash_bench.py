@@ -0,0 +1,68 @@
+# benchmarks/password_hash_bench.py
+"""
+Login throughput and event-loop stall under eventlet: bcrypt inline vs the
+pool in services/passwords.py.
+
+Starts --logins concurrent green threads that each verify a password, the
+way concurrent POST /api/auth/login requests do. A heartbeat greenlet sleeps
+10 ms in a loop; its worst oversleep shows how long other requests (and
+Socket.IO traffic) were frozen.
+
+Usage:
+    python benchmarks/password_hash_bench.py --logins 50 --rounds 12 --workers 4
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import sys
+import os
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.passwords import PasswordHasher
+
+
+def run(hasher, hashed, logins):
+    stalls = []
+    done = []
+
+    def heartbeat():
+        while not done:
+            started = time.perf_counter()
+            eventlet.sleep(0.01)
+            stalls.append(time.perf_counter() - started - 0.01)
+
+    monitor = eventlet.spawn(heartbeat)
+    eventlet.sleep(0.05)
+    started = time.perf_counter()
+    pool = eventlet.GreenPool(logins)
+    results = list(pool.imap(lambda _: hasher.verify('correct horse battery', hashed), range(logins)))
+    elapsed = time.perf_counter() - started
+    done.append(True)
+    monitor.wait()
+    assert all(results)
+    return {
+        'logins_per_sec': logins / elapsed,
+        'elapsed': elapsed,
+        'max_stall_ms': max(stalls) * 1000 if stalls else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    hashed = PasswordHasher('inline', rounds=args.rounds).hash('correct horse battery')
+    print(f"{args.logins} concurrent logins, bcrypt cost {args.rounds}, {args.workers} pool workers")
+    for mode in ('inline', 'thread', 'process'):
+        result = run(PasswordHasher(mode, workers=args.workers, rounds=args.rounds), hashed, args.logins)
+        print(f"  {mode:<8} {result['logins_per_sec']:>7.1f} logins/s  "
+              f"total {result['elapsed']:>6.2f}s  max event-loop stall {result['max_stall_ms']:>8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/rate_limiter_bench.py
+"""
+Per-request cost of services/rate_limiter.py: leased local tokens vs a store
+round-trip on every request.
+
+The store is the in-process MemoryStore with --store-latency-ms of sleep
+added per call to stand in for a network hop to Redis.
+
+Usage:
+    python benchmarks/rate_limiter_bench.py --requests 20000 --limit 600 --store-latency-ms 0.5
+"""
+import sys
+import os
+import time
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.rate_limiter import RateLimiter, MemoryStore
+
+
+class SlowStore(MemoryStore):
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+        self.calls = 0
+
+    def incr(self, key, amount, expiry):
+        self.calls += 1
+        time.sleep(self.latency)
+        return super().incr(key, amount, expiry)
+
+
+def run(sync_every, requests, limit, clients, latency):
+    store = SlowStore(latency)
+    limiter = RateLimiter(store, sync_every=sync_every)
+    allowed = 0
+    started = time.perf_counter()
+    for i in range(requests):
+        ok, _ = limiter.hit('bench', f'user:{i % clients}', limit, 60)
+        allowed += ok
+    elapsed = time.perf_counter() - started
+    return elapsed / requests * 1e6, store.calls, allowed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--limit', type=int, default=600, help='Requests per minute per client')
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--store-latency-ms', type=float, default=0.5)
+    args = parser.parse_args()
+
+    print(f"{args.requests:,} requests from {args.clients} clients, limit {args.limit}/minute, "
+          f"store latency {args.store_latency_ms}ms")
+    for sync_every in (1, 10, 50):
+        per_request_us, calls, allowed = run(
+            sync_every, args.requests, args.limit, args.clients, args.store_latency_ms / 1000
+        )
+        print(f"  sync every {sync_every:>3}: {per_request_us:>8.1f} us/request  "
+              f"{calls:>6,} store calls  {allowed:>6,} allowed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# benchmarks/refresh_load_bench.py
+"""
+Refresh traffic per 1,000 active users for different access token lifetimes.
+
+Simulate mode (default) models active users with several tabs open. Each
+tab keeps its own access token in memory and calls /api/auth/refresh on its
+first request after that token expires (and once on page load). All tabs
+share the refresh cookie. Two refreshes of the same user that overlap within
+--latency-ms race for one refresh token. Before the grace window, the loser
+got a 401 and was logged out. Now it is answered with the winner's token and
+writes nothing.
+
+HTTP mode (--url) logs in --sessions times and drives /api/auth/refresh as
+fast as possible for --http-seconds. It reports the measured refresh QPS and
+latency, and how many active users that QPS supports at each modelled
+lifetime.
+
+Usage:
+    python benchmarks/refresh_load_bench.py --users 1000 --tabs 3 --lifetimes 1,10,15,30
+    python benchmarks/refresh_load_bench.py --url http://localhost:5000 \\
+        --username loadtest --password secret --sessions 20 --http-seconds 30
+"""
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from http.cookies import SimpleCookie
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def simulate(users, tabs, lifetime_minutes, requests_per_min, latency_ms, seconds, seed=42):
+    """
+    Returns:
+        dict: refreshes, rotations, grace (answered from the grace window) per second
+    """
+    rng = random.Random(seed)
+    lifetime = lifetime_minutes * 60
+    latency = latency_ms / 1000.0
+    rate = requests_per_min / 60.0
+    refreshes = rotations = grace = 0
+
+    for _ in range(users):
+        refresh_times = []
+        for _ in range(max(1, int(rng.expovariate(1 / tabs) + 0.5))):
+            # Page load refreshes once, then every first request after expiry
+            t = rng.uniform(0, lifetime)
+            expires = t + lifetime
+            refresh_times.append(t)
+            while True:
+                t += rng.expovariate(rate)
+                if t >= seconds:
+                    break
+                if t >= expires:
+                    refresh_times.append(t)
+                    expires = t + lifetime
+        refresh_times.sort()
+        last_rotation = None
+        for t in refresh_times:
+            if t >= seconds:
+                continue
+            refreshes += 1
+            if last_rotation is not None and t - last_rotation < latency:
+                grace += 1
+            else:
+                rotations += 1
+                last_rotation = t
+
+    return {
+        'refresh_qps': refreshes / seconds,
+        'rotation_qps': rotations / seconds,
+        'grace_qps': grace / seconds,
+    }
+
+
+def _post(url, cookie=None, body=None, timeout=10):
+    data = json.dumps(body or {}).encode('utf-8')
+    req = urllib.request.Request(url, data=data, method='POST', headers={'Content-Type': 'application/json'})
+    if cookie:
+        req.add_header('Cookie', f'refresh_token={cookie}')
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status, headers = resp.status, resp.headers
+            resp.read()
+    except urllib.error.HTTPError as e:
+        status, headers = e.code, e.headers
+    jar = SimpleCookie()
+    for header in headers.get_all('Set-Cookie') or []:
+        jar.load(header)
+    return status, jar['refresh_token'].value if 'refresh_token' in jar else None
+
+
+def run_http(base_url, username, password, sessions, seconds):
+    login_url = f"{base_url.rstrip('/')}/api/auth/login"
+    refresh_url = f"{base_url.rstrip('/')}/api/auth/refresh"
+    cookies = []
+    for _ in range(sessions):
+        status, cookie = _post(login_url, body={'username': username, 'password': password})
+        if status != 200 or not cookie:
+            raise SystemExit(f"Login failed with HTTP {status}")
+        cookies.append(cookie)
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(cookie):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status, new_cookie = _post(refresh_url, cookie=cookie)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if status == 200 and new_cookie:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(status)
+            if status != 200 or not new_cookie:
+                return
+            cookie = new_cookie
+
+    threads = [threading.Thread(target=worker, args=(cookie,)) for cookie in cookies]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        'qps': len(latencies) / seconds,
+        'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tabs', type=float, default=2.0, help='Average open tabs per user')
+    parser.add_argument('--lifetimes', default='1,10,15,30', help='Access token lifetimes in minutes')
+    parser.add_argument('--requests-per-min', type=float, default=6.0, help='API requests per tab per minute')
+    parser.add_argument('--latency-ms', type=int, default=150, help='Refresh round-trip (race window)')
+    parser.add_argument('--seconds', type=int, default=3600)
+    parser.add_argument('--url', help='Run the HTTP load test against this server')
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--http-seconds', type=int, default=30)
+    args = parser.parse_args()
+
+    lifetimes = [float(value) for value in args.lifetimes.split(',')]
+    scale = 1000.0 / args.users
+    modelled = {}
+    print(f"{args.users} active users, ~{args.tabs} tabs each, {args.requests_per_min} req/min/tab, "
+          f"{args.latency_ms}ms refresh latency")
+    print(f"  {'AT lifetime':>11}  {'refresh/s per 1k':>16}  {'DB rotations/s':>14}  {'grace hits/s':>12}")
+    for minutes in lifetimes:
+        result = simulate(args.users, args.tabs, minutes, args.requests_per_min, args.latency_ms, args.seconds)
+        modelled[minutes] = result['refresh_qps'] * scale
+        print(f"  {minutes:>9g}m  {modelled[minutes]:>16.2f}  "
+              f"{result['rotation_qps'] * scale:>14.2f}  {result['grace_qps'] * scale:>12.3f}")
+    print("  (grace hits were 401s / forced logouts before the grace window)")
+
+    if args.url:
+        if not args.username or not args.password:
+            parser.error('--url needs --username and --password')
+        measured = run_http(args.url, args.username, args.password, args.sessions, args.http_seconds)
+        print(f"\nHTTP: {measured['qps']:.1f} refresh/s with {args.sessions} sessions, "
+              f"p50 {measured['p50_ms']:.1f}ms, p95 {measured['p95_ms']:.1f}ms, {measured['errors']} errors")
+        for minutes, per_thousand in modelled.items():
+            if per_thousand:
+                print(f"  AT {minutes:g}m: capacity ~{measured['qps'] / per_thousand * 1000:,.0f} active users")
+
+
+if __name__ == '__main__':
+    main()
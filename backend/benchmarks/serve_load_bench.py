@@ -0,0 +1,174 @@
+# benchmarks/serve_load_bench.py
+"""
+Throughput of the single-process server (python app.py) vs gunicorn workers.
+
+For each mode the server is started on --port, polled until --path answers,
+then driven by --client-processes x --concurrency closed-loop clients for
+--seconds. Reports requests/second, error count and latency percentiles.
+Use --url to drive an already running server instead (one run, no startup).
+
+The server needs its usual environment (DATABASE_URL, secrets). Disable the
+chatbot to keep startup fast: --env CHATBOT_ENABLED=false. The client runs
+in separate processes so it is not the bottleneck for one server process;
+on a small machine, compare modes relative to each other rather than
+reading the absolute numbers.
+
+Usage:
+    python benchmarks/serve_load_bench.py --modes single,gunicorn --workers 4 \\
+        --path /api/books/?per_page=20 --seconds 20 --env CHATBOT_ENABLED=false
+    python benchmarks/serve_load_bench.py --url http://localhost:5000 --path /health
+"""
+import sys
+import os
+import time
+import argparse
+import subprocess
+import urllib.request
+import urllib.error
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _get(url, headers, timeout=10):
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return 0
+
+
+def _client_process(url, headers, concurrency, seconds, results):
+    deadline = time.perf_counter() + seconds
+
+    def loop():
+        latencies, errors = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status = _get(url, headers)
+            latencies.append(time.perf_counter() - started)
+            if status < 200 or status >= 400:
+                errors += 1
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latencies, errors in pool.map(lambda _: loop(), range(concurrency)):
+            results.put((latencies, errors))
+
+
+def drive(url, headers, client_processes, concurrency, seconds):
+    """
+    Returns:
+        dict: requests, errors, rps, p50/p95/p99 latency in ms
+    """
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_client_process, args=(url, headers, concurrency, seconds, results))
+        for _ in range(client_processes)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in range(client_processes * concurrency):
+        batch, batch_errors = results.get()
+        latencies.extend(batch)
+        errors += batch_errors
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(0.50),
+        'p95': percentile(0.95),
+        'p99': percentile(0.99),
+    }
+
+
+def start_server(mode, port, workers, env_overrides):
+    env = dict(os.environ, PORT=str(port), **env_overrides)
+    if mode == 'single':
+        command = [sys.executable, 'app.py']
+    elif mode == 'gunicorn':
+        env['GUNICORN_WORKERS'] = str(workers)
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(url, headers, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if 200 <= _get(url, headers, timeout=2) < 400:
+            return True
+        time.sleep(0.25)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='single,gunicorn', help='Comma separated: single, gunicorn')
+    parser.add_argument('--url', help='Drive a running server instead of starting one')
+    parser.add_argument('--path', default='/health')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--concurrency', type=int, default=16, help='Client threads per client process')
+    parser.add_argument('--client-processes', type=int, default=2)
+    parser.add_argument('--token', help='Bearer token for authenticated paths')
+    parser.add_argument('--startup-timeout', type=float, default=60)
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='Server environment override (repeatable)')
+    args = parser.parse_args()
+
+    headers = {'Authorization': f'Bearer {args.token}'} if args.token else {}
+    clients = args.client_processes * args.concurrency
+
+    if args.url:
+        runs = [('running server', args.url.rstrip('/'), None)]
+    else:
+        env_overrides = dict(item.split('=', 1) for item in args.env)
+        runs = [(mode, f'http://127.0.0.1:{args.port}', mode) for mode in args.modes.split(',')]
+
+    print(f"GET {args.path} with {clients} clients for {args.seconds:g}s")
+    for label, base_url, mode in runs:
+        url = base_url + args.path
+        server = None
+        if mode is not None:
+            server = start_server(mode, args.port, args.workers, env_overrides)
+            if mode == 'gunicorn':
+                label = f'gunicorn x{args.workers}'
+        try:
+            if not wait_ready(url, headers, args.startup_timeout):
+                print(f"  {label:<16} did not become ready within {args.startup_timeout:g}s")
+                continue
+            result = drive(url, headers, args.client_processes, args.concurrency, args.seconds)
+            print(f"  {label:<16} {result['rps']:>9.1f} req/s  {result['requests']:>7,} requests  "
+                  f"{result['errors']:>5,} errors  p50 {result['p50']:>7.1f}ms  "
+                  f"p95 {result['p95']:>7.1f}ms  p99 {result['p99']:>7.1f}ms")
+        finally:
+            if server is not None:
+                server.terminate()
+                try:
+                    server.wait(timeout=args.startup_timeout)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+
+
+if __name__ == '__main__':
+    main()
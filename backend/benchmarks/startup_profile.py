@@ -0,0 +1,81 @@
+# benchmarks/startup_profile.py
+"""
+Startup profile: import time per module and time to a ready app.
+
+Runs `import app; app.create_app()` in a fresh interpreter with
+``-X importtime`` and reports the slowest modules by cumulative and self
+import time, plus the wall clock to a ready app. Pass --env to try
+configurations, e.g. CHATBOT_ENABLED=false.
+
+create_app() needs DATABASE_URL, SECRET_KEY and JWT_SECRET_KEY but does not
+connect to the database; use --imports-only to skip it.
+
+Usage:
+    python benchmarks/startup_profile.py --env CHATBOT_ENABLED=false --top 25
+    python benchmarks/startup_profile.py --imports-only
+"""
+import sys
+import os
+import re
+import time
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+
+def run(imports_only, env_overrides):
+    code = 'import app' if imports_only else 'import app; app.create_app()'
+    env = dict(os.environ, **env_overrides)
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - started
+
+    modules = []
+    other = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+        elif not line.startswith('import time:'):
+            other.append(line)
+    return result.returncode, elapsed, modules, other
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--imports-only', action='store_true', help='Only import app, do not call create_app()')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='Environment override (repeatable)')
+    args = parser.parse_args()
+
+    env_overrides = dict(item.split('=', 1) for item in args.env)
+    returncode, elapsed, modules, other = run(args.imports_only, env_overrides)
+    if returncode != 0:
+        print('\n'.join(other[-20:]))
+        print(f"Startup failed (exit {returncode})")
+        sys.exit(returncode)
+
+    total_us = sum(self_us for _, self_us, _, _ in modules)
+    print(f"{'Imports' if args.imports_only else 'Ready'} in {elapsed * 1000:.0f}ms wall clock "
+          f"({len(modules)} modules, {total_us / 1000:.0f}ms importing)")
+
+    top_level = [m for m in modules if m[3] == 0]
+    print("\nTop-level imports by cumulative time:")
+    for name, _, cumulative_us, _ in sorted(top_level, key=lambda m: -m[2])[:args.top]:
+        print(f"  {cumulative_us / 1000:>8.1f}ms  {name}")
+
+    print("\nModules by self time:")
+    for name, self_us, _, _ in sorted(modules, key=lambda m: -m[1])[:args.top]:
+        print(f"  {self_us / 1000:>8.1f}ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,17 +6,41 @@ from flask_limiter.util import get_remote_address
 from flask_socketio import SocketIO
 from flask_cors import CORS
 from flask_migrate import Migrate
+import os
+import logging
+from services.database import RoutingSession
+
+logger = logging.getLogger(__name__)
 
 # -----------------------------
 # GLOBAL EXTENSIONS - KHÔNG init_app TẠI ĐÂY
 # -----------------------------
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
 mail = Mail()
 limiter = Limiter(key_func=get_remote_address, enabled=False)
 
+def _socketio_serializer():
+    """Socket.IO packet serializer from SOCKETIO_SERIALIZER ('default' JSON or 'msgpack')"""
+    serializer = os.getenv('SOCKETIO_SERIALIZER', 'default')
+    if serializer == 'msgpack':
+        try:
+            import msgpack  # noqa: F401
+        except ImportError:
+            logger.warning("SOCKETIO_SERIALIZER=msgpack but msgpack is not installed, using JSON")
+            return 'default'
+    return serializer
+
+def _socketio_transports():
+    """Engine.IO transports from SOCKETIO_TRANSPORTS (default: polling and websocket)"""
+    transports = [t.strip() for t in os.getenv('SOCKETIO_TRANSPORTS', '').split(',') if t.strip()]
+    return transports or None
+
 # ✅ SocketIO chạy eventlet, CHỈ cấu hình 1 lần tại đây
+# With several workers/processes, set SOCKETIO_MESSAGE_QUEUE (e.g. redis://...)
+# so emits from one process reach clients connected to the others. Read at
+# import time: app.py loads backend/.env before importing this module
 socketio = SocketIO(
     async_mode="eventlet",
     cors_allowed_origins="*",
@@ -24,7 +48,10 @@ socketio = SocketIO(
     engineio_logger=False,
     ping_timeout=60,
     ping_interval=25,
-    manage_session=False
+    manage_session=False,
+    serializer=_socketio_serializer(),
+    message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE') or None,
+    transports=_socketio_transports()
 )
 
 cors = CORS()
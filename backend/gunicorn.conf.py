@@ -0,0 +1,118 @@
+# gunicorn.conf.py
+"""
+Gunicorn configuration for production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers
+    Eventlet workers (the app is built around eventlet: monkey patching,
+    tpool offloading, Socket.IO async_mode). Each worker serves many
+    concurrent requests and websockets, so one worker per available CPU is
+    the default (GUNICORN_WORKERS / WEB_CONCURRENCY override).
+
+Socket.IO with several workers
+    - SOCKETIO_MESSAGE_QUEUE (e.g. redis://redis:6379/0) is required so
+      emits reach clients connected to other workers.
+    - Gunicorn does not route a client back to the same worker, so the
+      long-polling transport cannot work across workers. With more than one
+      worker SOCKETIO_TRANSPORTS defaults to "websocket" (the frontend tries
+      websocket first). Alternatively run one worker per instance behind a
+      sticky-session proxy.
+    - Per-worker state (compact chat sessions, the room message cache) is
+      kept in sync over the worker bus (services/worker_bus.py), which
+      needs a redis:// queue or WORKER_BUS_URL.
+    - Each worker buffers activity sketches (services/distinct_metrics.py)
+      and flushes them itself, including from worker_exit.
+    - Rate limits should use a shared store (RATE_LIMIT_STORAGE_URL=redis://...).
+      Exclusive background jobs already coordinate through advisory locks.
+
+Shared read-only state
+    With CHATBOT_ENABLED, the chatbot's embedding model weights are loaded
+    once in the master before forking (GUNICORN_PRELOAD_CHATBOT, default on).
+    Workers share that memory copy-on-write instead of each loading a copy.
+    Nothing else is loaded in the master: the chroma client (SQLite),
+    database connections and the Flask app are created per worker, after
+    eventlet has patched the process, because open handles, locks,
+    background tasks and threads do not survive a fork.
+
+Recycling and reloads
+    Workers are replaced after GUNICORN_MAX_REQUESTS requests (plus jitter)
+    to cap slow memory growth; their websocket clients reconnect to another
+    worker. `kill -HUP <master>` replaces workers gracefully with the new
+    config and code (only the embedding weights live in the master).
+"""
+import os
+import logging
+
+from dotenv import load_dotenv
+
+# The master reads its settings (and SOCKETIO_MESSAGE_QUEUE, CHATBOT_ENABLED)
+# before wsgi.py is imported; workers load backend/.env again in app.py
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+
+logger = logging.getLogger('gunicorn.error')
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = 'eventlet'
+workers = int(os.getenv('GUNICORN_WORKERS', os.getenv('WEB_CONCURRENCY', _cpu_count())))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+
+# Recycling
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+# Graceful shutdown / reload and worker health
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# The app is created in each worker (see on_starting for what is shared)
+preload_app = False
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+
+# Read by the app (services/message_cache.py) in each worker
+os.environ['GUNICORN_WORKER_COUNT'] = str(workers)
+if workers > 1:
+    os.environ.setdefault('SOCKETIO_TRANSPORTS', 'websocket')
+
+PRELOAD_CHATBOT = os.getenv('GUNICORN_PRELOAD_CHATBOT', 'true').lower() == 'true'
+
+
+def on_starting(server):
+    if workers > 1 and not os.getenv('SOCKETIO_MESSAGE_QUEUE'):
+        logger.warning("%s workers without SOCKETIO_MESSAGE_QUEUE: Socket.IO events will not cross workers", workers)
+
+    if PRELOAD_CHATBOT and os.getenv('CHATBOT_ENABLED', 'true').lower() == 'true':
+        # Only the embedding weights, loaded before fork so workers share the
+        # pages copy-on-write. The chroma client (SQLite), Postgres connections
+        # and the app modules (and their locks) must not cross the fork: each
+        # worker builds those itself, after eventlet has patched it.
+        from utils.embedding_model import load_embedding_model
+        try:
+            load_embedding_model()
+            logger.info("Chatbot embedding model preloaded in master")
+        except Exception as e:
+            logger.warning("Embedding model preload failed, workers will load it on first use: %s", e)
+
+
+def worker_exit(server, worker):
+    # Merge the activity sketches only this worker holds (recycles, reloads, shutdown)
+    app = getattr(worker, 'wsgi', None)
+    if app is not None and hasattr(app, 'app_context'):
+        from services.distinct_metrics import distinct_metrics
+        distinct_metrics.flush_at_exit(app)
+
+    # Flush this worker's queued log records
+    from utils.log_config import stop_logging
+    stop_logging()
@@ -1,30 +1,27 @@
 from flask import request, g
-from flask_jwt_extended import get_jwt_identity, jwt_required, verify_jwt_in_request
+from flask_jwt_extended import get_jwt_identity, get_jwt, jwt_required, verify_jwt_in_request
 from functools import wraps
-from models.user import User
+from services.identity_cache import identity_cache
+from services.passwords import password_hasher
+from models.refresh_token import RefreshToken
 
 from utils.error_handler import create_error_response
 import re
-import bcrypt
 from datetime import datetime, timedelta
 import jwt
 import logging
-from tenacity import retry, stop_after_attempt, wait_fixed
 
 logger = logging.getLogger(__name__)
 
 # Password hashing and verification
 def hash_password(password):
     """
-    Hash a password using bcrypt
+    Hash a password using bcrypt (in the password hashing pool)
     """
     try:
-        if not password:
-            raise ValueError("Password cannot be empty")
-        salt = bcrypt.gensalt()
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
+        hashed_password = password_hasher.hash(password)
         logger.debug("Password hashed successfully")
-        return hashed_password.decode('utf-8')
+        return hashed_password
     except Exception as e:
         logger.error(f"Error hashing password: {str(e)}")
         raise ValueError(f"Error hashing password: {str(e)}")
@@ -37,7 +34,7 @@ def verify_password(password, hashed_password):
         if not password or not hashed_password:
             logger.warning("Empty password or hashed_password provided")
             return False
-        result = bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+        result = password_hasher.verify(password, hashed_password)
         logger.debug(f"Password verification {'successful' if result else 'failed'}")
         return result
     except Exception as e:
@@ -121,14 +118,29 @@ def validate_username(username):
     return True, "Username is valid"
 
 # Authentication middleware helper
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+def current_identity():
+    """
+    Cached identity snapshot (id, username, role, is_banned) of the JWT user
+    
+    Reuses g.user when an auth decorator already resolved it, so handlers
+    don't reload the User row just to check ban status or role.
+    """
+    user = g.get('user')
+    if user is None:
+        user_id = get_jwt_identity()
+        user = identity_cache.get(user_id, get_jwt()) if user_id else None
+        g.user = user
+    return user
+
 def _check_user_access(required_roles=None):
     """
-    Helper function to check user authentication and authorization with retry
+    Helper function to check user authentication and authorization
+    (identity comes from the cache / token claims, see services/identity_cache.py)
     """
+    user_id = None
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = identity_cache.get(user_id, get_jwt())
         
         if not user:
             logger.warning(f"User not found: {user_id} at {request.remote_addr} for {request.path}")
@@ -201,7 +213,7 @@ def optional_jwt(f):
             verify_jwt_in_request(optional=True)
             user_id = get_jwt_identity()
             if user_id:
-                user = User.query.get(user_id)
+                user = identity_cache.get(user_id, get_jwt())
                 if user and not user.is_banned:
                     g.user = user
                     logger.debug(f"Optional JWT - User authenticated: {user_id} for {request.path}")
@@ -235,6 +247,25 @@ def get_user_identifier():
     logger.debug(f"Rate limit identifier: ip:{ip} for {request.path}")
     return f"ip:{ip}"
 
+def get_ip_identifier():
+    """
+    Rate limit identifier by client IP, for routes without a JWT (/auth/refresh)
+    The IP is only the client's when PROXY_FIX_HOPS matches the proxies in front of the app
+    """
+    return f"ip:{request.remote_addr}"
+
+def get_refresh_token_identifier():
+    """
+    Rate limit identifier by the presented refresh token (hashed), otherwise IP address
+    Only stacked on top of the per-IP limit: any client-chosen string gets a
+    budget of its own, so this limits replays of one token, not guessing
+    """
+    data = request.get_json(silent=True) or {}
+    token = request.cookies.get('refresh_token') or data.get('refresh_token')
+    if token and isinstance(token, str):
+        return f"rt:{RefreshToken.hash_token(token)[:32]}"
+    return get_ip_identifier()
+
 # Password reset token functions
 def generate_password_reset_token(user_id, expiration_minutes=30):
     """
@@ -343,6 +374,7 @@ __all__ = [
     'moderator_required',
     'login_required',
     'optional_jwt',
+    'current_identity',
     'get_user_identifier',
     'generate_password_reset_token',
     'verify_password_reset_token',
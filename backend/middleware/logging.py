@@ -1,13 +1,110 @@
 from functools import wraps
-from flask import request
+from flask import request, g
+from sqlalchemy import event
+from services.metrics import metrics, current_stats, RequestStats, QUERY_COUNT_BUCKETS
+import os
+import time
 import logging
 
 logger = logging.getLogger(__name__)
 
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+# Warn when one request issues more queries than this (0 disables)
+QUERY_BUDGET = int(os.getenv('QUERY_BUDGET', 50))
+
+request_duration = metrics.histogram(
+    'http_request_duration_seconds', 'Request latency', ('endpoint', 'method', 'status')
+)
+request_queries = metrics.histogram(
+    'http_request_db_queries', 'SQL statements per request', ('endpoint',), buckets=QUERY_COUNT_BUCKETS
+)
+request_db_time = metrics.histogram(
+    'http_request_db_seconds', 'Time spent in SQL per request', ('endpoint',)
+)
+over_budget = metrics.counter(
+    'http_requests_over_query_budget_total', 'Requests that exceeded QUERY_BUDGET', ('endpoint',)
+)
+
+
+def _server_timing(stats: RequestStats, total: float) -> str:
+    parts = [f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"']
+    parts.extend(f'{name};dur={seconds * 1000:.1f}' for name, seconds in stats.spans.items())
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def init_request_metrics(app, engines):
+    """
+    Count queries and DB time per request, time spans, and report them
+
+    Queries are counted on every engine in ``engines`` (primary, replica,
+    analytics).
+
+    Per request: a Server-Timing header (db, spans, total), the
+    http_request_* histograms for /metrics, and a warning when the request
+    issues more than QUERY_BUDGET statements.
+    """
+    if not METRICS_ENABLED:
+        return
+
+    def _query_started(conn, cursor, statement, parameters, context, executemany):
+        if current_stats() is not None:
+            conn.info.setdefault('request_query_start', []).append(time.perf_counter())
+
+    def _query_finished(conn, cursor, statement, parameters, context, executemany):
+        stats = current_stats()
+        starts = conn.info.get('request_query_start')
+        if stats is not None and starts:
+            stats.queries += 1
+            stats.db_time += time.perf_counter() - starts.pop()
+
+    def _query_failed(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('request_query_start'):
+            conn.info['request_query_start'].pop()
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _query_started)
+        event.listen(engine, 'after_cursor_execute', _query_finished)
+        event.listen(engine, 'handle_error', _query_failed)
+
+    @app.before_request
+    def _start_request_stats():
+        g._request_stats = RequestStats()
+
+    @app.after_request
+    def _record_request_stats(response):
+        stats = g.pop('_request_stats', None)
+        if stats is None:
+            return response
+        total = stats.elapsed()
+        endpoint = request.endpoint or 'unmatched'
+
+        request_duration.observe(total, endpoint, request.method, str(response.status_code))
+        request_queries.observe(stats.queries, endpoint)
+        request_db_time.observe(stats.db_time, endpoint)
+
+        if QUERY_BUDGET and stats.queries > QUERY_BUDGET:
+            over_budget.inc(endpoint)
+            logger.warning(
+                f"Query budget exceeded: {request.method} {request.path} issued {stats.queries} queries "
+                f"(budget {QUERY_BUDGET}, {stats.db_time * 1000:.1f}ms in DB)",
+                extra={'endpoint': endpoint, 'queries': stats.queries, 'db_ms': round(stats.db_time * 1000, 1)}
+            )
+
+        if SERVER_TIMING_ENABLED:
+            response.headers['Server-Timing'] = _server_timing(stats, total)
+        return response
+
+    logger.info(f"Request metrics enabled (query budget {QUERY_BUDGET})")
+
+
 def log_requests(f):
     """
     Decorator to log incoming requests.
-    Logs method, path, IP address, and user ID if available.
+    Logs method, path, IP address, and user ID if available, then the
+    duration and query count / DB time once the view returns.
     """
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -19,16 +116,23 @@ def log_requests(f):
                 user_id = get_jwt_identity()
             except:
                 pass
-            
+
             # Log request
             log_message = f"{request.method} {request.path} from {request.remote_addr}"
             if user_id:
                 log_message += f" (user: {user_id})"
-            
+
             logger.info(log_message)
         except Exception as e:
             logger.error(f"Error logging request: {e}")
-        
-        return f(*args, **kwargs)
-    return decorated
 
+        started = time.perf_counter()
+        result = f(*args, **kwargs)
+        stats = current_stats()
+        if stats is not None:
+            logger.info(
+                f"{request.method} {request.path} handled in {(time.perf_counter() - started) * 1000:.1f}ms "
+                f"({stats.queries} queries, {stats.db_time * 1000:.1f}ms in DB)"
+            )
+        return result
+    return decorated
@@ -1,39 +1,67 @@
 from functools import wraps
-from extensions import limiter
+from services.rate_limiter import rate_limiter
+from middleware.auth_middleware import get_user_identifier
+from utils.error_handler import create_error_response
+import logging
 
-def rate_limit(requests_per_minute=None, requests_per_hour=None, requests_per_day=None):
+logger = logging.getLogger(__name__)
+
+def rate_limit(requests_per_minute=None, requests_per_hour=None, requests_per_day=None, name=None, key_func=None):
     """
     Decorator to apply rate limiting to routes.
-    
+
     Args:
         requests_per_minute: Maximum requests per minute
         requests_per_hour: Maximum requests per hour
         requests_per_day: Maximum requests per day
-    
+        name: Named limit group from services.rate_limiter.DEFAULT_LIMITS
+              (configurable via RATE_LIMIT_<NAME>). Routes with the same
+              name share one budget per client.
+        key_func: Client identifier for requests (default get_user_identifier)
+
     Usage:
         @rate_limit(requests_per_minute=60)
         def my_route():
             ...
+
+        @rate_limit(name='search')
+        def search():
+            ...
+
+    Place it below @jwt_required so clients are keyed by user id (IP otherwise).
+    Without a JWT the IP is only the client's when PROXY_FIX_HOPS matches the
+    proxies in front of the app.
     """
     def decorator(f):
-        # Build rate limit string
-        limits = []
-        if requests_per_minute:
-            limits.append(f"{requests_per_minute} per minute")
-        if requests_per_hour:
-            limits.append(f"{requests_per_hour} per hour")
-        if requests_per_day:
-            limits.append(f"{requests_per_day} per day")
-        
-        if not limits:
+        # Build (count, period) limits; named limits and RATE_LIMIT_ENABLED are
+        # read on the first request (routes are decorated at import time)
+        fixed_limits = [
+            (count, period)
+            for count, period in ((requests_per_minute, 60), (requests_per_hour, 3600), (requests_per_day, 86400))
+            if count
+        ]
+
+        if not name and not fixed_limits:
             # Default: no limit if no parameters provided
             return f
-        
-        limit_string = ", ".join(limits)
-        
-        # Apply limiter decorator directly
-        # limiter.limit() can be used as a decorator
-        return limiter.limit(limit_string)(f)
-    
-    return decorator
 
+        scope = name or f"{f.__module__}.{f.__name__}"
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            limits = rate_limiter.limits(name) if name else fixed_limits
+            if not limits or not rate_limiter.enabled:
+                return f(*args, **kwargs)
+            key = (key_func or get_user_identifier)()
+            for count, period in limits:
+                allowed, retry_after = rate_limiter.hit(scope, key, count, period)
+                if not allowed:
+                    logger.info(f"Rate limit exceeded: {scope} {count}/{period}s for {key}")
+                    response, status = create_error_response('Too many requests, please try again later', 429)
+                    response.headers['Retry-After'] = str(retry_after)
+                    return response, status
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,21 @@
+from extensions import db
+from datetime import datetime, timezone
+
+class ActivitySketch(db.Model):
+    """HyperLogLog sketch of distinct ids for one metric, entity and time bucket"""
+    __tablename__ = 'activity_sketches'
+
+    metric = db.Column(db.String(32), primary_key=True)
+    # 0 for site-wide metrics, otherwise book_id / room_id
+    entity_id = db.Column(db.Integer, primary_key=True, default=0)
+    # Start of the minute or UTC day the sketch covers
+    bucket = db.Column(db.DateTime, primary_key=True)
+    registers = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        db.Index('idx_activity_sketch_metric_bucket', 'metric', 'bucket'),
+    )
+
+    def __repr__(self):
+        return f'<ActivitySketch {self.metric}:{self.entity_id} {self.bucket}>'
@@ -15,6 +15,7 @@ class Book(db.Model):
     pdf_path = db.Column(db.String(255))
     image_path = db.Column(db.String(255))
     cover_image = db.Column(db.String(255))
+    cover_variants = db.Column(db.JSON)  # {thumb, card, full} WebP URLs (services/upload_pipeline.py)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id', ondelete='SET NULL'))
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     view_count = db.Column(db.Integer, default=0)
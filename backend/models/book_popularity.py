@@ -0,0 +1,17 @@
+import sqlalchemy as sa
+
+# Materialized view created by migration 9d3c5e1f7a20 and refreshed by
+# services/book_popularity.py. Kept out of db.metadata so db.create_all()
+# and Alembic autogenerate never try to create it as a table.
+book_popularity = sa.Table(
+    'book_popularity',
+    sa.MetaData(),
+    sa.Column('book_id', sa.Integer, primary_key=True),
+    sa.Column('views_24h', sa.Integer),
+    sa.Column('viewers_24h', sa.Integer),
+    sa.Column('views_7d', sa.Integer),
+    sa.Column('viewers_7d', sa.Integer),
+    sa.Column('views_all', sa.Integer),
+    sa.Column('viewers_all', sa.Integer),
+    sa.Column('refreshed_at', sa.DateTime),
+)
@@ -28,4 +28,5 @@ class BotConversation(db.Model):
     __table_args__ = (
         db.CheckConstraint("user_message != ''", name='check_user_message_not_empty'),
         db.Index('idx_bot_conversation_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('idx_bot_conversation_created_at', 'created_at'),
     )
\ No newline at end of file
@@ -12,6 +12,9 @@ class ChatRoom(db.Model):
     is_public = db.Column(db.Boolean, default=False)  # ✅ NEW: Public room (anyone can join)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Cached counters - kept in sync by routes on membership/message changes
+    member_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    message_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     messages = db.relationship('Message', back_populates='room', cascade='all, delete-orphan', lazy='select')
@@ -33,6 +36,17 @@ class ChatRoom(db.Model):
         
         return data
     
+    @staticmethod
+    def adjust_counters(room_id, members=0, messages=0):
+        """Shift cached counters with a single UPDATE inside the caller's transaction"""
+        values = {}
+        if members:
+            values['member_count'] = ChatRoom.member_count + members
+        if messages:
+            values['message_count'] = ChatRoom.message_count + messages
+        if values:
+            ChatRoom.query.filter_by(id=room_id).update(values, synchronize_session=False)
+    
     def get_room_type(self):
         """Get human-readable room type"""
         if self.is_global:
@@ -0,0 +1,18 @@
+from extensions import db
+
+class DailyRoomStat(db.Model):
+    """Per-room message counters for one UTC day, maintained by services/stats_rollup.py"""
+    __tablename__ = 'daily_room_stats'
+
+    day = db.Column(db.Date, primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('chat_rooms.id', ondelete='CASCADE'), primary_key=True)
+    messages = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    users = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_active = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('idx_daily_room_stat_room_id_day', 'room_id', 'day'),
+    )
+
+    def __repr__(self):
+        return f'<DailyRoomStat {self.day} room:{self.room_id}>'
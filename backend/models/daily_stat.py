@@ -0,0 +1,25 @@
+from extensions import db
+from datetime import datetime, timezone
+
+class DailyStat(db.Model):
+    """Site-wide counters for one UTC day, maintained by services/stats_rollup.py"""
+    __tablename__ = 'daily_stats'
+
+    day = db.Column(db.Date, primary_key=True)
+    signups = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    messages = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    visible_messages = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    message_rooms = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    message_users = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bot_conversations = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bot_positive = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bot_negative = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bot_neutral = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    views = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    unique_viewers = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Closed days are not recomputed by the rollup job any more
+    is_final = db.Column(db.Boolean, nullable=False, default=False, server_default='false')
+    computed_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<DailyStat {self.day} final:{self.is_final}>'
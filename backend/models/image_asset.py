@@ -0,0 +1,18 @@
+from extensions import db
+from datetime import datetime, timezone
+
+class ImageAsset(db.Model):
+    """Uploaded image keyed by the SHA-256 of its source bytes, with its stored WebP derivatives"""
+    __tablename__ = 'image_assets'
+
+    content_hash = db.Column(db.String(64), primary_key=True)
+    # {variant name: public URL}, e.g. {"thumb": ..., "card": ..., "full": ...}
+    variants = db.Column(db.JSON, nullable=False)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    source_bytes = db.Column(db.Integer)
+    stored_bytes = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<ImageAsset {self.content_hash[:12]}>'
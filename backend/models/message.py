@@ -1,6 +1,11 @@
 from extensions import db
 
 from datetime import datetime, timezone
+from sqlalchemy import func
+
+# Text search configuration for message content - 'simple' (no stemming) since
+# chat is mixed Vietnamese/English
+SEARCH_CONFIG = 'simple'
 
 class Message(db.Model):
     __tablename__ = 'messages'
@@ -23,6 +28,16 @@ class Message(db.Model):
     parent = db.relationship('Message', remote_side=[id], backref='replies')
     reports = db.relationship('MessageReport', back_populates='message', lazy='select')  # REMOVED cascade
     
+    @classmethod
+    def search_vector(cls):
+        """tsvector expression matching idx_message_content_tsv"""
+        return func.to_tsvector(SEARCH_CONFIG, func.coalesce(cls.content, ''))
+    
+    @classmethod
+    def search_filter(cls, query_text):
+        """Full-text match of content against a web-style search string (uses the GIN index)"""
+        return cls.search_vector().op('@@')(func.websearch_to_tsquery(SEARCH_CONFIG, query_text))
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -41,4 +56,7 @@ class Message(db.Model):
         db.CheckConstraint("content != '' OR image_url IS NOT NULL", name='check_content_or_image'),
         db.Index('idx_message_user_id_room_id', 'user_id', 'room_id'),
         db.Index('idx_message_parent_id', 'parent_id'),
+        db.Index('idx_message_room_parent_deleted_created', 'room_id', 'parent_id', 'is_deleted', 'created_at'),
+        db.Index('idx_message_created_at', 'created_at'),
+        db.Index('idx_message_content_tsv', func.to_tsvector(SEARCH_CONFIG, func.coalesce(content, '')), postgresql_using='gin'),
     )
\ No newline at end of file
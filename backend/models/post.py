@@ -8,6 +8,7 @@ class Post(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     content = db.Column(db.Text)  # Nội dung bài viết
     image_url = db.Column(db.String(500))  # URL hình ảnh từ Supabase
+    image_variants = db.Column(db.JSON)  # {thumb, card, full} WebP URLs
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
@@ -21,6 +22,7 @@ class Post(db.Model):
             'user_id': self.user_id,
             'content': self.content or '',
             'image_url': self.image_url or '',
+            'image_thumbnail': (self.image_variants or {}).get('card') or self.image_url or '',
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -30,6 +32,7 @@ class Post(db.Model):
                 'id': self.user.id,
                 'username': self.user.username,
                 'avatar_url': self.user.avatar_url or '',
+                'avatar_thumbnail': (self.user.avatar_variants or {}).get('thumb') or self.user.avatar_url or '',
                 'name': self.user.name or '',
             }
         
@@ -13,6 +13,7 @@ class RefreshToken(db.Model):
     expires_at = db.Column(db.DateTime, nullable=False, index=True)
     is_revoked = db.Column(db.Boolean, default=False, index=True)
     revoked_at = db.Column(db.DateTime, nullable=True)
+    replaced_by_hash = db.Column(db.String(255), nullable=True)  # Token kế tiếp khi rotate (NULL = revoke do logout/ban)
     device_info = db.Column(db.String(255), nullable=True)  # User agent, IP, etc.
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
@@ -30,8 +31,8 @@ class RefreshToken(db.Model):
         return secrets.token_urlsafe(32)
     
     @classmethod
-    def create_token(cls, user_id, device_info=None):
-        """Tạo refresh token mới"""
+    def create_token(cls, user_id, device_info=None, lifetime=timedelta(days=30)):
+        """Tạo refresh token mới (family mới)"""
         # Generate token và family_id
         token = secrets.token_urlsafe(64)
         family_id = cls.generate_family_id()
@@ -42,7 +43,7 @@ class RefreshToken(db.Model):
             user_id=user_id,
             token_hash=token_hash,
             family_id=family_id,
-            expires_at=datetime.now(timezone.utc) + timedelta(days=30),
+            expires_at=datetime.now(timezone.utc) + lifetime,
             device_info=device_info
         )
         
@@ -103,41 +104,6 @@ class RefreshToken(db.Model):
         db.session.commit()
         return len(tokens)
     
-    @classmethod
-    def check_reuse(cls, old_family_id, user_id):
-        """
-        Tạm thời vô hiệu hóa reuse detection do gây false-positive khi token được rotate hợp lệ.
-        TODO: triển khai lại với cột trạng thái riêng cho lý do revoke.
-        """
-        return False
-    
-    def rotate_token(self, device_info=None):
-        """Rotate token: tạo token mới cùng family_id, revoke token cũ"""
-        # Kiểm tra reuse
-        if RefreshToken.check_reuse(self.family_id, self.user_id):
-            raise ValueError("Token reuse detected - all tokens revoked")
-        
-        # Revoke token cũ
-        self.is_revoked = True
-        self.revoked_at = datetime.now(timezone.utc)
-        
-        # Tạo token mới cùng family_id
-        new_token = secrets.token_urlsafe(64)
-        new_token_hash = self.hash_token(new_token)
-        
-        new_refresh_token = RefreshToken(
-            user_id=self.user_id,
-            token_hash=new_token_hash,
-            family_id=self.family_id,  # Giữ nguyên family_id
-            expires_at=datetime.now(timezone.utc) + timedelta(days=30),
-            device_info=device_info or self.device_info
-        )
-        
-        db.session.add(new_refresh_token)
-        db.session.commit()
-        
-        return new_token, new_refresh_token
-    
     def to_dict(self):
         return {
             'id': self.id,
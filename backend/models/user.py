@@ -1,7 +1,7 @@
 from extensions import db
 
 from datetime import datetime, timezone
-import bcrypt
+from services.passwords import password_hasher
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -13,10 +13,14 @@ class User(db.Model):
     role = db.Column(db.String(20), default='member')
     is_banned = db.Column(db.Boolean, default=False)
     avatar_url = db.Column(db.String(255))
+    avatar_variants = db.Column(db.JSON)  # {thumb, card, full} WebP URLs
     name = db.Column(db.String(100))  # Tên đầy đủ
     bio = db.Column(db.Text)  # Tiểu sử
     favorite_books = db.Column(db.Text)  # Sở thích sách (dạng text tự do)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Bumped on ban/unban/role change; embedded in access tokens as the 'av' claim
+    auth_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    auth_changed_at = db.Column(db.DateTime, index=True)
     
     # Relationships - FIXED (removed problematic cascades)
     ratings = db.relationship('BookRating', back_populates='user', lazy='select')  # REMOVED cascade
@@ -34,10 +38,14 @@ class User(db.Model):
     favorites = db.relationship('Favorite', back_populates='user', lazy='select')  # REMOVED cascade
     
     def set_password(self, password):
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return password_hasher.verify(password, self.password_hash)
+    
+    def password_needs_rehash(self):
+        """Hash được tạo với cost khác BCRYPT_ROUNDS (rehash khi login)"""
+        return password_hasher.needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -57,8 +65,14 @@ class User(db.Model):
     def is_admin(self):
         return self.role == 'admin'
     
+    def bump_auth_version(self):
+        """Mark role/ban state as changed so cached identities and older tokens are re-checked"""
+        self.auth_version = (self.auth_version or 0) + 1
+        self.auth_changed_at = datetime.utcnow()
+    
     __table_args__ = (
         db.Index('idx_user_username_email', 'username', 'email'),
+        db.Index('idx_user_created_at', 'created_at'),
         db.CheckConstraint("username != ''", name='check_username_not_empty'),
         db.CheckConstraint("email != ''", name='check_email_not_empty'),
     )
\ No newline at end of file
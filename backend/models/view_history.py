@@ -5,10 +5,11 @@ from datetime import datetime, timezone
 class ViewHistory(db.Model):
     __tablename__ = 'view_history'
     
-    id = db.Column(db.Integer, primary_key=True)
+    # Primary key includes the partition key (table is range-partitioned by month)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
-    viewed_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    viewed_at = db.Column(db.DateTime, primary_key=True, default=lambda: datetime.now(timezone.utc))
     
     # ✅ ĐƠN GIẢN HOÁ - CHỈ CẦN foreign key, không cần relationship
     # Không cần: user = db.relationship('User', backref=db.backref('view_history', lazy=True))
@@ -16,6 +17,11 @@ class ViewHistory(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('user_id', 'book_id', 'viewed_at', name='unique_user_book_view'),
+        db.Index('idx_view_history_viewed_at', 'viewed_at'),
+        # History lists: DISTINCT ON (book_id) over one user's views, newest first
+        db.Index('idx_view_history_user_viewed_book', 'user_id', viewed_at.desc(), 'book_id'),
+        # Monthly partitions are created and compacted by services/view_history.py
+        {'postgresql_partition_by': 'RANGE (viewed_at)'},
     )
     
     def __repr__(self):
@@ -0,0 +1,17 @@
+from extensions import db
+
+class ViewHistoryDaily(db.Model):
+    """Per-book views for one UTC day, compacted from expired view_history partitions by services/view_history.py"""
+    __tablename__ = 'view_history_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    viewers = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.Index('idx_view_history_daily_book_id_day', 'book_id', 'day'),
+    )
+
+    def __repr__(self):
+        return f'<ViewHistoryDaily {self.day} book:{self.book_id}>'
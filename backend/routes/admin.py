@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from middleware.auth_middleware import admin_required
 from middleware.rate_limiting import rate_limit
@@ -18,8 +18,17 @@ from models.reading_history import ReadingHistory
 from models.bot_conversation import BotConversation
 from models.view_history import ViewHistory
 from models.bookmark import Bookmark
-from sqlalchemy import func, distinct, case
-from sqlalchemy.orm import joinedload
+from models.daily_room_stat import DailyRoomStat
+from services.message_cache import room_message_cache
+from services.stats_rollup import utc_today, date_range, load_daily_stats
+from services.book_popularity import top_books as popular_top_books
+from services.distinct_metrics import distinct_metrics, ERROR_BOUND as DISTINCT_ERROR_BOUND
+from services.system_stats import system_stats
+from services.identity_cache import identity_cache
+from services.database import analytics_reads, pool_status, replica_monitor
+from utils.export import EXPORT_FORMATS, iter_csv, iter_ndjson
+from sqlalchemy import func, distinct
+from sqlalchemy.orm import joinedload, aliased
 from datetime import datetime, timedelta, timezone
 import logging
 
@@ -31,55 +40,119 @@ def get_online_users_count():
     try:
         cutoff_time = datetime.now(timezone.utc) - timedelta(minutes=5)
         
-        # Get users who viewed books in the last 5 minutes
-        recent_viewers = db.session.query(distinct(ViewHistory.user_id)).filter(
-            ViewHistory.viewed_at >= cutoff_time
-        ).subquery()
-        
-        # Get users who read books in the last 5 minutes
-        recent_readers = db.session.query(distinct(ReadingHistory.user_id)).filter(
-            ReadingHistory.last_read_at >= cutoff_time
-        ).subquery()
-        
-        # Combine both sets (union)
-        online_user_ids = db.session.query(recent_viewers.c.user_id).union(
-            db.session.query(recent_readers.c.user_id)
-        ).distinct()
-        
-        return online_user_ids.count()
+        # Users who viewed or read books, from per-minute HyperLogLog sketches
+        return distinct_metrics.count('online_users', cutoff_time)
     except Exception as e:
         logger.error(f"Error calculating online users: {e}")
         return 0
 
+# ============================================
+# LIST FILTERS (shared by list and export endpoints)
+# ============================================
+
+def filter_users(query, args):
+    """Apply ?search=&role=&is_banned= to a query over users"""
+    search = args.get('search', '')
+    role = args.get('role', '')
+    is_banned = args.get('is_banned', '')
+    
+    # Search filter
+    if search:
+        search_term = f'%{search}%'
+        query = query.filter(
+            (User.username.ilike(search_term)) | (User.email.ilike(search_term))
+        )
+    
+    # Role filter
+    if role:
+        query = query.filter(User.role == role)
+    
+    # Ban status filter
+    if is_banned.lower() in ['true', 'false']:
+        query = query.filter(User.is_banned == (is_banned.lower() == 'true'))
+    
+    return query
+
+def filter_messages(query, args):
+    """Apply ?search=&user_id=&is_deleted= to a query over messages"""
+    search = args.get('search', '')
+    user_id = args.get('user_id', type=int)
+    is_deleted = args.get('is_deleted', '')
+    
+    # Search filter (full-text, backed by idx_message_content_tsv)
+    if search:
+        query = query.filter(Message.search_filter(search))
+    
+    # User filter
+    if user_id:
+        query = query.filter(Message.user_id == user_id)
+    
+    # Deleted status filter
+    if is_deleted.lower() in ['true', 'false']:
+        query = query.filter(Message.is_deleted == (is_deleted.lower() == 'true'))
+    
+    return query
+
+def filter_reports(query, args):
+    """Apply ?status= to a query over message reports"""
+    status = args.get('status', '')
+    
+    if status:
+        query = query.filter(MessageReport.status == status)
+    
+    return query
+
+def filter_conversations(query, args):
+    """Apply ?search=&user_id=&is_positive= to a query over chatbot conversations"""
+    search = args.get('search', '')
+    user_id = args.get('user_id', type=int)
+    is_positive = args.get('is_positive', '')
+    
+    # Search filter
+    if search:
+        search_term = f'%{search}%'
+        query = query.filter(
+            (BotConversation.user_message.ilike(search_term)) |
+            (BotConversation.bot_response.ilike(search_term))
+        )
+    
+    # User filter
+    if user_id:
+        query = query.filter(BotConversation.user_id == user_id)
+    
+    # Feedback filter
+    if is_positive.lower() in ['true', 'false']:
+        query = query.filter(BotConversation.is_positive == (is_positive.lower() == 'true'))
+    
+    return query
+
 @admin_bp.route('/dashboard/stats', methods=['GET'])
 @admin_required
+@analytics_reads
 @log_requests
 def get_dashboard_stats():
     """Get admin dashboard statistics - Comprehensive overview"""
     try:
-        today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        today = utc_today()
+        chart_days = date_range(today - timedelta(days=6), today)
+        # Per-day counters come from the daily_stats rollup (refreshed by a background job)
+        daily = load_daily_stats(chart_days[0], today)
         
         total_users = User.query.count()
         total_books = Book.query.count()
         total_messages = Message.query.filter_by(is_deleted=False).count()
         
-        chatbot_messages_today = BotConversation.query.filter(
-            BotConversation.created_at >= today_start
-        ).count()
+        chatbot_messages_today = daily[today].bot_conversations if today in daily else 0
         
         online_users_count = get_online_users_count()
         
         # Top books by view count with unique viewers
-        top_books = db.session.query(
-            Book.id, Book.title, Book.view_count, Book.cover_image,
-            func.count(func.distinct(ViewHistory.user_id)).label('unique_viewers')
-        ).outerjoin(
-            ViewHistory, Book.id == ViewHistory.book_id
-        ).group_by(
-            Book.id, Book.title, Book.view_count, Book.cover_image
-        ).order_by(
-            Book.view_count.desc()
-        ).limit(10).all()
+        # unique_viewers comes from the book_popularity materialized view
+        top_books = popular_top_books(10)
+        
+        viewers_7d = distinct_metrics.count_by_entity(
+            'book_viewers', today - timedelta(days=6), entity_ids=[book.id for book in top_books]
+        )
         
         top_books_data = [
             {
@@ -87,6 +160,7 @@ def get_dashboard_stats():
                 "title": book.title,
                 "view_count": book.view_count or 0,
                 "unique_viewers": book.unique_viewers or 0,
+                "unique_viewers_7d": viewers_7d.get(book.id, 0),
                 "cover_image": book.cover_image or ''
             }
             for book in top_books
@@ -95,33 +169,19 @@ def get_dashboard_stats():
         # Chart data for last 7 days
         chart_data = {"users": [], "messages": [], "chatbot_messages": []}
         
-        for i in range(6, -1, -1):
-            day_start = today_start - timedelta(days=i)
-            day_end = day_start + timedelta(days=1)
-            
+        for day in chart_days:
+            row = daily.get(day)
             chart_data["users"].append({
-                "date": day_start.strftime("%Y-%m-%d"),
-                "count": User.query.filter(
-                    User.created_at >= day_start,
-                    User.created_at < day_end
-                ).count()
+                "date": day.isoformat(),
+                "count": row.signups if row else 0
             })
-            
             chart_data["messages"].append({
-                "date": day_start.strftime("%Y-%m-%d"),
-                "count": Message.query.filter(
-                    Message.created_at >= day_start,
-                    Message.created_at < day_end,
-                    Message.is_deleted == False
-                ).count()
+                "date": day.isoformat(),
+                "count": row.visible_messages if row else 0
             })
-            
             chart_data["chatbot_messages"].append({
-                "date": day_start.strftime("%Y-%m-%d"),
-                "count": BotConversation.query.filter(
-                    BotConversation.created_at >= day_start,
-                    BotConversation.created_at < day_end
-                ).count()
+                "date": day.isoformat(),
+                "count": row.bot_conversations if row else 0
             })
         
         return jsonify({
@@ -154,26 +214,8 @@ def get_users():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
-        search = request.args.get('search', '')
-        role = request.args.get('role', '')
-        is_banned = request.args.get('is_banned', '')
-        
-        query = User.query
-        
-        # Search filter
-        if search:
-            search_term = f'%{search}%'
-            query = query.filter(
-                (User.username.ilike(search_term)) | (User.email.ilike(search_term))
-            )
-        
-        # Role filter
-        if role:
-            query = query.filter_by(role=role)
         
-        # Ban status filter
-        if is_banned.lower() in ['true', 'false']:
-            query = query.filter_by(is_banned=is_banned.lower() == 'true')
+        query = filter_users(User.query, request.args)
         
         # Pagination
         paginated = query.order_by(User.created_at.desc())\
@@ -250,7 +292,9 @@ def ban_user(user_id):
             }), 403
         
         user.is_banned = is_banned
+        user.bump_auth_version()
         db.session.commit()
+        identity_cache.mark_changed(user)
         
         action = "banned" if is_banned else "unbanned"
         logger.info(f"User {user_id} {action} by admin {current_user_id}")
@@ -304,7 +348,9 @@ def update_user_role(user_id):
             }), 404
         
         user.role = role
+        user.bump_auth_version()
         db.session.commit()
+        identity_cache.mark_changed(user)
         
         logger.info(f"User {user_id} role updated to {role} by admin {current_user_id}")
         
@@ -329,16 +375,13 @@ def get_reports():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
-        status = request.args.get('status', '')
-        
         query = MessageReport.query.options(
             db.joinedload(MessageReport.reporter),
             db.joinedload(MessageReport.message).joinedload(Message.user),
             db.joinedload(MessageReport.resolved_by)
         )
         
-        if status:
-            query = query.filter_by(status=status)
+        query = filter_reports(query, request.args)
         
         paginated = query.order_by(MessageReport.created_at.desc())\
             .paginate(page=page, per_page=per_page, error_out=False)
@@ -420,16 +463,22 @@ def resolve_report(report_id):
                 "message": "Report already resolved"
             }), 400
         
+        deleted_message = None
         if action == 'delete_message':
             message = Message.query.get(report.message_id)
-            if message:
+            if message and not message.is_deleted:
                 message.is_deleted = True
+                ChatRoom.adjust_counters(message.room_id, messages=-1)
+                deleted_message = message
         
         report.status = 'resolved'
         report.resolved_at = datetime.utcnow()
         report.resolved_by_id = current_user_id
         db.session.commit()
         
+        if deleted_message:
+            room_message_cache.remove(deleted_message.id, deleted_message.room_id, deleted_message.parent_id)
+        
         logger.info(f"Report {report_id} resolved with action '{action}' by admin {current_user_id}")
         
         return jsonify({
@@ -453,26 +502,11 @@ def get_messages():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
-        search = request.args.get('search', '')
-        user_id = request.args.get('user_id', type=int)
-        is_deleted = request.args.get('is_deleted', '')
-        
         query = Message.query.options(
             joinedload(Message.user)
         )
         
-        # Search filter
-        if search:
-            search_term = f'%{search}%'
-            query = query.filter(Message.content.ilike(search_term))
-        
-        # User filter
-        if user_id:
-            query = query.filter_by(user_id=user_id)
-        
-        # Deleted status filter
-        if is_deleted.lower() in ['true', 'false']:
-            query = query.filter_by(is_deleted=is_deleted.lower() == 'true')
+        query = filter_messages(query, request.args)
         
         # Pagination
         paginated = query.order_by(Message.created_at.desc())\
@@ -513,6 +547,7 @@ def get_messages():
 
 @admin_bp.route('/messages/stats', methods=['GET'])
 @admin_required
+@analytics_reads
 @rate_limit(requests_per_minute=30)
 def get_message_stats():
     """Get aggregated message statistics for visualization"""
@@ -523,83 +558,62 @@ def get_message_stats():
         if days > 90:
             days = 90
 
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days - 1)
-
-        date_trunc = func.date(Message.created_at)
-
-        base_filter = Message.query.filter(
-            Message.created_at >= start_date
-        )
-
-        total_messages = base_filter.count()
-        total_rooms = db.session.query(
-            func.count(distinct(Message.room_id))
-        ).filter(
-            Message.created_at >= start_date
-        ).scalar() or 0
-        total_users = db.session.query(
-            func.count(distinct(Message.user_id))
-        ).filter(
-            Message.created_at >= start_date,
-            Message.user_id.isnot(None)
-        ).scalar() or 0
+        end_day = utc_today()
+        start_day = end_day - timedelta(days=days - 1)
 
-        daily_rows = db.session.query(
-            date_trunc.label('day'),
-            func.count(Message.id).label('message_count'),
-            func.count(distinct(Message.room_id)).label('room_count'),
-            func.count(distinct(Message.user_id)).label('user_count')
-        ).filter(
-            Message.created_at >= start_date
-        ).group_by(
-            date_trunc
-        ).order_by(
-            date_trunc
-        ).all()
+        # Per-day and per-room counters come from the rollup tables
+        daily_rows = [
+            row for day, row in sorted(load_daily_stats(start_day, end_day).items())
+            if row.messages
+        ]
+        total_messages = sum(row.messages for row in daily_rows)
 
         room_rows = db.session.query(
-            Message.room_id,
+            DailyRoomStat.room_id,
             ChatRoom.name.label('room_name'),
-            func.count(Message.id).label('message_count'),
-            func.count(distinct(Message.user_id)).label('user_count'),
-            func.max(Message.created_at).label('last_active')
+            func.sum(DailyRoomStat.messages).label('message_count'),
+            func.max(DailyRoomStat.last_active).label('last_active')
         ).join(
-            ChatRoom, ChatRoom.id == Message.room_id
+            ChatRoom, ChatRoom.id == DailyRoomStat.room_id
         ).filter(
-            Message.created_at >= start_date
+            DailyRoomStat.day >= start_day,
+            DailyRoomStat.day <= end_day
         ).group_by(
-            Message.room_id,
+            DailyRoomStat.room_id,
             ChatRoom.name
         ).order_by(
-            func.count(Message.id).desc()
+            func.sum(DailyRoomStat.messages).desc()
         ).all()
+        total_rooms = len(room_rows)
 
         room_daily_rows = db.session.query(
-            Message.room_id,
+            DailyRoomStat.room_id,
             ChatRoom.name.label('room_name'),
-            date_trunc.label('day'),
-            func.count(Message.id).label('message_count'),
-            func.count(distinct(Message.user_id)).label('user_count')
+            DailyRoomStat.day,
+            DailyRoomStat.messages.label('message_count'),
+            DailyRoomStat.users.label('user_count')
         ).join(
-            ChatRoom, ChatRoom.id == Message.room_id
+            ChatRoom, ChatRoom.id == DailyRoomStat.room_id
         ).filter(
-            Message.created_at >= start_date
-        ).group_by(
-            Message.room_id,
-            ChatRoom.name,
-            date_trunc
+            DailyRoomStat.day >= start_day,
+            DailyRoomStat.day <= end_day
         ).order_by(
-            date_trunc,
-            Message.room_id
+            DailyRoomStat.day,
+            DailyRoomStat.room_id
         ).all()
 
+        # Distinct users over the window: merged daily HyperLogLog sketches
+        total_users = distinct_metrics.count_union('room_users', start_day, end_day)
+        room_users = distinct_metrics.count_by_entity(
+            'room_users', start_day, end_day, entity_ids=[row.room_id for row in room_rows]
+        )
+
         daily_stats = [
             {
                 "date": row.day.isoformat(),
-                "messages": int(row.message_count),
-                "rooms": int(row.room_count),
-                "users": int(row.user_count)
+                "messages": int(row.messages),
+                "rooms": int(row.message_rooms),
+                "users": int(row.message_users)
             }
             for row in daily_rows
         ]
@@ -609,7 +623,7 @@ def get_message_stats():
                 "room_id": row.room_id,
                 "room_name": row.room_name or f"Room #{row.room_id}",
                 "messages": int(row.message_count),
-                "users": int(row.user_count),
+                "users": int(room_users.get(row.room_id, 0)),
                 "last_active": row.last_active.isoformat() if row.last_active else None
             }
             for row in room_rows
@@ -628,12 +642,13 @@ def get_message_stats():
 
         summary = {
             "days": days,
-            "start_date": start_date.date().isoformat(),
-            "end_date": end_date.date().isoformat(),
+            "start_date": start_day.isoformat(),
+            "end_date": end_day.isoformat(),
             "total_messages": int(total_messages),
             "total_rooms": int(total_rooms),
             "total_users": int(total_users),
-            "avg_messages_per_room": round(total_messages / total_rooms, 2) if total_rooms else 0.0
+            "avg_messages_per_room": round(total_messages / total_rooms, 2) if total_rooms else 0.0,
+            "users_error_bound": round(DISTINCT_ERROR_BOUND, 4)
         }
 
         return jsonify({
@@ -653,6 +668,7 @@ def get_message_stats():
 
 @admin_bp.route('/chatbot/stats', methods=['GET'])
 @admin_required
+@analytics_reads
 @rate_limit(requests_per_minute=30)
 def get_chatbot_stats():
     """Get chatbot feedback statistics for visualization"""
@@ -663,51 +679,38 @@ def get_chatbot_stats():
         if days > 90:
             days = 90
 
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days - 1)
+        end_day = utc_today()
+        start_day = end_day - timedelta(days=days - 1)
 
-        base_query = BotConversation.query.filter(
-            BotConversation.created_at >= start_date
-        )
+        daily_rows = [
+            row for day, row in sorted(load_daily_stats(start_day, end_day).items())
+            if row.bot_conversations
+        ]
 
-        total_conversations = base_query.count()
-        positive_count = base_query.filter(BotConversation.is_positive.is_(True)).count()
-        negative_count = base_query.filter(BotConversation.is_positive.is_(False)).count()
-        neutral_count = base_query.filter(BotConversation.is_positive.is_(None)).count()
+        total_conversations = sum(row.bot_conversations for row in daily_rows)
+        positive_count = sum(row.bot_positive for row in daily_rows)
+        negative_count = sum(row.bot_negative for row in daily_rows)
+        neutral_count = sum(row.bot_neutral for row in daily_rows)
 
         feedback_total = positive_count + negative_count
         positive_ratio = (positive_count / feedback_total) if feedback_total else 0
         negative_ratio = (negative_count / feedback_total) if feedback_total else 0
 
-        daily_rows = db.session.query(
-            func.date(BotConversation.created_at).label('day'),
-            func.count(BotConversation.id).label('total'),
-            func.sum(case((BotConversation.is_positive.is_(True), 1), else_=0)).label('positive'),
-            func.sum(case((BotConversation.is_positive.is_(False), 1), else_=0)).label('negative'),
-            func.sum(case((BotConversation.is_positive.is_(None), 1), else_=0)).label('neutral')
-        ).filter(
-            BotConversation.created_at >= start_date
-        ).group_by(
-            func.date(BotConversation.created_at)
-        ).order_by(
-            func.date(BotConversation.created_at)
-        ).all()
-
         daily_stats = [
             {
                 "date": row.day.isoformat(),
-                "total": int(row.total or 0),
-                "positive": int(row.positive or 0),
-                "negative": int(row.negative or 0),
-                "neutral": int(row.neutral or 0),
+                "total": int(row.bot_conversations),
+                "positive": int(row.bot_positive),
+                "negative": int(row.bot_negative),
+                "neutral": int(row.bot_neutral),
             }
             for row in daily_rows
         ]
 
         summary = {
             "days": days,
-            "start_date": start_date.date().isoformat(),
-            "end_date": end_date.date().isoformat(),
+            "start_date": start_day.isoformat(),
+            "end_date": end_day.isoformat(),
             "total_conversations": int(total_conversations),
             "feedback_total": int(feedback_total),
             "positive_count": int(positive_count),
@@ -745,8 +748,13 @@ def delete_message(message_id):
                 "message": "Message not found"
             }), 404
         
+        was_deleted = message.is_deleted
         message.is_deleted = True
+        if not was_deleted:
+            ChatRoom.adjust_counters(message.room_id, messages=-1)
         db.session.commit()
+        if not was_deleted:
+            room_message_cache.remove(message.id, message.room_id, message.parent_id)
         
         logger.info(f"Message {message_id} deleted by admin {current_user_id}")
         
@@ -771,29 +779,11 @@ def get_chatbot_conversations():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
-        search = request.args.get('search', '')
-        user_id = request.args.get('user_id', type=int)
-        is_positive = request.args.get('is_positive', '')
-        
         query = BotConversation.query.options(
             joinedload(BotConversation.user)
         )
         
-        # Search filter
-        if search:
-            search_term = f'%{search}%'
-            query = query.filter(
-                (BotConversation.user_message.ilike(search_term)) |
-                (BotConversation.bot_response.ilike(search_term))
-            )
-        
-        # User filter
-        if user_id:
-            query = query.filter_by(user_id=user_id)
-        
-        # Feedback filter
-        if is_positive.lower() in ['true', 'false']:
-            query = query.filter_by(is_positive=is_positive.lower() == 'true')
+        query = filter_conversations(query, request.args)
         
         # Pagination
         paginated = query.order_by(BotConversation.created_at.desc())\
@@ -867,7 +857,9 @@ def ban_user_direct(user_id):
             }), 403
         
         user.is_banned = True
+        user.bump_auth_version()
         db.session.commit()
+        identity_cache.mark_changed(user)
         
         logger.info(f"User {user_id} ({user.username}) banned by admin {current_user_id}. Reason: {reason}")
         
@@ -949,73 +941,131 @@ def delete_comment(comment_id):
             "message": "Failed to delete comment"
         }), 500
 
+# ============================================
+# STREAMING EXPORT
+# ============================================
+
+EXPORT_BATCH_SIZE = 1000
+
+def build_export_query(dataset, args):
+    """Flat column query for an export dataset, filtered like its list endpoint
+
+    Returns:
+        tuple: (column names, query) or None for an unknown dataset
+    """
+    if dataset == 'users':
+        columns = ['id', 'username', 'email', 'role', 'is_banned', 'created_at']
+        query = db.session.query(
+            User.id, User.username, User.email, User.role, User.is_banned, User.created_at
+        )
+        return columns, filter_users(query, args).order_by(User.created_at.desc())
+    
+    if dataset == 'messages':
+        columns = ['id', 'user_id', 'username', 'room_id', 'parent_id', 'content',
+                   'image_url', 'is_deleted', 'created_at']
+        query = db.session.query(
+            Message.id, Message.user_id, User.username, Message.room_id, Message.parent_id,
+            Message.content, Message.image_url, Message.is_deleted, Message.created_at
+        ).outerjoin(User, User.id == Message.user_id)
+        return columns, filter_messages(query, args).order_by(Message.created_at.desc())
+    
+    if dataset == 'reports':
+        reporter = aliased(User)
+        columns = ['id', 'message_id', 'reason', 'status', 'created_at', 'resolved_at',
+                   'reporter_id', 'reporter_username', 'resolved_by',
+                   'message_user_id', 'message_content']
+        query = db.session.query(
+            MessageReport.id, MessageReport.message_id, MessageReport.reason, MessageReport.status,
+            MessageReport.created_at, MessageReport.resolved_at,
+            MessageReport.reporter_id, reporter.username, MessageReport.resolved_by,
+            Message.user_id, Message.content
+        ).outerjoin(
+            reporter, reporter.id == MessageReport.reporter_id
+        ).outerjoin(
+            Message, Message.id == MessageReport.message_id
+        )
+        return columns, filter_reports(query, args).order_by(MessageReport.created_at.desc())
+    
+    if dataset == 'conversations':
+        columns = ['id', 'user_id', 'username', 'user_message', 'bot_response',
+                   'is_positive', 'created_at']
+        query = db.session.query(
+            BotConversation.id, BotConversation.user_id, User.username,
+            BotConversation.user_message, BotConversation.bot_response,
+            BotConversation.is_positive, BotConversation.created_at
+        ).outerjoin(User, User.id == BotConversation.user_id)
+        return columns, filter_conversations(query, args).order_by(BotConversation.created_at.desc())
+    
+    return None
+
+@admin_bp.route('/export/<dataset>', methods=['GET'])
+@admin_required
+@analytics_reads
+@rate_limit(requests_per_minute=5)
+def export_dataset(dataset):
+    """Stream a dataset as NDJSON or CSV
+    GET /api/admin/export/<users|messages|reports|conversations>?format=csv&<list filters>
+    
+    Rows come from a server-side cursor in batches of EXPORT_BATCH_SIZE, so
+    memory stays constant however large the table is.
+    """
+    try:
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({
+                "status": "error",
+                "message": f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}"
+            }), 400
+        
+        export = build_export_query(dataset, request.args)
+        if export is None:
+            return jsonify({
+                "status": "error",
+                "message": "Unknown dataset. Use one of: users, messages, reports, conversations"
+            }), 404
+        columns, query = export
+        
+        rows = query.yield_per(EXPORT_BATCH_SIZE)
+        encoder = iter_csv if export_format == 'csv' else iter_ndjson
+        filename = f"{dataset}_{datetime.utcnow():%Y%m%d_%H%M%S}.{export_format}"
+        
+        logger.info(f"Admin {get_jwt_identity()} exporting {dataset} as {export_format}")
+        return Response(
+            stream_with_context(encoder(columns, rows, EXPORT_BATCH_SIZE)),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        
+    except Exception as e:
+        logger.error(f"Export {dataset} error: {e}")
+        return jsonify({
+            "status": "error",
+            "message": "Failed to export data"
+        }), 500
+
 @admin_bp.route('/system/stats', methods=['GET'])
 @admin_required
+@analytics_reads
 @rate_limit(requests_per_minute=30)
 def get_system_stats():
-    """Get system statistics"""
+    """Get system statistics
+
+    Row counts are planner estimates from a cached snapshot (refreshed in the
+    background); pass ?exact=true for exact COUNT(*) values.
+    """
     try:
-        # Database statistics
-        db_stats = {
-            "user_count": User.query.count(),
-            "book_count": Book.query.count(),
-            "message_count": Message.query.count(),
-            "comment_count": BookComment.query.count(),
-            "rating_count": BookRating.query.count(),
-            "reading_history_count": ReadingHistory.query.count(),
-            "bookmark_count": Bookmark.query.count(),
-            "chat_count": BotConversation.query.count(),
-            "active_users_last_7_days": db.session.query(ReadingHistory.user_id).filter(
-                ReadingHistory.last_read_at >= datetime.utcnow() - timedelta(days=7)
-            ).distinct().count()
-        }
-        
-        # Database size (approximation for Neon DB)
-        db_size = db.session.execute(
-            db.text("SELECT pg_size_pretty(pg_database_size(current_database())) as db_size")
-        ).scalar() or 'Unknown'
-        db_stats['database_size'] = db_size
-        
-        # Recent activity (last 24 hours)
-        recent_activity = []
-        # Users
-        recent_users = User.query.filter(
-            User.created_at >= datetime.utcnow() - timedelta(hours=24)
-        ).order_by(User.created_at.desc()).limit(3).all()
-        recent_activity.extend([{
-            "type": "user",
-            "title": user.username,
-            "date": user.created_at.isoformat() if user.created_at else None
-        } for user in recent_users])
-        
-        # Books
-        recent_books = Book.query.filter(
-            Book.created_at >= datetime.utcnow() - timedelta(hours=24)
-        ).order_by(Book.created_at.desc()).limit(3).all()
-        recent_activity.extend([{
-            "type": "book",
-            "title": book.title,
-            "date": book.created_at.isoformat() if book.created_at else None
-        } for book in recent_books])
-        
-        # Comments
-        recent_comments = BookComment.query.filter(
-            BookComment.created_at >= datetime.utcnow() - timedelta(hours=24)
-        ).order_by(BookComment.created_at.desc()).limit(3).all()
-        recent_activity.extend([{
-            "type": "comment",
-            "title": comment.content[:50],
-            "date": comment.created_at.isoformat() if comment.created_at else None
-        } for comment in recent_comments])
-        
-        recent_activity = sorted(recent_activity, key=lambda x: x['date'] or '', reverse=True)[:8]
+        exact = request.args.get('exact', 'false').lower() == 'true'
+        stats, snapshot = system_stats.get(exact=exact)
         
         return jsonify({
             "status": "success",
-            "system_stats": {
-                **db_stats,
-                "recent_activity": recent_activity
-            }
+            "system_stats": stats,
+            "snapshot": snapshot,
+            "db_pools": pool_status(),
+            "replica": replica_monitor.status()
         }), 200
         
     except Exception as e:
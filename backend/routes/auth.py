@@ -3,7 +3,12 @@ from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identi
 from extensions import db
 from models.user import User
 from models.refresh_token import RefreshToken
-from middleware.auth_middleware import validate_email, validate_username, validate_password_strength
+from middleware.auth_middleware import validate_email, validate_username, validate_password_strength, get_ip_identifier, get_refresh_token_identifier
+from middleware.rate_limiting import rate_limit
+from services.identity_cache import identity_cache, token_claims
+from services.refresh_tokens import (
+    rotate_refresh_token, ACCESS_TOKEN_LIFETIME, REFRESH_TOKEN_LIFETIME, REFRESH_COOKIE_MAX_AGE
+)
 import logging
 from datetime import timedelta, timezone
 from utils.error_handler import create_error_response
@@ -23,25 +28,26 @@ def get_device_info():
 def create_tokens(user, device_info=None):
     """
     Helper function to create access and refresh tokens
-    - AT: 15 phút, không lưu DB
-    - RT: 30 ngày, lưu DB với rotation support
+    - AT: ACCESS_TOKEN_MINUTES, không lưu DB
+    - RT: REFRESH_TOKEN_DAYS, lưu DB với rotation support
     """
     user_identity = str(user.id)
     
-    # Tạo Access Token (1 phút để dễ debug)
+    # Tạo Access Token
     access_token = create_access_token(
         identity=user_identity,
-        expires_delta=timedelta(minutes=10),
-        additional_claims={"role": user.role, "username": user.username}
+        expires_delta=ACCESS_TOKEN_LIFETIME,
+        additional_claims=token_claims(user)
     )
     
-    # Tạo Refresh Token (30 ngày, lưu DB)
+    # Tạo Refresh Token (lưu DB)
     if device_info is None:
         device_info = get_device_info()
     
     refresh_token_str, refresh_token_obj = RefreshToken.create_token(
         user_id=user.id,
-        device_info=device_info
+        device_info=device_info,
+        lifetime=REFRESH_TOKEN_LIFETIME
     )
     
     return access_token, refresh_token_str
@@ -120,7 +126,7 @@ def register():
         response.set_cookie(
             'refresh_token',
             refresh_token,
-            max_age=30 * 24 * 60 * 60,  # 30 ngày
+            max_age=REFRESH_COOKIE_MAX_AGE,
             httponly=True,
             secure=False,  # Set True trong production với HTTPS
             samesite='Lax'
@@ -162,6 +168,12 @@ def login():
             logger.info(f"Banned user attempted login: {username} (ID: {user.id})")
             return create_error_response("Account is banned", 403)
         
+        # Hash cũ với cost khác BCRYPT_ROUNDS: hash lại ngay khi có mật khẩu gốc
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
+            logger.info(f"Password rehashed for user: {username} (ID: {user.id})")
+        
         device_info = get_device_info()
         access_token, refresh_token = create_tokens(user, device_info)
         
@@ -181,7 +193,7 @@ def login():
         response.set_cookie(
             'refresh_token',
             refresh_token,
-            max_age=30 * 24 * 60 * 60,  # 30 ngày
+            max_age=REFRESH_COOKIE_MAX_AGE,
             httponly=True,
             secure=False,  # Set True trong production với HTTPS
             samesite='Lax'
@@ -191,7 +203,6 @@ def login():
         
     except Exception as e:
         logger.error(f"Login error for {username}: {str(e)}")
-        print(f"Login error for {username}: {str(e)}")  # Debug
         return create_error_response("Internal server error", 500)
 
 @auth_bp.route('/me', methods=['GET'])
@@ -223,6 +234,8 @@ def get_current_user():
         return create_error_response("Internal server error", 500)
 
 @auth_bp.route('/refresh', methods=['POST'])
+@rate_limit(name='refresh', key_func=get_ip_identifier)
+@rate_limit(name='refresh_token', key_func=get_refresh_token_identifier)
 def refresh():
     """
     Refresh JWT token với RT rotation và reuse detection
@@ -256,19 +269,25 @@ def refresh():
             logger.warning(f"Invalid refresh token type: {type(refresh_token)}")
             return create_error_response("Invalid refresh token", 401)
         
-        # Validate RT trong DB
-        token_obj = RefreshToken.validate_token(refresh_token)
+        # Rotate RT (revoke cũ + tạo mới trong một câu lệnh), có grace window cho nhiều tab
+        try:
+            rotation = rotate_refresh_token(refresh_token, get_device_info())
+        except ValueError as e:
+            # Reuse detected
+            logger.error(f"Refresh token reuse detected: {str(e)}")
+            return create_error_response("Token reuse detected - please login again", 401)
         
-        if not token_obj:
+        if not rotation:
             logger.warning(f"Invalid or expired refresh token")
             return create_error_response("Invalid or expired refresh token", 401)
         
-        # Lấy user
-        with current_app.app_context():
-            user = User.query.get(token_obj.user_id)
+        user_id, new_refresh_token_str, rotated = rotation
+        
+        # Lấy user (identity snapshot, không load cả ORM object)
+        user = identity_cache.get(user_id)
         
         if not user:
-            logger.warning(f"User not found for refresh: {token_obj.user_id}")
+            logger.warning(f"User not found for refresh: {user_id}")
             return create_error_response("User not found", 404)
         
         if user.is_banned:
@@ -277,24 +296,18 @@ def refresh():
             RefreshToken.revoke_user_tokens(user.id)
             return create_error_response("Account is banned", 403)
         
-        # Rotate RT (tạo mới, revoke cũ) với reuse detection
-        try:
-            device_info = get_device_info()
-            new_refresh_token_str, new_token_obj = token_obj.rotate_token(device_info)
-        except ValueError as e:
-            # Reuse detected
-            logger.error(f"Token reuse detected for user {user.id}: {str(e)}")
-            return create_error_response("Token reuse detected - please login again", 401)
-        
-        # Tạo AT mới (1 phút để dễ debug)
+        # Tạo AT mới
         user_identity = str(user.id)
         new_access_token = create_access_token(
             identity=user_identity,
-            expires_delta=timedelta(minutes=1),
-            additional_claims={"role": user.role, "username": user.username}
+            expires_delta=ACCESS_TOKEN_LIFETIME,
+            additional_claims=token_claims(user)
         )
         
-        logger.info(f"Token refreshed for user: {user.username} (ID: {user.id})")
+        logger.info(
+            f"Token refreshed for user: {user.username} (ID: {user.id})"
+            f"{'' if rotated else ' (grace window, concurrent refresh)'}"
+        )
         
         # Tạo response với RT mới trong cookie
         response = make_response(jsonify({
@@ -309,7 +322,7 @@ def refresh():
         response.set_cookie(
             'refresh_token',
             new_refresh_token_str,
-            max_age=30 * 24 * 60 * 60,  # 30 ngày
+            max_age=REFRESH_COOKIE_MAX_AGE,
             httponly=True,
             secure=False,  # Set True trong production với HTTPS
             samesite='Lax'
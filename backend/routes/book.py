@@ -24,10 +24,20 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 from urllib.parse import urlparse
 from utils.error_handler import create_error_response
-from utils.image_utils import convert_image_to_webp, get_image_size_reduction
-from middleware.auth_middleware import sanitize_input, admin_required
+from services.book_popularity import WINDOWS as POPULARITY_WINDOWS, order_by_window
+from services.distinct_metrics import distinct_metrics
+from services.storage import get_storage
+from services.upload_pipeline import upload_pipeline, read_upload, UploadError
+from utils.image_utils import pick_variant
+from services.metrics import span
+from services.database import replica_reads
+from services.loading import loading_policy
+from middleware.auth_middleware import sanitize_input, admin_required, current_identity
+from middleware.rate_limiting import rate_limit
 import logging
 import os
+import uuid
+import functools
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -39,7 +49,6 @@ book_bp = Blueprint('book', __name__)
 # Helper function to serialize book data - ĐỔI TÊN FUNCTION
 def book_to_dict(book, include_details=False, current_user_id=None):
     """Convert Book object to dict with enhanced search support"""
-    print(f"🔍 BLUEPRINT book_to_dict CALLED - Book: {book.id}, User: {current_user_id}")
     
     # Calculate average rating
     avg_rating = db.session.query(func.avg(BookRating.rating))\
@@ -83,6 +92,7 @@ def book_to_dict(book, include_details=False, current_user_id=None):
         'category_name': book.category.name if book.category else '',
         'chapter_count': book.chapter_count or 0,
         'cover_image': book.cover_image or '',
+        'cover_thumbnail': pick_variant(book.cover_variants, 'card', book.cover_image or ''),
         'created_at': book.created_at.isoformat() if book.created_at else None,
         'description': book.description or '',
         'image_path': book.image_path or None,
@@ -107,7 +117,6 @@ def book_to_dict(book, include_details=False, current_user_id=None):
             'bookmarks_count': Bookmark.query.filter_by(book_id=book.id).count(),
         })
     
-    print(f"✅ FINAL DATA - Book {book.id} has 'is_favorite': {data['is_favorite']}, 'is_bookmarked': {data['is_bookmarked']}, 'avg_rating': {data['avg_rating']}")
     return data
 # ============================================
 # BOOK LISTING & SEARCH
@@ -115,6 +124,7 @@ def book_to_dict(book, include_details=False, current_user_id=None):
 
 @book_bp.route('/', methods=['GET'])
 @jwt_required(optional=True)
+@replica_reads
 def get_books():
     """Get books with IMPROVED search functionality
     
@@ -229,12 +239,15 @@ def get_books():
             # For search suggestions: just limit results
             books_list = books_query.limit(limit).all()
             
-            return jsonify({
-                'status': 'success',
-                'books': [
+            with span('serialize'):
+                books_data = [
                     book_to_dict(book, include_details=False, current_user_id=current_user_id)
                     for book in books_list
-                ],
+                ]
+            
+            return jsonify({
+                'status': 'success',
+                'books': books_data,
                 'search_info': {
                     'term': search_term,
                     'results_count': len(books_list),
@@ -247,10 +260,11 @@ def get_books():
             paginated = books_query.paginate(page=page, per_page=per_page, error_out=False)
             books_list = paginated.items
             
-            books_data = [
-                book_to_dict(book, include_details=False, current_user_id=current_user_id)
-                for book in books_list
-            ]
+            with span('serialize'):
+                books_data = [
+                    book_to_dict(book, include_details=False, current_user_id=current_user_id)
+                    for book in books_list
+                ]
             
             response_data = {
                 'status': 'success',
@@ -279,6 +293,8 @@ def get_books():
 from routes.book import book_to_dict as blueprint_book_to_dict
 @book_bp.route('/search', methods=['GET'])
 @jwt_required(optional=True)
+@rate_limit(name='search')
+@replica_reads
 def search_books():
     """Advanced book search with multiple fields and ranking
     
@@ -374,10 +390,11 @@ def search_books():
         # Paginate
         paginated = books_query.paginate(page=page, per_page=per_page, error_out=False)
         
-        books_data = [
-            book_to_dict(book, current_user_id=current_user_id) 
-            for book in paginated.items
-        ]
+        with span('serialize'):
+            books_data = [
+                book_to_dict(book, current_user_id=current_user_id) 
+                for book in paginated.items
+            ]
         
         response_data = {
             'status': 'success',
@@ -407,6 +424,7 @@ def search_books():
         return create_error_response(str(e), 500)
 @book_bp.route('/suggestions', methods=['GET'])
 @jwt_required(optional=True)
+@replica_reads
 def get_search_suggestions():
     """Fast search suggestions for autocomplete
     
@@ -490,6 +508,7 @@ def get_book(book_id):
 
         # ✅ Nếu có user đăng nhập, cập nhật lịch sử xem
         if current_user_id:
+            distinct_metrics.record_view(current_user_id, book_id)
             now = datetime.now(timezone.utc)
             twenty_four_hours_ago = now - timedelta(hours=24)
 
@@ -543,7 +562,7 @@ def read_book(book_id):
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to read book: {current_user_id}")
@@ -578,6 +597,7 @@ def read_book(book_id):
             history.last_read_at = datetime.utcnow()
         
         db.session.commit()
+        distinct_metrics.record_read(current_user_id)
         
         # Get page content
         page = BookPage.query.filter_by(
@@ -617,7 +637,7 @@ def update_reading_history(book_id, page_number):
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to update history: {current_user_id}")
@@ -650,6 +670,7 @@ def update_reading_history(book_id, page_number):
             history.last_read_at = datetime.utcnow()
         
         db.session.commit()
+        distinct_metrics.record_read(current_user_id)
         
         logger.info(f"Updated reading history for user {current_user_id}, book {book_id}, page {page_number}")
         return jsonify({
@@ -682,7 +703,7 @@ def add_bookmark(book_id):
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to add bookmark: {current_user_id}")
@@ -747,7 +768,7 @@ def get_bookmarks():
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to get bookmarks: {current_user_id}")
@@ -757,7 +778,7 @@ def get_bookmarks():
         per_page = request.args.get('per_page', 20, type=int)
         
         bookmarks_query = Bookmark.query.filter_by(user_id=current_user_id)\
-            .options(joinedload(Bookmark.book).joinedload(Book.category))\
+            .options(*loading_policy('bookmark_listing'))\
             .order_by(Bookmark.created_at.desc())
         
         paginated = bookmarks_query.paginate(page=page, per_page=per_page, error_out=False)
@@ -806,7 +827,7 @@ def delete_bookmark(bookmark_id):
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to delete bookmark: {current_user_id}")
@@ -843,7 +864,7 @@ def delete_bookmark_by_book_id(book_id):
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to delete bookmark: {current_user_id}")
@@ -877,6 +898,7 @@ def delete_bookmark_by_book_id(book_id):
 # ============================================
 
 @book_bp.route('/<int:book_id>/ratings', methods=['GET'])
+@replica_reads
 def get_book_ratings(book_id):
     """Get book ratings with pagination
     GET /api/books/<id>/ratings?page=1&per_page=20
@@ -933,7 +955,7 @@ def rate_book(book_id):
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to rate book: {current_user_id}")
@@ -985,6 +1007,7 @@ def rate_book(book_id):
         return create_error_response(str(e), 500)
 
 @book_bp.route('/<int:book_id>/comments', methods=['GET'])
+@replica_reads
 def get_book_comments(book_id):
     """Get book comments with pagination - INCLUDES RATINGS"""
     try:
@@ -1014,7 +1037,6 @@ def get_book_comments(book_id):
                     'rating': rating.rating,
                     'review': rating.review
                 }
-                print(f"⭐ Found rating for user {comment.user_id}: {rating.rating} stars, review: {rating.review}")
             
             # ✅ Load replies với rating info
             replies = BookComment.query.filter_by(parent_id=comment.id)\
@@ -1047,18 +1069,10 @@ def get_book_comments(book_id):
                 'replies': [comment_to_dict(reply) for reply in replies]
             }
             
-            print(f"📝 Comment {comment.id} by {user_info['username']} - Rating: {rating_info}")
             return result
         
         result = [comment_to_dict(c) for c in paginated.items]
         
-        # DEBUG: Log để kiểm tra
-        for comment in result:
-            if comment.get('rating'):
-                print(f"✅ Comment {comment['id']} has rating: {comment['rating']}")
-            else:
-                print(f"❌ Comment {comment['id']} has NO rating")
-        
         logger.info(f"Retrieved {len(result)} comments with ratings for book {book_id}")
         return jsonify({
             'status': 'success',
@@ -1157,7 +1171,7 @@ def delete_comment(comment_id):
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to delete comment: {current_user_id}")
@@ -1191,6 +1205,7 @@ def delete_comment(comment_id):
 # ============================================
 
 @book_bp.route('/categories', methods=['GET'])
+@replica_reads
 def get_categories():
     """Get all categories from database"""
     try:
@@ -1213,6 +1228,7 @@ def get_categories():
         return create_error_response(str(e), 500)
 
 @book_bp.route('/authors', methods=['GET'])
+@replica_reads
 def get_authors():
     """Get all authors from database"""
     try:
@@ -1228,29 +1244,52 @@ def get_authors():
         logger.error(f"Error fetching authors: {str(e)}")
         return create_error_response(str(e), 500)
 
+def popular_books(query, window, limit, current_user_id=None):
+    """Serialize the most popular books of a query
+
+    window=None ranks by lifetime view_count; '24h' / '7d' / 'all' rank by
+    views in that window (book_popularity view) and add 'recent_views' and
+    'recent_viewers' to each book.
+    """
+    if not window:
+        books = query.order_by(Book.view_count.desc()).limit(limit).all()
+        return [book_to_dict(book, current_user_id=current_user_id) for book in books]
+
+    query, views, viewers = order_by_window(query, window)
+    result = []
+    for book, recent_views, recent_viewers in query.add_columns(views, viewers).limit(limit).all():
+        data = book_to_dict(book, current_user_id=current_user_id)
+        data['recent_views'] = int(recent_views)
+        data['recent_viewers'] = int(recent_viewers)
+        result.append(data)
+    return result
+
 @book_bp.route('/categories/<int:category_id>/popular', methods=['GET'])
 @jwt_required(optional=True)  # THÊM DECORATOR NÀY
+@replica_reads
 def get_popular_by_category(category_id):
     """Get popular books by category
-    GET /api/books/categories/<id>/popular?limit=10
+    GET /api/books/categories/<id>/popular?limit=10&window=7d
+    window: 24h | 7d | all (omit for lifetime view_count)
     """
     try:
         current_user_id = get_jwt_identity()  # THÊM DÒNG NÀY
         
         limit = request.args.get('limit', 10, type=int)
+        window = request.args.get('window')
+        if window and window not in POPULARITY_WINDOWS:
+            return create_error_response(f"Invalid window. Use one of: {', '.join(POPULARITY_WINDOWS)}", 400)
         
         category = Category.query.get(category_id)
         if not category:
             logger.warning(f"Category not found: {category_id}")
             return create_error_response('Category not found', 404)
         
-        books = Book.query.filter_by(category_id=category_id)\
-            .options(joinedload(Book.authors))\
-            .order_by(Book.view_count.desc())\
-            .limit(limit).all()
+        query = Book.query.filter_by(category_id=category_id)\
+            .options(joinedload(Book.authors))
         
         # SỬA: Thêm current_user_id
-        result = [book_to_dict(book, current_user_id=current_user_id) for book in books]
+        result = popular_books(query, window, limit, current_user_id)
         
         logger.info(f"Retrieved {len(result)} popular books for category {category_id}")
         return jsonify({
@@ -1265,19 +1304,24 @@ def get_popular_by_category(category_id):
 
 @book_bp.route('/popular', methods=['GET'])
 @jwt_required(optional=True)
+@replica_reads
 def get_popular_books():
-    """Get popular books overall"""
+    """Get popular books overall
+    GET /api/books/popular?limit=10&window=24h
+    window: 24h | 7d | all (omit for lifetime view_count)
+    """
     try:
         current_user_id = get_jwt_identity()  # LẤY USER ID
         
         limit = request.args.get('limit', 10, type=int)
+        window = request.args.get('window')
+        if window and window not in POPULARITY_WINDOWS:
+            return create_error_response(f"Invalid window. Use one of: {', '.join(POPULARITY_WINDOWS)}", 400)
         
-        books = Book.query.options(joinedload(Book.category), joinedload(Book.authors))\
-            .order_by(Book.view_count.desc())\
-            .limit(limit).all()
+        query = Book.query.options(joinedload(Book.category), joinedload(Book.authors))
         
         # SỬA: Thêm current_user_id vào book_to_dict
-        result = [book_to_dict(book, current_user_id=current_user_id) for book in books]
+        result = popular_books(query, window, limit, current_user_id)
         
         logger.info(f"Retrieved {len(result)} popular books")
         return jsonify({
@@ -1288,6 +1332,39 @@ def get_popular_books():
     except Exception as e:
         logger.error(f"Error fetching popular books: {str(e)}")
         return create_error_response(str(e), 500)
+
+@book_bp.route('/trending', methods=['GET'])
+@jwt_required(optional=True)
+@replica_reads
+def get_trending_books():
+    """Get books with the most views recently
+    GET /api/books/trending?limit=10&window=7d&category_id=3
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        
+        limit = request.args.get('limit', 10, type=int)
+        window = request.args.get('window', '7d')
+        category_id = request.args.get('category_id', type=int)
+        if window not in POPULARITY_WINDOWS:
+            return create_error_response(f"Invalid window. Use one of: {', '.join(POPULARITY_WINDOWS)}", 400)
+        
+        query = Book.query.options(joinedload(Book.category), joinedload(Book.authors))
+        if category_id:
+            query = query.filter(Book.category_id == category_id)
+        
+        result = popular_books(query, window, limit, current_user_id)
+        
+        logger.info(f"Retrieved {len(result)} trending books ({window})")
+        return jsonify({
+            'status': 'success',
+            'window': window,
+            'books': result
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error fetching trending books: {str(e)}")
+        return create_error_response(str(e), 500)
     
 
 @book_bp.route('/favorite-books', methods=['GET'])
@@ -1296,7 +1373,7 @@ def get_favorite_books():
     """Get popular books from user's favorite categories"""
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             return create_error_response('Account is banned', 403)
@@ -1351,6 +1428,11 @@ Optimized Create Book - Accept category_name or category_id
 Frontend-friendly version
 """
 
+def _set_book_cover(book_id, variants):
+    """Upload pipeline callback: point the book at its stored cover derivatives"""
+    Book.query.filter_by(id=book_id).update({'cover_image': variants['full'], 'cover_variants': variants})
+    db.session.commit()
+
 @book_bp.route('/', methods=['POST'])
 @admin_required
 def create_book():
@@ -1455,70 +1537,19 @@ def create_book():
         # HANDLE FILE UPLOADS (if FormData)
         # ============================================
         
-        def get_supabase():
-            """Get Supabase client for file uploads"""
-            try:
-                import os
-                from supabase import create_client
-                url = os.getenv("SUPABASE_URL", "https://vcqhwonimqsubvqymgjx.supabase.co")
-                key = os.getenv("SUPABASE_SERVICE_ROLE")
-                if not key:
-                    logger.warning("SUPABASE_SERVICE_ROLE not set, file uploads will be skipped")
-                    return None
-                return create_client(url, key)
-            except Exception as e:
-                logger.error(f"Error creating Supabase client: {str(e)}")
-                return None
-        
-        # Upload files if provided
+        # Cover: validate header now, encode + upload in the pipeline after the book is saved
+        cover_data = None
         if is_form_data:
-            supabase = get_supabase()
-            import time
+            storage = get_storage()
             
             if cover_image_file and cover_image_file.filename:
                 try:
-                    # Validate image file
-                    allowed_image_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-                    file_ext = cover_image_file.filename.split('.')[-1].lower() if '.' in cover_image_file.filename else ''
-                    if file_ext not in allowed_image_extensions:
-                        return create_error_response('Cover image must be PNG, JPG, JPEG, GIF, or WebP', 400)
-                    
-                    if supabase:
-                        cover_image_file.stream.seek(0)
-                        original_bytes = cover_image_file.read()
-                        original_size = len(original_bytes)
-                        cover_image_file.stream.seek(0)
-
-                        webp_content, _, success = convert_image_to_webp(cover_image_file)
-                        if not success or not webp_content:
-                            logger.error("WebP conversion failed for cover image upload")
-                            return create_error_response('Failed to process cover image. Please try another file.', 400)
-
-                        timestamp = int(time.time())
-                        file_name = f"book_cover_{current_user_id}_{timestamp}.webp"
-                        file_path = f"book-covers/{file_name}"
-                        
-                        result = supabase.storage.from_("user-assets").upload(
-                            file_path,
-                            webp_content,
-                            {"content-type": "image/webp"}
-                        )
-                        
-                        if hasattr(result, 'error') and result.error:
-                            logger.error(f"Supabase upload error: {result.error}")
-                        else:
-                            cover_image = supabase.storage.from_("user-assets").get_public_url(file_path)
-                            reduction = None
-                            if original_size:
-                                reduction = get_image_size_reduction(original_size, len(webp_content))
-                            logger.info(
-                                "Cover image uploaded as WebP: %s (size reduction: %.2f%%)",
-                                cover_image,
-                                reduction if reduction is not None else 0.0
-                            )
-                except Exception as e:
-                    logger.error(f"Error uploading cover image: {str(e)}")
-                    return create_error_response(f'Failed to upload cover image: {str(e)}', 500)
+                    cover_data = read_upload(cover_image_file, 10 * 1024 * 1024)
+                except UploadError as e:
+                    return create_error_response(f'Cover image: {e.message}', e.status_code)
+                if storage is None:
+                    logger.warning("Storage not configured, cover image upload skipped")
+                    cover_data = None
             
             if pdf_file and pdf_file.filename:
                 try:
@@ -1533,23 +1564,10 @@ def create_book():
                     if file_size > 50 * 1024 * 1024:
                         return create_error_response('PDF file size must be less than 50MB', 400)
                     
-                    if supabase:
-                        timestamp = int(time.time())
-                        file_name = f"book_pdf_{current_user_id}_{timestamp}.pdf"
-                        file_path = f"book-pdfs/{file_name}"
-                        
-                        file_content = pdf_file.read()
-                        result = supabase.storage.from_("user-assets").upload(
-                            file_path,
-                            file_content,
-                            {"content-type": "application/pdf"}
-                        )
-                        
-                        if hasattr(result, 'error') and result.error:
-                            logger.error(f"Supabase upload error: {result.error}")
-                        else:
-                            pdf_path = supabase.storage.from_("user-assets").get_public_url(file_path)
-                            logger.info(f"PDF uploaded: {pdf_path}")
+                    if storage:
+                        file_path = f"book-pdfs/book_pdf_{current_user_id}_{uuid.uuid4().hex}.pdf"
+                        pdf_path = storage.upload(file_path, pdf_file.read(), "application/pdf")
+                        logger.info(f"PDF uploaded: {pdf_path}")
                 except Exception as e:
                     logger.error(f"Error uploading PDF: {str(e)}")
                     return create_error_response(f'Failed to upload PDF: {str(e)}', 500)
@@ -1715,6 +1733,18 @@ def create_book():
         db.session.commit()
         logger.info(f"✅ Book created successfully: {title} (ID: {book.id})")
         
+        cover_asset = None
+        if cover_data is not None:
+            try:
+                cover_asset = upload_pipeline.submit(
+                    current_user_id, cover_data,
+                    on_complete=functools.partial(_set_book_cover, book.id)
+                )
+            except UploadError as e:
+                # The book is saved; report the cover separately
+                logger.warning(f"Cover image for book {book.id} failed: {e.message}")
+                cover_asset = {'status': 'failed', 'error': e.message}
+        
         # ============================================
         # RELOAD WITH RELATIONSHIPS
         # ============================================
@@ -1727,7 +1757,8 @@ def create_book():
         return jsonify({
             'status': 'success',
             'message': 'Book created successfully',
-            'book': book_to_dict(book, include_details=True)
+            'book': book_to_dict(book, include_details=True),
+            'cover_asset': cover_asset
         }), 201
         
     except IntegrityError as e:
@@ -2038,69 +2069,19 @@ def update_book(book_id):
             book.series_name = sanitize_input(series_name_value.strip()) if series_name_value else None
         
         # Handle file uploads (if FormData)
+        cover_data = None
         if is_form_data:
-            def get_supabase():
-                """Get Supabase client for file uploads"""
-                try:
-                    import os
-                    from supabase import create_client
-                    url = os.getenv("SUPABASE_URL", "https://vcqhwonimqsubvqymgjx.supabase.co")
-                    key = os.getenv("SUPABASE_SERVICE_ROLE")
-                    if not key:
-                        logger.warning("SUPABASE_SERVICE_ROLE not set, file uploads will be skipped")
-                        return None
-                    return create_client(url, key)
-                except Exception as e:
-                    logger.error(f"Error creating Supabase client: {str(e)}")
-                    return None
-            
-            supabase = get_supabase()
-            import time
+            storage = get_storage()
             
             if cover_image_file and cover_image_file.filename:
+                # Validate header now, encode + upload in the pipeline after commit
                 try:
-                    # Validate image file
-                    allowed_image_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-                    file_ext = cover_image_file.filename.split('.')[-1].lower() if '.' in cover_image_file.filename else ''
-                    if file_ext not in allowed_image_extensions:
-                        return create_error_response('Cover image must be PNG, JPG, JPEG, GIF, or WebP', 400)
-                    
-                    if supabase:
-                        cover_image_file.stream.seek(0)
-                        original_bytes = cover_image_file.read()
-                        original_size = len(original_bytes)
-                        cover_image_file.stream.seek(0)
-
-                        webp_content, _, success = convert_image_to_webp(cover_image_file)
-                        if not success or not webp_content:
-                            logger.error("WebP conversion failed for cover image upload (update)")
-                            return create_error_response('Failed to process cover image. Please try another file.', 400)
-
-                        timestamp = int(time.time())
-                        file_name = f"book_cover_{current_user_id}_{timestamp}.webp"
-                        file_path = f"book-covers/{file_name}"
-                        
-                        result = supabase.storage.from_("user-assets").upload(
-                            file_path,
-                            webp_content,
-                            {"content-type": "image/webp"}
-                        )
-                        
-                        if hasattr(result, 'error') and result.error:
-                            logger.error(f"Supabase upload error: {result.error}")
-                        else:
-                            book.cover_image = supabase.storage.from_("user-assets").get_public_url(file_path)
-                            reduction = None
-                            if original_size:
-                                reduction = get_image_size_reduction(original_size, len(webp_content))
-                            logger.info(
-                                "Cover image updated as WebP: %s (size reduction: %.2f%%)",
-                                book.cover_image,
-                                reduction if reduction is not None else 0.0
-                            )
-                except Exception as e:
-                    logger.error(f"Error uploading cover image: {str(e)}")
-                    return create_error_response(f'Failed to upload cover image: {str(e)}', 500)
+                    cover_data = read_upload(cover_image_file, 10 * 1024 * 1024)
+                except UploadError as e:
+                    return create_error_response(f'Cover image: {e.message}', e.status_code)
+                if storage is None:
+                    logger.warning("Storage not configured, cover image upload skipped")
+                    cover_data = None
             
             if pdf_file and pdf_file.filename:
                 try:
@@ -2115,23 +2096,10 @@ def update_book(book_id):
                     if file_size > 50 * 1024 * 1024:
                         return create_error_response('PDF file size must be less than 50MB', 400)
                     
-                    if supabase:
-                        timestamp = int(time.time())
-                        file_name = f"book_pdf_{current_user_id}_{timestamp}.pdf"
-                        file_path = f"book-pdfs/{file_name}"
-                        
-                        file_content = pdf_file.read()
-                        result = supabase.storage.from_("user-assets").upload(
-                            file_path,
-                            file_content,
-                            {"content-type": "application/pdf"}
-                        )
-                        
-                        if hasattr(result, 'error') and result.error:
-                            logger.error(f"Supabase upload error: {result.error}")
-                        else:
-                            book.pdf_path = supabase.storage.from_("user-assets").get_public_url(file_path)
-                            logger.info(f"PDF uploaded: {book.pdf_path}")
+                    if storage:
+                        file_path = f"book-pdfs/book_pdf_{current_user_id}_{uuid.uuid4().hex}.pdf"
+                        book.pdf_path = storage.upload(file_path, pdf_file.read(), "application/pdf")
+                        logger.info(f"PDF uploaded: {book.pdf_path}")
                 except Exception as e:
                     logger.error(f"Error uploading PDF: {str(e)}")
                     return create_error_response(f'Failed to upload PDF: {str(e)}', 500)
@@ -2166,11 +2134,24 @@ def update_book(book_id):
         
         db.session.commit()
         
+        cover_asset = None
+        if cover_data is not None:
+            try:
+                cover_asset = upload_pipeline.submit(
+                    current_user_id, cover_data,
+                    on_complete=functools.partial(_set_book_cover, book.id)
+                )
+            except UploadError as e:
+                # The book is saved; report the cover separately
+                logger.warning(f"Cover image for book {book.id} failed: {e.message}")
+                cover_asset = {'status': 'failed', 'error': e.message}
+        
         logger.info(f"Book {book_id} updated by user {current_user_id}")
         return jsonify({
             'status': 'success',
             'message': 'Book updated successfully',
-            'book': book_to_dict(book, include_details=True)
+            'book': book_to_dict(book, include_details=True),
+            'cover_asset': cover_asset
         }), 200
         
     except Exception as e:
@@ -2193,7 +2174,7 @@ def add_favorite(book_id):
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to add favorite: {current_user_id}")
@@ -2245,7 +2226,7 @@ def remove_favorite(book_id):
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to remove favorite: {current_user_id}")
@@ -2287,7 +2268,7 @@ def get_favorites():
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to get favorites: {current_user_id}")
@@ -2297,7 +2278,7 @@ def get_favorites():
         per_page = request.args.get('per_page', 20, type=int)
         
         favorites_query = Favorite.query.filter_by(user_id=current_user_id)\
-            .options(joinedload(Favorite.book).joinedload(Book.category))\
+            .options(*loading_policy('favorite_listing'))\
             .order_by(Favorite.created_at.desc())
         
         paginated = favorites_query.paginate(page=page, per_page=per_page, error_out=False)
@@ -2345,7 +2326,7 @@ def get_favorite_status(book_id):
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to check favorite status: {current_user_id}")
@@ -2374,7 +2355,7 @@ def get_bookmark_status(book_id):
     """
     try:
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to check bookmark status: {current_user_id}")
@@ -2400,6 +2381,7 @@ def get_bookmark_status(book_id):
 # ============================================
 
 @book_bp.route('/<int:book_id>/chapters', methods=['GET'])
+@replica_reads
 def get_book_chapters(book_id):
     """Get chapters of a book
     GET /api/books/<id>/chapters?page=1&per_page=20
@@ -2446,6 +2428,7 @@ def get_book_chapters(book_id):
         return create_error_response(str(e), 500)
 
 @book_bp.route('/<int:book_id>/chapters/<int:chapter_id>', methods=['GET'])
+@replica_reads
 def get_chapter(book_id, chapter_id):
     """Get specific chapter details
     GET /api/books/<id>/chapters/<chapter_id>
@@ -2607,7 +2590,7 @@ def test_new_function():
     """Test the new book_to_dict function"""
     try:
         current_user_id = get_jwt_identity()
-        print(f"🧪 TEST NEW FUNCTION - User: {current_user_id}")
+        logger.debug(f"Test new function - User: {current_user_id}")
         
         book = Book.query.get(3)
         
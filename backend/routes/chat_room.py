@@ -7,7 +7,7 @@ from models.chat_room_member import ChatRoomMember
 from models.user import User
 from models.message import Message
 from models.room_invitation import RoomInvitation
-from middleware.auth_middleware import admin_required, sanitize_input
+from middleware.auth_middleware import admin_required, sanitize_input, current_identity
 from utils.error_handler import create_error_response
 from datetime import datetime
 import logging
@@ -19,53 +19,80 @@ chat_room_bp = Blueprint('chat_room', __name__)
 # HELPER FUNCTIONS
 # ============================================
 
-def room_to_dict(room, current_user_id=None, include_members=False):
-    """Convert ChatRoom to dict with role info"""
-    # Get owner info
-    owner_member = ChatRoomMember.query.filter_by(
-        room_id=room.id,
-        role='owner'
-    ).first()
+def rooms_to_dicts(rooms, current_user_id=None):
+    """Serialize many rooms with a fixed number of grouped queries"""
+    if not rooms:
+        return []
+    room_ids = [room.id for room in rooms]
     
-    owner_info = None
-    if owner_member and owner_member.user:
-        owner_info = {
-            'id': owner_member.user.id,
-            'username': owner_member.user.username,
-            'avatar_url': owner_member.user.avatar_url or ''
+    # Owners of all rooms in one query
+    owner_rows = db.session.query(
+        ChatRoomMember.room_id, User.id, User.username, User.avatar_url
+    ).join(
+        User, User.id == ChatRoomMember.user_id
+    ).filter(
+        ChatRoomMember.room_id.in_(room_ids),
+        ChatRoomMember.role == 'owner'
+    ).all()
+    owners = {
+        row.room_id: {
+            'id': row.id,
+            'username': row.username,
+            'avatar_url': row.avatar_url or ''
         }
-    
-    data = {
-        'id': room.id,
-        'name': room.name,
-        'description': room.description or '',
-        'is_global': room.is_global,
-        'is_public': room.is_public,
-        'room_type': room.get_room_type(),
-        'created_at': room.created_at.isoformat() if room.created_at else None,
-        'member_count': len(room.members) if room.members else 0,
-        'message_count': Message.query.filter_by(room_id=room.id, is_deleted=False).count(),
-        'your_role': None,
-        'is_member': False,
-        'owner': owner_info
+        for row in owner_rows
     }
     
-    # Check current user's role
+    # Viewer's membership in all rooms in one query
+    roles = {}
     if current_user_id:
-        if room.is_global:
-            data['your_role'] = 'member'
-            data['is_member'] = True
-        else:
-            member = ChatRoomMember.query.filter_by(
-                user_id=current_user_id,
-                room_id=room.id
-            ).first()
-            if member:
-                data['your_role'] = member.role
+        role_rows = db.session.query(
+            ChatRoomMember.room_id, ChatRoomMember.role
+        ).filter(
+            ChatRoomMember.user_id == current_user_id,
+            ChatRoomMember.room_id.in_(room_ids)
+        ).all()
+        roles = {row.room_id: row.role for row in role_rows}
+    
+    result = []
+    for room in rooms:
+        data = {
+            'id': room.id,
+            'name': room.name,
+            'description': room.description or '',
+            'is_global': room.is_global,
+            'is_public': room.is_public,
+            'room_type': room.get_room_type(),
+            'created_at': room.created_at.isoformat() if room.created_at else None,
+            'member_count': room.member_count or 0,
+            'message_count': room.message_count or 0,
+            'your_role': None,
+            'is_member': False,
+            'owner': owners.get(room.id)
+        }
+        
+        # Check current user's role
+        if current_user_id:
+            if room.is_global:
+                data['your_role'] = 'member'
                 data['is_member'] = True
+            elif room.id in roles:
+                data['your_role'] = roles[room.id]
+                data['is_member'] = True
+        
+        result.append(data)
+    
+    return result
+
+def room_to_dict(room, current_user_id=None, include_members=False):
+    """Convert ChatRoom to dict with role info"""
+    data = rooms_to_dicts([room], current_user_id)[0]
     
     # Include members with roles
-    if include_members and room.members:
+    if include_members:
+        members = ChatRoomMember.query.options(
+            db.joinedload(ChatRoomMember.user)
+        ).filter_by(room_id=room.id).all()
         data['members'] = [{
             'user_id': m.user_id,
             'username': m.user.username,
@@ -73,7 +100,7 @@ def room_to_dict(room, current_user_id=None, include_members=False):
             'role': m.role,
             'joined_at': m.joined_at.isoformat() if m.joined_at else None,
             'is_online': False  # TODO: Add online status
-        } for m in room.members]
+        } for m in members]
         
         # Sort members: owner -> admin -> member
         role_order = {'owner': 0, 'admin': 1, 'member': 2}
@@ -107,6 +134,7 @@ def check_room_access(user_id, room_id, require_admin=False):
                 joined_at=datetime.utcnow()
             )
             db.session.add(member)
+            ChatRoom.adjust_counters(room_id, members=1)
             db.session.commit()
             logger.info(f"✅ Auto-joined user {user_id} to public room {room_id}")
             return room, ""
@@ -134,7 +162,7 @@ def create_room():
     """Create new chat room"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if not user or user.is_banned:
             return create_error_response('Access denied', 403)
@@ -173,6 +201,7 @@ def create_room():
             joined_at=datetime.utcnow()
         )
         db.session.add(owner)
+        ChatRoom.adjust_counters(room.id, members=1)
         db.session.commit()
         
         logger.info(f"✅ Room created: {room.id} ({room.get_room_type()}) by user {user_id}")
@@ -303,6 +332,7 @@ def add_member(room_id):
                 joined_at=datetime.utcnow()
             )
             db.session.add(new_member)
+            ChatRoom.adjust_counters(room_id, members=1)
             db.session.commit()
             
             logger.info(f"✅ User {target_user.id} added to room {room_id} as {role}")
@@ -414,6 +444,7 @@ def remove_member(room_id, member_id):
             return create_error_response('Only owner can remove admins', 403)
         
         db.session.delete(target)
+        ChatRoom.adjust_counters(room_id, members=-1)
         db.session.commit()
         
         logger.info(f"✅ User {member_id} removed from room {room_id}")
@@ -454,6 +485,7 @@ def leave_room(room_id):
             return create_error_response('Owner must transfer ownership or delete room', 403)
         
         db.session.delete(member)
+        ChatRoom.adjust_counters(room_id, members=-1)
         db.session.commit()
         
         logger.info(f"✅ User {user_id} left room {room_id}")
@@ -527,12 +559,14 @@ def get_rooms():
             .filter(ChatRoomMember.user_id == user_id)\
             .order_by(ChatRoom.is_global.desc(), ChatRoom.name.asc())
         
-        rooms = [room_to_dict(room, user_id) for room in rooms_query.all()]
+        room_objs = rooms_query.all()
         
         # Always include global room
         global_room = ChatRoom.query.filter_by(is_global=True).first()
-        if global_room and not any(r['id'] == global_room.id for r in rooms):
-            rooms.insert(0, room_to_dict(global_room, user_id))
+        if global_room and not any(r.id == global_room.id for r in room_objs):
+            room_objs.insert(0, global_room)
+        
+        rooms = rooms_to_dicts(room_objs, user_id)
         
         return jsonify({
             'status': 'success',
@@ -550,17 +584,26 @@ def get_public_rooms():
     """Get public rooms for discovery"""
     try:
         user_id = get_jwt_identity()
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 10, type=int), 100)
         
-        # Get all public rooms
-        public_rooms = ChatRoom.query.filter_by(is_public=True)\
-            .order_by(ChatRoom.created_at.desc()).all()
+        # Get one page of public rooms
+        paginated = ChatRoom.query.filter_by(is_public=True)\
+            .order_by(ChatRoom.created_at.desc())\
+            .paginate(page=page, per_page=per_page, error_out=False)
         
-        rooms = [room_to_dict(room, user_id) for room in public_rooms]
+        rooms = rooms_to_dicts(paginated.items, user_id)
         
         return jsonify({
             'status': 'success',
             'rooms': rooms,
-            'total': len(rooms)
+            'total': paginated.total,
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                'total': paginated.total,
+                'pages': paginated.pages
+            }
         }), 200
         
     except Exception as e:
@@ -675,6 +718,7 @@ def accept_invitation(invitation_id):
             joined_at=datetime.utcnow()
         )
         db.session.add(new_member)
+        ChatRoom.adjust_counters(invitation.room_id, members=1)
         
         # Update invitation
         invitation.status = 'accepted'
@@ -791,6 +835,7 @@ def join_public_room(room_id):
             joined_at=datetime.utcnow()
         )
         db.session.add(member)
+        ChatRoom.adjust_counters(room_id, members=1)
         db.session.commit()
         
         logger.info(f"✅ User {user_id} joined public room {room_id}")
@@ -10,18 +10,24 @@ from models.chat_room import ChatRoom
 from models.chat_room_member import ChatRoomMember
 
 from models.user import User
-from middleware.auth_middleware import admin_required, sanitize_input
+from middleware.auth_middleware import admin_required, sanitize_input, current_identity
+from middleware.rate_limiting import rate_limit
 from utils.error_handler import create_error_response
-from utils.image_utils import convert_image_to_webp
+from services.message_cache import room_message_cache
+from services.chat_events import chat_events
+from services.worker_bus import worker_bus
+from services.distinct_metrics import distinct_metrics
+from services.upload_pipeline import upload_pipeline, read_upload, UploadError
+from services.chat_protocol import (
+    PROTOCOL_COMPACT, COMPACT_EVENTS, compact_sessions, compact_message, compact_user, message_room
+)
+from sqlalchemy import func
 from datetime import datetime
 from urllib.parse import urlparse
 import logging
 import os
 from dotenv import load_dotenv
 
-from supabase import create_client
-import time 
-
 logger = logging.getLogger(__name__)
 message_bp = Blueprint('message', __name__)
 
@@ -30,14 +36,6 @@ socketio = None
 
 # Track users in rooms: {room_id: {user_id1, user_id2, ...}}
 room_users = {}
-def get_supabase():
-    from supabase import create_client
-    url = os.getenv("SUPABASE_URL", "https://vcqhwonimqsubvqymgjx.supabase.co")
-    key = os.getenv("SUPABASE_SERVICE_ROLE")
-    if not key:
-        logger.error("SUPABASE_SERVICE_ROLE not set")
-        return None
-    return create_client(url, key)
 
 
 def init_socketio(socketio_instance):
@@ -61,9 +59,23 @@ def validate_image_url(url):
     except Exception:
         return False
 
+def get_replies_counts(message_ids):
+    """Count visible replies for many messages in one grouped query"""
+    if not message_ids:
+        return {}
+    rows = db.session.query(
+        Message.parent_id, func.count(Message.id)
+    ).filter(
+        Message.parent_id.in_(message_ids),
+        Message.is_deleted == False
+    ).group_by(Message.parent_id).all()
+    return {parent_id: count for parent_id, count in rows}
+
 # Helper function to serialize message data với room support
-def message_to_dict(message, include_user=True):
+def message_to_dict(message, include_user=True, replies_count=None):
     """Convert Message object to dict"""
+    if replies_count is None:
+        replies_count = Message.query.filter_by(parent_id=message.id, is_deleted=False).count()
     data = {
         'id': message.id,
         'content': message.content,
@@ -71,7 +83,7 @@ def message_to_dict(message, include_user=True):
         'room_id': message.room_id,
         'parent_id': message.parent_id,
         'is_deleted': message.is_deleted,
-        'replies_count': Message.query.filter_by(parent_id=message.id, is_deleted=False).count(),
+        'replies_count': replies_count,
         'created_at': message.created_at.isoformat() if message.created_at else None,
         'updated_at': message.updated_at.isoformat() if message.updated_at else None
     }
@@ -89,6 +101,58 @@ def message_to_dict(message, include_user=True):
 # HELPER: Broadcast functions for SocketIO với room support
 # ============================================
 
+def emit_message_event(event, message_data, room_id):
+    """Emit a message payload to full clients and, through every worker, compact clients of a room"""
+    socketio.emit(event, message_data, namespace='/chat', room=message_room(room_id))
+    user = message_data.get('user')
+    worker_bus.publish('compact_message', {
+        'event': COMPACT_EVENTS[event],
+        'room_id': room_id,
+        'message': compact_message(message_data),
+        'user': compact_user(user) if user else None,
+    })
+
+def deliver_compact_message(payload):
+    """
+    Worker bus handler: deliver a compact event to this worker's compact connections
+
+    Compact sessions (rooms, known users) are tracked on the worker that owns
+    the connection, so each worker sends the users delta and the event to its
+    own connections only (ignore_queue), in that order.
+    """
+    room_id = payload['room_id']
+    if not compact_sessions.has_room(room_id):
+        return
+    user = payload.get('user')
+    if user:
+        # User dictionary delta - only to connections that have not seen this user
+        missing = compact_sessions.sids_missing_user(room_id, user['i'])
+        if missing:
+            socketio.emit('users', [user], namespace='/chat', to=missing, ignore_queue=True)
+    socketio.emit(payload['event'], payload['message'], namespace='/chat',
+                  room=message_room(room_id, compact=True), ignore_queue=True)
+
+def join_chat_room(room_id):
+    """Join the room's event channel plus the payload room for this connection's protocol"""
+    join_room(str(room_id))
+    compact = compact_sessions.is_compact(request.sid)
+    join_room(message_room(room_id, compact))
+    if compact:
+        compact_sessions.join(request.sid, room_id)
+
+def leave_chat_room(room_id):
+    """Leave both the room's event channel and its payload room"""
+    leave_room(str(room_id))
+    leave_room(message_room(room_id, compact_sessions.is_compact(request.sid)))
+    compact_sessions.leave(request.sid, room_id)
+
+def wants_compact_protocol(auth=None):
+    """Client opts in with ?protocol=compact or auth={'protocol': 'compact'}"""
+    protocol = request.args.get('protocol')
+    if not protocol and isinstance(auth, dict):
+        protocol = auth.get('protocol')
+    return protocol == PROTOCOL_COMPACT
+
 # backend/routes/message.py - FIX BROADCAST FUNCTION
 # backend/routes/message.py - FIX BROADCAST FUNCTION
 # backend/routes/message.py - FIX BROADCAST FUNCTION
@@ -100,16 +164,12 @@ def broadcast_new_message(message, user):
     
     try:
         # ✅ Đảm bảo message có user data
-        message_data = message_to_dict(message)
-        
-        logger.info(f"📢 Broadcasting message {message.id} to room {message.room_id}")
-        logger.info(f"📊 Message data: {message_data}")
+        message_data = message_to_dict(message, replies_count=0)
         
         # ✅ FIX QUAN TRỌNG: Thêm namespace '/chat'
-        socketio.emit('new_message', message_data, 
-                     namespace='/chat', room=str(message.room_id))
+        emit_message_event('new_message', message_data, message.room_id)
         
-        logger.info(f"✅ Successfully broadcasted message {message.id} to room {message.room_id}")
+        logger.debug(f"Broadcasted message {message.id} to room {message.room_id}")
         
     except Exception as e:
         logger.error(f"❌ Error broadcasting new message {message.id}: {str(e)}")
@@ -136,6 +196,7 @@ def broadcast_reply_added(parent_id, room_id):
         return
     try:
         replies_count = Message.query.filter_by(parent_id=parent_id, is_deleted=False).count()
+        room_message_cache.set_replies_count(parent_id, room_id, replies_count)
         socketio.emit('reply_added', {
             'parent_id': parent_id,
             'room_id': room_id,
@@ -151,8 +212,7 @@ def broadcast_message_updated(message):
         logger.error("SocketIO not initialized for broadcasting message update")
         return
     try:
-        socketio.emit('message_updated', message_to_dict(message), 
-                     namespace='/chat', room=str(message.room_id))  # ✅ THÊM NAMESPACE
+        emit_message_event('message_updated', message_to_dict(message), message.room_id)
         logger.debug(f"Broadcasted update for message {message.id} in room {message.room_id}")
     except Exception as e:
         logger.error(f"Error broadcasting message update {message.id}: {str(e)}")
@@ -236,7 +296,7 @@ def get_room_messages(room_id):
     """Get messages from specific room with pagination"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if not user:
             return create_error_response('User not found', 404)
@@ -256,6 +316,28 @@ def get_room_messages(room_id):
         per_page = request.args.get('per_page', 50, type=int)
         parent_id = request.args.get('parent_id', None, type=int)
         
+        # First page of main messages is served from the room hot cache
+        if not parent_id and page == 1:
+            cached = room_message_cache.get_page(room_id, per_page)
+            if cached is not None:
+                result, total = cached
+                logger.debug(f"Served {len(result)} cached messages from room {room_id}")
+                return jsonify({
+                    'status': 'success',
+                    'messages': result,
+                    'room': {
+                        'id': room.id,
+                        'name': room.name,
+                        'is_global': room.is_global
+                    },
+                    'pagination': {
+                        'page': page,
+                        'per_page': per_page,
+                        'total': total,
+                        'pages': -(-total // per_page) if per_page else 0
+                    }
+                }), 200
+        
         # Build query
         messages_query = Message.query.filter_by(
             room_id=room_id, 
@@ -274,11 +356,15 @@ def get_room_messages(room_id):
         
         paginated = messages_query.paginate(page=page, per_page=per_page, error_out=False)
         
-        result = [message_to_dict(msg) for msg in paginated.items]
+        replies_counts = get_replies_counts([msg.id for msg in paginated.items])
+        result = [message_to_dict(msg, replies_count=replies_counts.get(msg.id, 0))
+                  for msg in paginated.items]
         
         # For main messages, return in chronological order
         if not parent_id:
             result.reverse()
+            if page == 1:
+                room_message_cache.warm(room_id, result, paginated.total)
         
         logger.info(f"Retrieved {len(result)} messages from room {room_id} for user {user_id}")
         return jsonify({
@@ -307,7 +393,7 @@ def get_messages():
     """Get messages from global room (backward compatibility)"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if not user:
             return create_error_response('User not found', 404)
@@ -329,7 +415,7 @@ def get_message_replies(message_id):
     """Get replies to a specific message"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if not user:
             return create_error_response('User not found', 404)
@@ -360,7 +446,9 @@ def get_message_replies(message_id):
         
         paginated = replies_query.paginate(page=page, per_page=per_page, error_out=False)
         
-        result = [message_to_dict(msg) for msg in paginated.items]
+        replies_counts = get_replies_counts([msg.id for msg in paginated.items])
+        result = [message_to_dict(msg, replies_count=replies_counts.get(msg.id, 0))
+                  for msg in paginated.items]
         
         logger.info(f"User {user_id} retrieved {len(result)} replies for message {message_id}")
         return jsonify({
@@ -379,6 +467,74 @@ def get_message_replies(message_id):
         logger.error(f"Error fetching replies for message {message_id}: {str(e)}")
         return create_error_response(str(e), 500)
 
+# ============================================
+# MEMBER: Search messages in own rooms
+# ============================================
+
+@message_bp.route('/messages/search', methods=['GET'])
+@jwt_required()
+@rate_limit(name='search')
+def search_messages():
+    """Full-text search over messages in rooms the user can read (keyset paginated)"""
+    try:
+        user_id = get_jwt_identity()
+        
+        q = (request.args.get('q') or '').strip()
+        room_id = request.args.get('room_id', None, type=int)
+        before_id = request.args.get('before_id', None, type=int)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+        
+        if not q:
+            return create_error_response('Query parameter q is required', 400)
+        
+        if len(q) > 200:
+            return create_error_response('Query too long (max 200 characters)', 400)
+        
+        # Rooms the user can read: global rooms plus memberships, in one query
+        member_rooms = db.session.query(ChatRoomMember.room_id).filter(
+            ChatRoomMember.user_id == user_id
+        )
+        room_ids = [row.id for row in db.session.query(ChatRoom.id).filter(
+            (ChatRoom.is_global == True) | ChatRoom.id.in_(member_rooms)
+        ).all()]
+        
+        if room_id:
+            if room_id not in room_ids:
+                return create_error_response('You are not a member of this room', 403)
+            room_ids = [room_id]
+        
+        query = Message.query.options(db.joinedload(Message.user)).filter(
+            Message.room_id.in_(room_ids),
+            Message.is_deleted == False,
+            Message.search_filter(q)
+        )
+        
+        # Keyset pagination on id (monotonic with created_at)
+        if before_id:
+            query = query.filter(Message.id < before_id)
+        
+        rows = query.order_by(Message.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        replies_counts = get_replies_counts([msg.id for msg in rows])
+        result = [message_to_dict(msg, replies_count=replies_counts.get(msg.id, 0)) for msg in rows]
+        
+        logger.info(f"User {user_id} searched messages ({len(result)} results)")
+        return jsonify({
+            'status': 'success',
+            'messages': result,
+            'pagination': {
+                'limit': limit,
+                'has_more': has_more,
+                'next_before_id': rows[-1].id if has_more else None
+            }
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error searching messages: {str(e)}")
+        return create_error_response(str(e), 500)
+
 # ============================================
 # MEMBER: Send Message với room support
 # ============================================
@@ -470,11 +626,14 @@ def send_message():
         )
         
         db.session.add(message)
+        ChatRoom.adjust_counters(room_id, messages=1)
         db.session.commit()
         
         # ✅ QUAN TRỌNG: Refresh để load relationships
         db.session.refresh(message)
         message.user = user  # Đảm bảo user data được load
+        room_message_cache.push(message_to_dict(message, replies_count=0))
+        distinct_metrics.record_message(user_id, room_id)
         
         # ✅ FIX: Broadcast message với đầy đủ data
         broadcast_new_message(message, user)
@@ -510,7 +669,7 @@ def update_message(message_id):
     """Update own message - FIXED VERSION"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if not user:
             return create_error_response('User not found', 404)
@@ -552,6 +711,7 @@ def update_message(message_id):
         message.updated_at = datetime.utcnow()
         
         db.session.commit()
+        room_message_cache.update(message_to_dict(message))
         
         # Broadcast update
         broadcast_message_updated(message)
@@ -580,7 +740,7 @@ def delete_message(message_id):
     """Delete own message (soft delete) with real-time broadcast"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if not user:
             logger.warning(f"User not found: {user_id}")
@@ -605,7 +765,9 @@ def delete_message(message_id):
         # Soft delete
         message.is_deleted = True
         message.updated_at = datetime.utcnow()
+        ChatRoom.adjust_counters(room_id, messages=-1)
         db.session.commit()
+        room_message_cache.remove(message_id, room_id, parent_id)
         
         broadcast_message_deleted(message_id, room_id, deleted_by_admin=False)
         if parent_id:
@@ -628,12 +790,12 @@ def delete_message(message_id):
 
 @message_bp.route('/upload-image', methods=['POST'])
 @jwt_required()
+@rate_limit(name='upload')
 def upload_message_image():
-    """Upload image for messages to Supabase"""
+    """Upload image for messages (encoded and stored by the upload pipeline)"""
     try:
-        supabase = get_supabase()
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
 
         if not user:
             return jsonify({"error": "User not found"}), 404
@@ -644,91 +806,22 @@ def upload_message_image():
         if 'file' not in request.files:
             return jsonify({"error": "No file uploaded"}), 400
 
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
-
-        # Validate file type
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-        file_ext = file.filename.split('.')[-1].lower() if '.' in file.filename else ''
-        if file_ext not in allowed_extensions:
-            return jsonify({"error": "Only image files (PNG, JPG, JPEG, GIF, WebP) are allowed"}), 400
-
-        # Validate file size (5MB max)
-        file.seek(0, 2)
-        file_size = file.tell()
-        file.seek(0)
-        if file_size > 5 * 1024 * 1024:
-            return jsonify({"error": "File size must be less than 5MB"}), 400
-
-        # Check Supabase client
-        if supabase is None:
-            logger.error("Supabase client is None in upload_message_image")
-            return jsonify({"error": "Storage service not available"}), 503
-
-        # Generate filename
-        timestamp = int(time.time())
-        file_name = f"message_{user_id}_{timestamp}.{file_ext}"
-        file_path = f"message-images/{file_name}"
-
-        logger.info(f"Uploading message image for user {user_id}: {file_path}")
-
+        # Validate size (5MB max) and image header; encoding + upload run in the pipeline
         try:
-            # Convert image to WebP format
-            logger.info(f"Converting image to WebP format...")
-            webp_content, webp_filename, success = convert_image_to_webp(file)
-            
-            if not success or webp_content is None:
-                logger.error("Failed to convert image to WebP")
-                return jsonify({"error": "Failed to process image"}), 400
-            
-            # Update filename and path for WebP
-            file_name = f"message_{user_id}_{int(time.time())}.webp"
-            file_path = f"message-images/{file_name}"
-            
-            # Upload to Supabase
-            logger.info(f"Starting Supabase upload to {file_path}")
-            result = supabase.storage.from_("user-assets").upload(
-                file_path, 
-                webp_content,
-                {"content-type": "image/webp"}
-            )
-
-            if hasattr(result, 'error') and result.error:
-                error_msg = f"Supabase upload error: {result.error.message}"
-                logger.error(error_msg)
-                return jsonify({
-                    "error": "Upload failed", 
-                    "debug": error_msg
-                }), 500
-
-            logger.info("Upload successful, generating URL...")
-
-            # Get public URL
-            try:
-                public_url = supabase.storage.from_("user-assets").get_public_url(file_path)
-                logger.info(f"Generated URL: {public_url}")
-            except Exception as url_error:
-                logger.error(f"URL generation failed: {str(url_error)}")
-                return jsonify({
-                    "error": "Failed to generate image URL",
-                    "debug": str(url_error)
-                }), 500
-
-            logger.info(f"Message image uploaded successfully for user {user_id}")
+            data = read_upload(request.files['file'], 5 * 1024 * 1024)
+            asset = upload_pipeline.submit(user_id, data)
+        except UploadError as e:
+            return jsonify({"error": e.message}), e.status_code
 
-            return jsonify({
-                "status": "success",
-                "message": "Image uploaded successfully",
-                "image_url": public_url
-            }), 200
+        logger.info(f"Message image queued for user {user_id}: asset {asset['asset_id']}")
 
-        except Exception as upload_error:
-            logger.error(f"Upload process error: {str(upload_error)}")
-            return jsonify({
-                "error": "Upload failed",
-                "debug": str(upload_error)
-            }), 500
+        return jsonify({
+            "status": asset['status'],
+            "message": "Image is being processed" if asset['status'] == 'pending' else "Image uploaded successfully",
+            "asset_id": asset['asset_id'],
+            "image_url": asset['url'],
+            "variants": asset['variants']
+        }), 202 if asset['status'] == 'pending' else 200
 
     except Exception as e:
         logger.error(f"Unexpected error in upload_message_image: {str(e)}")
@@ -742,9 +835,11 @@ def upload_message_image():
 
 def register_socketio_events(socketio_instance):
     """Register SocketIO events with JWT Authentication - FIXED"""
+    chat_events.start(socketio_instance)
+    worker_bus.subscribe('compact_message', deliver_compact_message)
     
     @socketio_instance.on('connect', namespace='/chat')
-    def handle_connect():
+    def handle_connect(auth=None):
         """Client connects to chat"""
         try:
             logger.info("=" * 50)
@@ -779,6 +874,10 @@ def register_socketio_events(socketio_instance):
             logger.info(f"✅ AUTHENTICATION SUCCESS - User: {user.username} (ID: {user.id})")
             logger.info(f"🔐 Session: user_id={session.get('user_id')}, modified={session.modified}")
             
+            if wants_compact_protocol(auth):
+                compact_sessions.register(request.sid)
+                logger.info(f"📦 Compact payload protocol enabled for {request.sid}")
+            
             # ✅ Join user's personal room for notifications (invitations, etc.)
             join_room(f'user_{user.id}')
             logger.info(f"✅ Joined personal room: user_{user.id}")
@@ -786,25 +885,20 @@ def register_socketio_events(socketio_instance):
             # ✅ AUTO-JOIN GLOBAL ROOM
             global_room = ChatRoom.query.filter_by(is_global=True).first()
             if global_room:
-                join_room(str(global_room.id))
+                join_chat_room(global_room.id)
                 # Track user in global room
                 if global_room.id not in room_users:
                     room_users[global_room.id] = set()
                 room_users[global_room.id].add(user.id)
                 logger.info(f"✅ Auto-joined global room {global_room.id}")
                 
-                # Emit user_online for global room
-                emit('user_online', {
-                    'user_id': user.id,
-                    'username': user.username,
-                    'room_id': global_room.id,
-                    'timestamp': datetime.utcnow().isoformat()
-                }, namespace='/chat', room=str(global_room.id))
-                logger.info(f"📢 Emitted user_online event for user {user.id} in global room {global_room.id}")
+                # Queue user_online for global room (flushed as presence_update)
+                chat_events.user_online(global_room.id, user.id, user.username)
             
             emit('connected', {
                 'message': f'Connected as {user.username}',
                 'socket_id': request.sid,
+                'protocol': PROTOCOL_COMPACT if compact_sessions.is_compact(request.sid) else 'full',
                 'user': {
                     'id': user.id,
                     'username': user.username
@@ -827,6 +921,7 @@ def register_socketio_events(socketio_instance):
     def handle_disconnect():
         """Client disconnects from chat"""
         try:
+            compact_sessions.drop(request.sid)
             from flask import session
             user_id = session.get('user_id')
             username = session.get('username')
@@ -846,14 +941,8 @@ def register_socketio_events(socketio_instance):
                             if len(room_users[room_id]) == 0:
                                 del room_users[room_id]
                         
-                        # Emit offline event
-                        emit('user_offline', {
-                            'user_id': user_id,
-                            'username': user.username,
-                            'room_id': room_id,
-                            'timestamp': datetime.utcnow().isoformat()
-                        }, namespace='/chat', room=str(room_id), include_self=False)
-                        logger.info(f"📢 Emitted user_offline event for user {user_id} in room {room_id} on disconnect")
+                        # Queue offline event (flushed as presence_update)
+                        chat_events.user_offline(room_id, user_id, user.username)
                 
                 logger.info(f"🔌 User {username} (ID: {user_id}) disconnected: {request.sid}")
             else:
@@ -936,7 +1025,7 @@ def register_socketio_events(socketio_instance):
             # ✅ Check if already in room (prevent duplicate joins)
             # This is handled by SocketIO, but we log it
             logger.info(f"🔌 Joining SocketIO room: {room_id}")
-            join_room(str(room_id))
+            join_chat_room(room_id)
             logger.info(f"✅ User {user_id} successfully JOINED room {room_id}")
             
             # ✅ Ensure session is persisted
@@ -970,14 +1059,8 @@ def register_socketio_events(socketio_instance):
                     'online_users': online_users_info
                 }, namespace='/chat')
                 
-                # ✅ EMIT USER ONLINE EVENT to all users in the room (so they see this user)
-                emit('user_online', {
-                    'user_id': user_id,
-                    'username': user.username,
-                    'room_id': room_id,
-                    'timestamp': datetime.utcnow().isoformat()
-                }, namespace='/chat', room=str(room_id))
-                logger.info(f"📢 Emitted user_online event for user {user_id} in room {room_id}")
+                # ✅ Queue user online for the room (flushed as presence_update)
+                chat_events.user_online(room_id, user_id, user.username)
             
             logger.info(f"📢 Sent room_joined event for room {room_id} with {len(online_user_ids)} online users")
             logger.info("=" * 50)
@@ -1010,16 +1093,8 @@ def register_socketio_events(socketio_instance):
                 emit('error', {'message': 'Room ID required'}, namespace='/chat')
                 return
             
-            # ✅ EMIT USER OFFLINE EVENT before leaving
-            user = User.query.get(user_id)
-            if user:
-                emit('user_offline', {
-                    'user_id': user_id,
-                    'username': user.username,
-                    'room_id': room_id,
-                    'timestamp': datetime.utcnow().isoformat()
-                }, namespace='/chat', room=str(room_id), include_self=False)
-                logger.info(f"📢 Emitted user_offline event for user {user_id} in room {room_id}")
+            # ✅ Queue user offline for the room (flushed as presence_update)
+            chat_events.user_offline(int(room_id), user_id, session.get('username', 'Unknown'))
             
             # ✅ Remove user from room tracking
             if room_id in room_users:
@@ -1027,7 +1102,7 @@ def register_socketio_events(socketio_instance):
                 if len(room_users[room_id]) == 0:
                     del room_users[room_id]
             
-            leave_room(str(room_id))
+            leave_chat_room(int(room_id))
             
             emit('room_left', {
                 'room_id': room_id,
@@ -1100,13 +1175,15 @@ def register_socketio_events(socketio_instance):
             )
             
             db.session.add(message)
+            ChatRoom.adjust_counters(room_id, messages=1)
             db.session.commit()
             db.session.refresh(message)
             
             # ✅ BROADCAST MESSAGE TO ROOM
-            message_data = message_to_dict(message)
-            emit('new_message', message_data, 
-                namespace='/chat', room=str(room_id))
+            message_data = message_to_dict(message, replies_count=0)
+            room_message_cache.push(message_data)
+            distinct_metrics.record_message(user_id, int(room_id))
+            emit_message_event('new_message', message_data, int(room_id))
             
             # Update reply count if it's a reply
             if parent_id:
@@ -1134,14 +1211,9 @@ def register_socketio_events(socketio_instance):
             
             if not user_id or not room_id:
                 return
-                
-            emit('user_typing', {
-                'user_id': user_id,
-                'username': session.get('username', 'Unknown'),
-                'room_id': room_id,
-                'is_typing': is_typing,
-                'timestamp': datetime.utcnow().isoformat()
-            }, namespace='/chat', room=str(room_id), include_self=False)
+            
+            # Coalesced into one typing_users snapshot per room per tick
+            chat_events.set_typing(int(room_id), user_id, session.get('username', 'Unknown'), bool(is_typing))
             
         except Exception as e:
             logger.error(f"Error handling typing: {str(e)}")
@@ -1170,7 +1242,9 @@ def admin_delete_message(message_id):
         # Soft delete
         message.is_deleted = True
         message.updated_at = datetime.utcnow()
+        ChatRoom.adjust_counters(room_id, messages=-1)
         db.session.commit()
+        room_message_cache.remove(message_id, room_id, parent_id)
         
         broadcast_message_deleted(message_id, room_id, deleted_by_admin=True)
         if parent_id:
@@ -4,10 +4,12 @@ from extensions import db
 from models.post import Post
 from models.user import User
 from utils.error_handler import create_error_response
-from utils.image_utils import convert_image_to_webp
+from middleware.auth_middleware import current_identity
+from middleware.rate_limiting import rate_limit
+from services.storage import get_storage
+from services.upload_pipeline import upload_pipeline, read_upload, UploadError, variants_for_url, is_pipeline_asset
+from services.loading import loading_policy
 import logging
-import os
-import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,28 +17,13 @@ logger = logging.getLogger(__name__)
 
 post_bp = Blueprint('post', __name__)
 
-def get_supabase():
-    """Get Supabase client"""
-    try:
-        from supabase import create_client
-        url = os.getenv("SUPABASE_URL", "https://vcqhwonimqsubvqymgjx.supabase.co")
-        key = os.getenv("SUPABASE_SERVICE_ROLE")
-        if not key:
-            logger.error("SUPABASE_SERVICE_ROLE not set")
-            return None
-        return create_client(url, key)
-    except Exception as e:
-        logger.error(f"Error creating Supabase client: {str(e)}")
-        return None
-
-
 @post_bp.route('/posts', methods=['POST'])
 @jwt_required()
 def create_post():
     """Create a new post/status"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
 
         if not user:
             return create_error_response('User not found', 404)
@@ -56,7 +43,8 @@ def create_post():
         post = Post(
             user_id=user_id,
             content=content if content else None,
-            image_url=image_url if image_url else None
+            image_url=image_url if image_url else None,
+            image_variants=variants_for_url(image_url)
         )
 
         db.session.add(post)
@@ -86,8 +74,8 @@ def get_posts():
         per_page = request.args.get('per_page', 20, type=int)
         user_filter = request.args.get('user_id', type=int)  # Filter by specific user
 
-        # Build query
-        query = Post.query
+        # Build query (Post.user eager-loaded, see LOADING_POLICIES)
+        query = Post.query.options(*loading_policy('post_feed'))
 
         # Filter by user if specified
         if user_filter:
@@ -144,7 +132,7 @@ def delete_post(post_id):
     """Delete a post (only by owner or admin)"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
 
         if not user:
             return create_error_response('User not found', 404)
@@ -158,25 +146,16 @@ def delete_post(post_id):
         if post.user_id != user_id and user.role != 'admin':
             return create_error_response('Permission denied', 403)
 
-        # Delete image from Supabase if exists
-        if post.image_url:
+        # Delete image from storage if exists (pipeline assets are content-addressed and may be shared)
+        if post.image_url and not is_pipeline_asset(post.image_url):
             try:
-                supabase = get_supabase()
-                if supabase:
-                    # Extract file path from URL
-                    # URL format: https://...supabase.co/storage/v1/object/public/user-assets/posts/...
-                    if 'user-assets' in post.image_url:
-                        # Try to extract path
-                        parts = post.image_url.split('user-assets/')
-                        if len(parts) > 1:
-                            file_path = parts[1]
-                            try:
-                                supabase.storage.from_("user-assets").remove([file_path])
-                                logger.info(f"Deleted image from Supabase: {file_path}")
-                            except Exception as e:
-                                logger.warning(f"Failed to delete image from Supabase: {str(e)}")
+                storage = get_storage()
+                file_path = storage.path_from_url(post.image_url) if storage else None
+                if file_path:
+                    storage.remove([file_path])
+                    logger.info(f"Deleted image from storage: {file_path}")
             except Exception as e:
-                logger.warning(f"Error deleting image from Supabase: {str(e)}")
+                logger.warning(f"Failed to delete image from storage: {str(e)}")
 
         db.session.delete(post)
         db.session.commit()
@@ -196,12 +175,12 @@ def delete_post(post_id):
 
 @post_bp.route('/posts/upload-image', methods=['POST'])
 @jwt_required()
+@rate_limit(name='upload')
 def upload_post_image():
-    """Upload image for post to Supabase"""
+    """Upload image for post (encoded and stored by the upload pipeline)"""
     try:
-        supabase = get_supabase()
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
 
         if not user:
             return jsonify({"error": "User not found"}), 404
@@ -212,94 +191,23 @@ def upload_post_image():
         if 'file' not in request.files:
             return jsonify({"error": "No file uploaded"}), 400
 
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
-
-        # Validate file type
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-        file_ext = file.filename.split('.')[-1].lower() if '.' in file.filename else ''
-        if file_ext not in allowed_extensions:
-            return jsonify({"error": "Only image files (PNG, JPG, JPEG, GIF, WebP) are allowed"}), 400
-
-        # Validate file size (10MB max for posts)
-        file.seek(0, 2)
-        file_size = file.tell()
-        file.seek(0)
-        if file_size > 10 * 1024 * 1024:
-            return jsonify({"error": "File size must be less than 10MB"}), 400
-
-        # Check Supabase client
-        if supabase is None:
-            logger.error("Supabase client is None in upload_post_image")
-            return jsonify({"error": "Storage service not available"}), 503
-
-        # Generate filename
-        timestamp = int(time.time())
-        file_name = f"{user_id}_{timestamp}.{file_ext}"
-        file_path = f"posts/{file_name}"
+        # Validate size (10MB max for posts) and image header; encoding + upload run in the pipeline
+        try:
+            data = read_upload(request.files['file'], 10 * 1024 * 1024)
+            asset = upload_pipeline.submit(user_id, data)
+        except UploadError as e:
+            return jsonify({"error": e.message}), e.status_code
 
-        logger.info(f"Uploading post image for user {user_id}: {file_path}")
+        logger.info(f"Post image queued for user {user_id}: asset {asset['asset_id']}")
 
-        try:
-            # Convert image to WebP format
-            logger.info(f"Converting image to WebP format...")
-            webp_content, webp_filename, success = convert_image_to_webp(file)
-            
-            if not success or webp_content is None:
-                logger.error("Failed to convert image to WebP")
-                return jsonify({"error": "Failed to process image"}), 400
-            
-            # Update filename and path for WebP
-            file_name = f"{user_id}_{int(time.time())}.webp"
-            file_path = f"posts/{file_name}"
-
-            # Upload to Supabase
-            logger.info(f"Starting Supabase upload to {file_path}")
-            result = supabase.storage.from_("user-assets").upload(
-                file_path,
-                webp_content,
-                {"content-type": "image/webp"}
-            )
-
-            # Check result
-            if hasattr(result, 'error') and result.error:
-                error_msg = f"Supabase upload error: {result.error.message}"
-                logger.error(error_msg)
-                return jsonify({
-                    "error": "Upload failed",
-                    "debug": error_msg
-                }), 500
-
-            logger.info("Upload successful, generating URL...")
-
-            # Get public URL
-            try:
-                public_url = supabase.storage.from_("user-assets").get_public_url(file_path)
-                logger.info(f"Generated URL: {public_url}")
-            except Exception as url_error:
-                logger.error(f"URL generation failed: {str(url_error)}")
-                return jsonify({
-                    "error": "Failed to generate image URL",
-                    "debug": str(url_error)
-                }), 500
-
-            logger.info(f"Post image uploaded successfully for user {user_id}")
-
-            return jsonify({
-                "status": "success",
-                "message": "Image uploaded successfully",
-                "image_url": public_url
-            }), 200
-
-        except Exception as upload_error:
-            logger.error(f"Upload process error: {str(upload_error)}")
-            return jsonify({
-                "error": "Upload failed",
-                "debug": str(upload_error)
-            }), 500
+        return jsonify({
+            "status": asset['status'],
+            "message": "Image is being processed" if asset['status'] == 'pending' else "Image uploaded successfully",
+            "asset_id": asset['asset_id'],
+            "image_url": asset['url'],
+            "variants": asset['variants']
+        }), 202 if asset['status'] == 'pending' else 200
 
     except Exception as e:
         logger.error(f"Unexpected error in upload_post_image: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
-
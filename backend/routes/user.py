@@ -1,23 +1,31 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import db
-from sqlalchemy import or_  # Thêm import này ở đầu file
+from sqlalchemy import or_, func, literal_column  # Thêm import này ở đầu file
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from models.user import User
 from models.user_preference import UserPreference
 from models.book_rating import BookRating
 from models.reading_history import ReadingHistory
 from models.view_history import ViewHistory 
 from models.book import Book
+from models.author import Author
+from models.book_author import BookAuthor
 from models.category import Category
 from models.favorite import Favorite
-from sqlalchemy.orm import joinedload
-from middleware.auth_middleware import admin_required, sanitize_input, validate_username, validate_email
+from middleware.auth_middleware import admin_required, sanitize_input, validate_username, validate_email, current_identity
+from middleware.rate_limiting import rate_limit
+from services.identity_cache import identity_cache
+from services.upload_pipeline import upload_pipeline, read_upload, UploadError
+from services.database import replica_reads
+from services.loading import loading_policy
+from utils.image_utils import pick_variant
 from utils.error_handler import create_error_response
 from datetime import datetime, timezone, time as dt_time
 from urllib.parse import urlparse
 import logging
 import time  # Python time module
-from supabase import create_client
+import functools
 import os
 from dotenv import load_dotenv
 
@@ -44,6 +52,7 @@ def user_to_dict(user, include_sensitive=False):
         'id': user.id,
         'username': user.username,
         'avatar_url': user.avatar_url or '',
+        'avatar_thumbnail': pick_variant(user.avatar_variants, 'thumb', user.avatar_url or ''),
         'role': user.role,
         'is_banned': user.is_banned,
         'name': user.name or '',
@@ -182,6 +191,7 @@ def update_profile():
             user.favorite_books = sanitize_input(data['favorite_books'].strip()) if data['favorite_books'] else None
         
         db.session.commit()
+        identity_cache.invalidate(user_id)
         
         logger.info(f"User {user_id} updated profile")
         return jsonify({
@@ -265,7 +275,7 @@ def add_favorite():
     """Add favorite category to user_preferences"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to add favorite category: {user_id}")
@@ -333,7 +343,7 @@ def remove_favorite(category_id):
     """Remove favorite category"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to remove favorite category: {user_id}")
@@ -368,7 +378,7 @@ def get_favorites():
     """Get user's favorite categories"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to get favorites: {user_id}")
@@ -404,7 +414,7 @@ def like_book(book_id):
     """Like a book (set rating=5 in book_ratings)"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to like book: {user_id}")
@@ -453,7 +463,7 @@ def unlike_book(book_id):
     """Unlike a book (remove from book_ratings)"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to unlike book: {user_id}")
@@ -485,13 +495,96 @@ def unlike_book(book_id):
 # ============================================
 # MEMBER: Reading History
 # ============================================
+def _viewed_books(user_id, start=None, end=None, limit=None, offset=0):
+    """
+    Latest view per book for a user, newest first, in one query
+
+    DISTINCT ON (book_id) over view_history (idx_view_history_user_viewed_book),
+    then the requested page joined with its book, authors and the user's
+    reading position.
+
+    Args:
+        user_id: Viewer
+        start: Only views at or after this time
+        end: Only views at or before this time
+        limit: Page size (None for all)
+        offset: Rows to skip
+
+    Returns:
+        tuple: (rows with book_id, viewed_at, title, cover_image, last_page, authors;
+                number of distinct books viewed in the window)
+    """
+    latest = db.session.query(ViewHistory.book_id, ViewHistory.viewed_at)\
+        .filter(ViewHistory.user_id == user_id)
+    if start is not None:
+        latest = latest.filter(ViewHistory.viewed_at >= start)
+    if end is not None:
+        latest = latest.filter(ViewHistory.viewed_at <= end)
+    latest = latest.distinct(ViewHistory.book_id)\
+        .order_by(ViewHistory.book_id, ViewHistory.viewed_at.desc())\
+        .subquery('latest')
+
+    page_query = db.session.query(latest.c.book_id, latest.c.viewed_at, func.count().over().label('total'))\
+        .join(Book, Book.id == latest.c.book_id)\
+        .order_by(latest.c.viewed_at.desc(), latest.c.book_id)
+    if limit is not None:
+        page_query = page_query.limit(limit).offset(offset)
+    page_rows = page_query.subquery('page')
+
+    last_page = db.session.query(ReadingHistory.last_page)\
+        .filter(ReadingHistory.user_id == user_id, ReadingHistory.book_id == page_rows.c.book_id)\
+        .limit(1)\
+        .scalar_subquery()
+    authors = func.coalesce(
+        func.json_agg(aggregate_order_by(
+            func.json_build_object('id', Author.id, 'name', Author.name, 'bio', Author.bio, 'photo_url', Author.photo_url),
+            Author.id
+        )).filter(Author.id.isnot(None)),
+        literal_column("'[]'::json")
+    )
+
+    rows = db.session.query(
+        page_rows.c.book_id, page_rows.c.viewed_at, page_rows.c.total,
+        Book.title, Book.cover_image,
+        last_page.label('last_page'), authors.label('authors')
+    ).join(Book, Book.id == page_rows.c.book_id)\
+     .outerjoin(BookAuthor, BookAuthor.book_id == Book.id)\
+     .outerjoin(Author, Author.id == BookAuthor.author_id)\
+     .group_by(page_rows.c.book_id, page_rows.c.viewed_at, page_rows.c.total, Book.id)\
+     .order_by(page_rows.c.viewed_at.desc(), page_rows.c.book_id)\
+     .all()
+
+    if rows:
+        total = rows[0].total
+    elif offset:
+        # Past the last page: the window count is not available from an empty page
+        total = db.session.query(func.count(latest.c.book_id))\
+            .join(Book, Book.id == latest.c.book_id).scalar()
+    else:
+        total = 0
+    return rows, total
+
+
+def _history_entry(row, read_today):
+    return {
+        'book_id': row.book_id,
+        'title': row.title,
+        'cover_image': row.cover_image or '',
+        'authors': row.authors,
+        'last_page': row.last_page or 0,
+        'last_read_at': row.viewed_at.isoformat(),
+        'read_today': read_today
+    }
+
+
 @user_bp.route('/history/today', methods=['GET'])
 @jwt_required()
+@replica_reads
 def get_today_reading_history():
     """Get books viewed today (from view_history table)"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to get today's reading history: {user_id}")
@@ -503,57 +596,11 @@ def get_today_reading_history():
         today_start_utc = datetime.combine(now.date(), dt_time.min).replace(tzinfo=timezone.utc)
         today_end_utc = datetime.combine(now.date(), dt_time.max).replace(tzinfo=timezone.utc)
         
-        logger.info(f"Querying today's views for user {user_id}: {today_start_utc} to {today_end_utc}")
-        
-        # ✅ DÙNG ViewHistory để lấy sách đã XEM trong khoảng thời gian hôm nay
-        today_views = ViewHistory.query.filter_by(user_id=user_id)\
-            .filter(ViewHistory.viewed_at >= today_start_utc)\
-            .filter(ViewHistory.viewed_at <= today_end_utc)\
-            .order_by(ViewHistory.viewed_at.desc())\
-            .all()
-        
-        logger.info(f"Found {len(today_views)} view records for user {user_id} today")
-        
-        result = []
-        seen_books = set()  # Tránh trùng lặp
+        # Sách đã XEM hôm nay, mỗi sách một dòng (lần xem mới nhất)
+        rows, _ = _viewed_books(user_id, start=today_start_utc, end=today_end_utc)
+        result = [_history_entry(row, read_today=True) for row in rows]
         
-        for view in today_views:
-            if view.book_id in seen_books:
-                continue
-            seen_books.add(view.book_id)
-            
-            # Load book with authors using joinedload
-            book = Book.query.options(joinedload(Book.authors)).get(view.book_id)
-            if not book:
-                logger.warning(f"Book {view.book_id} not found for view history entry {view.id}")
-                continue
-                
-            # Lấy last_page từ ReadingHistory nếu có
-            reading = ReadingHistory.query.filter_by(
-                user_id=user_id, 
-                book_id=view.book_id
-            ).first()
-            
-            # Serialize authors safely
-            authors_list = []
-            if book.authors:
-                for author in book.authors:
-                    if hasattr(author, 'to_dict'):
-                        authors_list.append(author.to_dict())
-                    else:
-                        authors_list.append({'id': author.id, 'name': author.name})
-            
-            result.append({
-                'book_id': book.id,
-                'title': book.title,
-                'cover_image': book.cover_image or '',
-                'authors': authors_list,
-                'last_page': reading.last_page if reading else 0,
-                'last_read_at': view.viewed_at.isoformat(),
-                'read_today': True
-            })
-        
-        logger.info(f"Retrieved {len(result)} today's viewed books for user {user_id} (after filtering)")
+        logger.info(f"Retrieved {len(result)} today's viewed books for user {user_id}")
         return jsonify({
             'status': 'success',
             'history': result,
@@ -566,62 +613,28 @@ def get_today_reading_history():
         return create_error_response(str(e), 500)
 @user_bp.route('/history/books-all', methods=['GET'])
 @jwt_required()
+@replica_reads
 def get_reading_history():
     """Get all viewing history with pagination (from view_history table)"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_identity()
         
         if user.is_banned:
             logger.info(f"Banned user attempted to get reading history: {user_id}")
             return create_error_response('Account is banned', 403)
         
-        page = request.args.get('page', 1, type=int)
+        # Same defaults as Query.paginate(error_out=False)
+        page = max(request.args.get('page', 1, type=int), 1)
         per_page = request.args.get('per_page', 20, type=int)
+        if per_page < 1:
+            per_page = 20
         
-        # ✅ DÙNG ViewHistory
-        # Lấy view mới nhất của mỗi sách (DISTINCT ON book_id)
-        subquery = db.session.query(
-            ViewHistory.book_id,
-            db.func.max(ViewHistory.viewed_at).label('latest_view')
-        ).filter_by(user_id=user_id)\
-         .group_by(ViewHistory.book_id)\
-         .subquery()
-        
-        history_query = db.session.query(ViewHistory)\
-            .join(subquery, db.and_(
-                ViewHistory.book_id == subquery.c.book_id,
-                ViewHistory.viewed_at == subquery.c.latest_view
-            ))\
-            .filter(ViewHistory.user_id == user_id)\
-            .order_by(ViewHistory.viewed_at.desc())
-        
-        paginated = history_query.paginate(page=page, per_page=per_page, error_out=False)
+        # Lần xem mới nhất của mỗi sách (DISTINCT ON book_id), một query cho cả trang
+        rows, total = _viewed_books(user_id, limit=per_page, offset=(page - 1) * per_page)
         
         today = datetime.utcnow().date()
-        result = []
-        
-        for view in paginated.items:
-            book = Book.query.get(view.book_id)
-            if book:
-                read_date = view.viewed_at.date() if view.viewed_at else None
-                is_today = read_date == today
-                
-                # Lấy last_page từ ReadingHistory
-                reading = ReadingHistory.query.filter_by(
-                    user_id=user_id, 
-                    book_id=view.book_id
-                ).first()
-                
-                result.append({
-                    'book_id': book.id,
-                    'title': book.title,
-                    'cover_image': book.cover_image or '',
-                    'authors': [a.to_dict() for a in book.authors],
-                    'last_page': reading.last_page if reading else 0,
-                    'last_read_at': view.viewed_at.isoformat(),
-                    'read_today': is_today
-                })
+        result = [_history_entry(row, read_today=row.viewed_at.date() == today) for row in rows]
         
         logger.info(f"Retrieved {len(result)} reading history entries for user {user_id}")
         return jsonify({
@@ -630,8 +643,8 @@ def get_reading_history():
             'pagination': {
                 'page': page,
                 'per_page': per_page,
-                'total': paginated.total,
-                'pages': paginated.pages
+                'total': total,
+                'pages': (total + per_page - 1) // per_page
             }
         }), 200
         
@@ -671,7 +684,9 @@ def ban_user(user_id):
             }), 200
         
         user.is_banned = True
+        user.bump_auth_version()
         db.session.commit()
+        identity_cache.mark_changed(user)
         
         logger.info(f"User {user_id} banned by admin {current_user_id}")
         return jsonify({
@@ -704,7 +719,9 @@ def unban_user(user_id):
             }), 200
         
         user.is_banned = False
+        user.bump_auth_version()
         db.session.commit()
+        identity_cache.mark_changed(user)
         
         logger.info(f"User {user_id} unbanned by admin {current_user_id}")
         return jsonify({
@@ -807,7 +824,7 @@ def get_user_favorites(username):
         per_page = request.args.get('per_page', 20, type=int)
         
         favorites_query = Favorite.query.filter_by(user_id=user.id)\
-            .options(joinedload(Favorite.book).joinedload(Book.category))\
+            .options(*loading_policy('favorite_listing'))\
             .order_by(Favorite.created_at.desc())
         
         paginated = favorites_query.paginate(page=page, per_page=per_page, error_out=False)
@@ -854,6 +871,7 @@ def get_user_favorites(username):
 
 @user_bp.route('/search', methods=['GET'])
 @jwt_required()
+@rate_limit(name='search')
 def search_users():
     """Search users by username (for adding to rooms)"""
     try:
@@ -905,10 +923,10 @@ def search_users():
 
 @user_bp.route('/upload-avatar', methods=['POST'])
 @jwt_required()
+@rate_limit(name='upload')
 def upload_avatar():
-    """Upload avatar to Supabase with detailed error handling"""
+    """Upload avatar (encoded and stored by the upload pipeline, saved on the user when done)"""
     try:
-        supabase = get_supabase()
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
 
@@ -921,93 +939,36 @@ def upload_avatar():
         if 'file' not in request.files:
             return jsonify({"error": "No file uploaded"}), 400
 
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
-
-        # Validate file type
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-        file_ext = file.filename.split('.')[-1].lower() if '.' in file.filename else ''
-        if file_ext not in allowed_extensions:
-            return jsonify({"error": "Only image files (PNG, JPG, JPEG, GIF, WebP) are allowed"}), 400
-
-        # Validate file size (5MB max)
-        file.seek(0, 2)
-        file_size = file.tell()
-        file.seek(0)
-        if file_size > 5 * 1024 * 1024:
-            return jsonify({"error": "File size must be less than 5MB"}), 400
-
-        # Check Supabase client
-        if supabase is None:
-            logger.error("Supabase client is None in upload_avatar")
-            return jsonify({"error": "Storage service not available"}), 503
-
-        # Generate filename
-        timestamp = int(time.time())
-        file_name = f"{user_id}_{timestamp}.{file_ext}"
-        file_path = f"avatars/{file_name}"
-
-        logger.info(f"Uploading avatar for user {user_id}: {file_path}")
-
+        # Validate size (5MB max) and image header; encoding + upload run in the pipeline
         try:
-            # Read file content
-            file_content = file.read()
-            
-            # Upload to Supabase
-            logger.info(f"Starting Supabase upload to {file_path}")
-            result = supabase.storage.from_("user-assets").upload(
-                file_path, 
-                file_content,
-                {"content-type": file.content_type}
+            data = read_upload(request.files['file'], 5 * 1024 * 1024)
+            asset = upload_pipeline.submit(
+                user_id, data,
+                on_complete=functools.partial(_set_avatar, user.id)
             )
+        except UploadError as e:
+            return jsonify({"error": e.message}), e.status_code
 
-            # Check result - FIXED: use proper error checking
-            if hasattr(result, 'error') and result.error:
-                error_msg = f"Supabase upload error: {result.error.message}"
-                logger.error(error_msg)
-                return jsonify({
-                    "error": "Upload failed", 
-                    "debug": error_msg
-                }), 500
-
-            logger.info("Upload successful, generating URL...")
-
-            # Get public URL
-            try:
-                public_url = supabase.storage.from_("user-assets").get_public_url(file_path)
-                logger.info(f"Generated URL: {public_url}")
-            except Exception as url_error:
-                logger.error(f"URL generation failed: {str(url_error)}")
-                return jsonify({
-                    "error": "Failed to generate avatar URL",
-                    "debug": str(url_error)
-                }), 500
-
-            # Update user in database
-            user.avatar_url = public_url
-            db.session.commit()
-
-            logger.info(f"Avatar updated successfully for user {user_id}")
+        logger.info(f"Avatar queued for user {user_id}: asset {asset['asset_id']}")
 
-            return jsonify({
-                "status": "success",
-                "message": "Avatar uploaded successfully",
-                "avatar_url": public_url,
-                "user": user_to_dict(user, include_sensitive=True)
-            }), 200
-
-        except Exception as upload_error:
-            logger.error(f"Upload process error: {str(upload_error)}")
-            return jsonify({
-                "error": "Upload failed",
-                "debug": str(upload_error)
-            }), 500
+        return jsonify({
+            "status": asset['status'],
+            "message": "Avatar is being processed" if asset['status'] == 'pending' else "Avatar uploaded successfully",
+            "asset_id": asset['asset_id'],
+            "avatar_url": asset['url'],
+            "variants": asset['variants'],
+            "user": user_to_dict(user, include_sensitive=True)
+        }), 202 if asset['status'] == 'pending' else 200
 
     except Exception as e:
         logger.error(f"Unexpected error in upload_avatar: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+def _set_avatar(user_id, variants):
+    """Upload pipeline callback: point the user at the stored avatar derivatives"""
+    User.query.filter_by(id=user_id).update({'avatar_url': variants['full'], 'avatar_variants': variants})
+    db.session.commit()
+
 @user_bp.route('/avatar', methods=['DELETE'])
 @jwt_required()
 def delete_avatar():
@@ -0,0 +1,65 @@
+"""
+Per-book views and unique viewers over rolling windows.
+
+Backed by the ``book_popularity`` materialized view (24h / 7d / all time),
+refreshed with ``REFRESH MATERIALIZED VIEW CONCURRENTLY`` by a background
+job so readers are never blocked and never scan ``view_history``.
+"""
+
+import os
+import logging
+from sqlalchemy import func, text
+from extensions import db
+from models.book import Book
+from models.book_popularity import book_popularity
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = int(os.getenv('BOOK_POPULARITY_REFRESH_INTERVAL', 600))
+
+# window -> (views column, unique viewers column)
+WINDOWS = {
+    '24h': (book_popularity.c.views_24h, book_popularity.c.viewers_24h),
+    '7d': (book_popularity.c.views_7d, book_popularity.c.viewers_7d),
+    'all': (book_popularity.c.views_all, book_popularity.c.viewers_all),
+}
+
+
+def refresh_book_popularity() -> str:
+    """Background job: rebuild the view without locking out readers"""
+    db.session.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY book_popularity"))
+    db.session.commit()
+    return 'refreshed'
+
+
+def order_by_window(query, window: str):
+    """
+    Order a Book query by recent activity in the given window
+
+    Ties (and books missing from the view, e.g. added since the last
+    refresh) fall back to lifetime ``view_count``.
+
+    Returns:
+        tuple: (query, views column, viewers column) - the columns can be
+        added to the query with ``add_columns`` to expose the numbers
+    """
+    views, viewers = WINDOWS[window]
+    query = query.outerjoin(
+        book_popularity, book_popularity.c.book_id == Book.id
+    ).order_by(
+        func.coalesce(views, 0).desc(),
+        Book.view_count.desc()
+    )
+    return query, func.coalesce(views, 0), func.coalesce(viewers, 0)
+
+
+def top_books(limit: int = 10) -> list:
+    """Top books by lifetime view_count with all-time unique viewers"""
+    return db.session.query(
+        Book.id, Book.title, Book.view_count, Book.cover_image,
+        func.coalesce(book_popularity.c.viewers_all, 0).label('unique_viewers')
+    ).outerjoin(
+        book_popularity, book_popularity.c.book_id == Book.id
+    ).order_by(
+        Book.view_count.desc()
+    ).limit(limit).all()
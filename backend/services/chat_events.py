@@ -0,0 +1,133 @@
+"""
+Server-side coalescing of typing and presence events on the /chat namespace.
+
+Instead of re-broadcasting every ``typing`` keystroke and every join/leave
+to the whole room, handlers record state here and a background task
+flushes it at a fixed tick: one ``typing_users`` snapshot per changed room
+and one ``presence_update`` diff per room with joins/leaves.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICK_MS = int(os.getenv('CHAT_EVENT_TICK_MS', 500))
+DEFAULT_TYPING_TTL = float(os.getenv('CHAT_TYPING_TTL', 5))
+DEFAULT_TYPING_MAX_USERS = int(os.getenv('CHAT_TYPING_MAX_USERS', 5))
+
+
+class ChatEventCoalescer:
+    """Aggregates typing/presence state per room and emits it once per tick"""
+
+    def __init__(self, tick_ms: int = DEFAULT_TICK_MS, typing_ttl: float = DEFAULT_TYPING_TTL,
+                 max_typing_users: int = DEFAULT_TYPING_MAX_USERS):
+        self.tick = max(tick_ms, 50) / 1000.0
+        self.typing_ttl = typing_ttl
+        self.max_typing_users = max_typing_users
+        # {room_id: {user_id: (username, expires_at)}}
+        self._typing = {}
+        self._dirty_typing = set()
+        # {room_id: {user_id: (username, is_online)}} - last state wins within a tick
+        self._presence = {}
+        self._lock = threading.Lock()
+        self._socketio = None
+        self.broadcasts_sent = 0
+
+    def start(self, socketio_instance):
+        """Start the flush loop as a SocketIO background task (once)"""
+        if self._socketio is not None:
+            return
+        self._socketio = socketio_instance
+        socketio_instance.start_background_task(self._run)
+        logger.info(f"Chat event coalescer started (tick={self.tick * 1000:.0f}ms)")
+
+    def set_typing(self, room_id: int, user_id: int, username: str, is_typing: bool, now: float = None):
+        """Record a typing start/stop; keystrokes within a tick collapse into one snapshot"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            typists = self._typing.setdefault(room_id, {})
+            if is_typing:
+                self._dirty_typing.add(room_id)
+                typists[user_id] = (username, now + self.typing_ttl)
+            elif typists.pop(user_id, None) is not None:
+                self._dirty_typing.add(room_id)
+            if not typists:
+                self._typing.pop(room_id, None)
+
+    def user_online(self, room_id: int, user_id: int, username: str):
+        with self._lock:
+            self._presence.setdefault(room_id, {})[user_id] = (username, True)
+
+    def user_offline(self, room_id: int, user_id: int, username: str):
+        with self._lock:
+            self._presence.setdefault(room_id, {})[user_id] = (username, False)
+            typists = self._typing.get(room_id)
+            if typists and typists.pop(user_id, None) is not None:
+                self._dirty_typing.add(room_id)
+                if not typists:
+                    self._typing.pop(room_id, None)
+
+    def flush(self, now: float = None):
+        """
+        Collect pending events
+
+        Returns:
+            list: (event_name, payload, room) tuples to broadcast
+        """
+        now = time.monotonic() if now is None else now
+        timestamp = datetime.utcnow().isoformat()
+        events = []
+        with self._lock:
+            # Expire typists that stopped sending keystrokes
+            for room_id in list(self._typing):
+                typists = self._typing[room_id]
+                expired = [uid for uid, (_, expires_at) in typists.items() if expires_at <= now]
+                for uid in expired:
+                    del typists[uid]
+                if expired:
+                    self._dirty_typing.add(room_id)
+                if not typists:
+                    del self._typing[room_id]
+
+            for room_id in self._dirty_typing:
+                typists = self._typing.get(room_id, {})
+                users = [
+                    {'user_id': uid, 'username': username}
+                    for uid, (username, _) in list(typists.items())[:self.max_typing_users]
+                ]
+                events.append(('typing_users', {
+                    'room_id': room_id,
+                    'users': users,
+                    'count': len(typists),
+                    'timestamp': timestamp
+                }, str(room_id)))
+            self._dirty_typing = set()
+
+            for room_id, changes in self._presence.items():
+                online = [{'user_id': uid, 'username': name} for uid, (name, is_online) in changes.items() if is_online]
+                offline = [{'user_id': uid, 'username': name} for uid, (name, is_online) in changes.items() if not is_online]
+                events.append(('presence_update', {
+                    'room_id': room_id,
+                    'online': online,
+                    'offline': offline,
+                    'timestamp': timestamp
+                }, str(room_id)))
+            self._presence = {}
+        return events
+
+    def _run(self):
+        while True:
+            self._socketio.sleep(self.tick)
+            try:
+                for event, payload, room in self.flush():
+                    self._socketio.emit(event, payload, namespace='/chat', room=room)
+                    self.broadcasts_sent += 1
+            except Exception as e:
+                logger.error(f"Error flushing chat events: {str(e)}")
+
+
+chat_events = ChatEventCoalescer()
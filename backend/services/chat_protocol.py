@@ -0,0 +1,139 @@
+"""
+Opt-in compact payload protocol for /chat message events.
+
+Clients that connect with ``protocol=compact`` (query string or auth data)
+receive message events with short keys and a user id instead of a nested
+user object. User details are sent once per connection through a ``users``
+event the first time a user appears in one of the client's rooms.
+
+Message payloads go to a per-room "payload room" so full and compact
+clients sharing a chat room each receive exactly one encoding:
+
+    <room_id>:full     - legacy clients, ``new_message`` / ``message_updated``
+    <room_id>:compact  - compact clients, ``m`` / ``mu``
+
+``CompactSessions`` only knows this worker's connections. Compact events
+are therefore published on the worker bus (services/worker_bus.py) and
+every worker delivers the users delta and the event to its own
+connections.
+"""
+
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_COMPACT = 'compact'
+
+# Full event name -> compact event name
+COMPACT_EVENTS = {
+    'new_message': 'm',
+    'message_updated': 'mu',
+}
+
+
+def message_room(room_id, compact: bool = False) -> str:
+    """SocketIO room that carries message payloads in the given encoding"""
+    return f"{room_id}:{'compact' if compact else 'full'}"
+
+
+def _epoch_ms(value):
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def compact_user(user: dict) -> dict:
+    """Short-key user dictionary entry"""
+    return {
+        'i': user['id'],
+        'n': user['username'],
+        'a': user.get('avatar_url') or '',
+        'r': user.get('role'),
+        'b': bool(user.get('is_banned')),
+    }
+
+
+def compact_message(data: dict) -> dict:
+    """
+    Convert a ``message_to_dict`` payload to the compact form
+
+    Empty/default fields are omitted; timestamps are epoch milliseconds.
+    """
+    compact = {
+        'i': data['id'],
+        'r': data['room_id'],
+        't': _epoch_ms(data.get('created_at')),
+    }
+    if data.get('content'):
+        compact['c'] = data['content']
+    if data.get('image_url'):
+        compact['g'] = data['image_url']
+    if data.get('parent_id'):
+        compact['p'] = data['parent_id']
+    if data.get('replies_count'):
+        compact['n'] = data['replies_count']
+    if data.get('updated_at') and data.get('updated_at') != data.get('created_at'):
+        compact['e'] = _epoch_ms(data['updated_at'])
+    if data.get('user'):
+        compact['u'] = data['user']['id']
+    return compact
+
+
+class CompactSessions:
+    """Tracks compact-protocol connections, their rooms and known user ids"""
+
+    def __init__(self):
+        self._known_users = {}  # sid -> {user_id}
+        self._rooms = {}        # room_id -> {sid}
+        self._lock = threading.Lock()
+
+    def register(self, sid: str):
+        with self._lock:
+            self._known_users.setdefault(sid, set())
+
+    def is_compact(self, sid: str) -> bool:
+        return sid in self._known_users
+
+    def join(self, sid: str, room_id: int):
+        with self._lock:
+            if sid in self._known_users:
+                self._rooms.setdefault(room_id, set()).add(sid)
+
+    def leave(self, sid: str, room_id: int):
+        with self._lock:
+            sids = self._rooms.get(room_id)
+            if sids:
+                sids.discard(sid)
+                if not sids:
+                    del self._rooms[room_id]
+
+    def drop(self, sid: str):
+        with self._lock:
+            self._known_users.pop(sid, None)
+            for room_id in list(self._rooms):
+                self._rooms[room_id].discard(sid)
+                if not self._rooms[room_id]:
+                    del self._rooms[room_id]
+
+    def has_room(self, room_id: int) -> bool:
+        return bool(self._rooms.get(room_id))
+
+    def sids_missing_user(self, room_id: int, user_id: int) -> list:
+        """Return compact sids in the room that have not seen user_id yet, marking them as seen"""
+        missing = []
+        with self._lock:
+            for sid in self._rooms.get(room_id, ()):
+                known = self._known_users.get(sid)
+                if known is not None and user_id not in known:
+                    known.add(user_id)
+                    missing.append(sid)
+        return missing
+
+
+compact_sessions = CompactSessions()
@@ -0,0 +1,433 @@
+"""
+Database engine configuration, per-role timeouts and read routing.
+
+Three roles share the schema but not the pool:
+
+    api        default engine (primary). Short statement timeout, sized for
+               request traffic.
+    replica    the 'replica' bind, only when DATABASE_REPLICA_URL is set.
+               API timeouts, for catalogue, search and history reads.
+    analytics  the 'analytics' bind. DATABASE_REPLICA_URL if set, otherwise
+               the primary with its own small pool. Long statement timeout for
+               admin dashboards and exports.
+
+Views decorated with ``replica_reads`` / ``analytics_reads`` send their
+SELECTs to that engine (RoutingSession.get_bind); writes and SELECT ... FOR
+UPDATE always go to the primary. Only decorate views that do not write:
+rows loaded from a replica must not be modified and flushed. Raw text()
+statements cannot be classified and stay on the primary unless executed
+with ``bind_arguments=read_bind_arguments(db.engines)``.
+
+Reads fall back to the primary when:
+
+- the request has already written (flush or INSERT/UPDATE/DELETE),
+- the client wrote within DB_REPLICA_STICKY_SECONDS (read-your-writes):
+  every request that writes sets the ``db_primary_until`` cookie, and the
+  frontend already sends cookies with credentials,
+- the replica is unavailable: a connect error or disconnect marks it down
+  for DB_REPLICA_CHECK_INTERVAL seconds, and the replica_health_check job
+  marks it down while replay lag exceeds DB_REPLICA_MAX_LAG_SECONDS.
+
+A failed connect still fails the statement that hit it; requests after that
+use the primary until the replica recovers. db_read_routing_total in
+/metrics counts routed reads by bind and outcome.
+
+To try it locally, run two Postgres instances (e.g. ports 5432 and 5433),
+apply the migrations to both and point DATABASE_REPLICA_URL at the second.
+They are not replicating, so a row written through the API exists only on
+the primary, which shows which engine served a read.
+benchmarks/replica_routing_check.py checks each routing rule against the
+two servers.
+
+Pool sizes are per worker process: total connections are
+workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) plus the replica and analytics
+pools.
+
+pool_pre_ping is off by default. It costs a round-trip on every checkout,
+which dominates small queries against a remote Postgres. Connections are
+recycled after DB_POOL_RECYCLE seconds instead, below the server/proxy
+idle timeout. Checkout is LIFO, so surplus connections go idle and age
+out.
+
+PgBouncer mode (DB_PGBOUNCER=true, transaction pooling) sends no startup
+``options``, since PgBouncer rejects them. Set the API timeouts on the
+database role instead (ALTER ROLE ... SET statement_timeout = ...). The
+analytics role applies its timeouts with SET LOCAL at the start of each
+transaction; one extra round-trip is negligible for its queries.
+"""
+
+import os
+import time
+import logging
+import threading
+from functools import wraps
+from flask import g, request, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_BIND = 'analytics'
+REPLICA_BIND = 'replica'
+
+REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 10))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('DB_REPLICA_MAX_LAG_SECONDS', 10))
+REPLICA_CHECK_INTERVAL = int(os.getenv('DB_REPLICA_CHECK_INTERVAL', 10))
+STICKY_COOKIE = 'db_primary_until'
+PGBOUNCER_MODE = os.getenv('DB_PGBOUNCER', 'false').lower() == 'true'
+POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'false').lower() == 'true'
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 600))
+POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 10))
+CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 10))
+# SQLAlchemy compiled statement cache (per engine)
+QUERY_CACHE_SIZE = int(os.getenv('DB_QUERY_CACHE_SIZE', 1000))
+
+ROLES = {
+    'api': {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 5)),
+        'statement_timeout': int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 15000)),
+        'idle_in_transaction_timeout': int(os.getenv('DB_IDLE_IN_TX_TIMEOUT_MS', 30000)),
+    },
+    'replica': {
+        'pool_size': int(os.getenv('DB_REPLICA_POOL_SIZE', os.getenv('DB_POOL_SIZE', 5))),
+        'max_overflow': int(os.getenv('DB_REPLICA_MAX_OVERFLOW', os.getenv('DB_MAX_OVERFLOW', 5))),
+        'statement_timeout': int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 15000)),
+        'idle_in_transaction_timeout': int(os.getenv('DB_IDLE_IN_TX_TIMEOUT_MS', 30000)),
+    },
+    'analytics': {
+        'pool_size': int(os.getenv('DB_ANALYTICS_POOL_SIZE', 2)),
+        'max_overflow': int(os.getenv('DB_ANALYTICS_MAX_OVERFLOW', 2)),
+        'statement_timeout': int(os.getenv('DB_ANALYTICS_STATEMENT_TIMEOUT_MS', 120000)),
+        'idle_in_transaction_timeout': int(os.getenv('DB_ANALYTICS_IDLE_IN_TX_TIMEOUT_MS', 60000)),
+    },
+}
+
+
+def engine_options(role: str = 'api') -> dict:
+    """SQLAlchemy create_engine options for a role"""
+    settings = ROLES[role]
+    connect_args = {
+        'sslmode': 'require' if os.getenv('FLASK_ENV') == 'production' else 'disable',
+        'connect_timeout': CONNECT_TIMEOUT,
+        'application_name': f'book-{role}',
+    }
+    if not PGBOUNCER_MODE:
+        connect_args['options'] = (
+            f"-c statement_timeout={settings['statement_timeout']} "
+            f"-c idle_in_transaction_session_timeout={settings['idle_in_transaction_timeout']}"
+        )
+    return {
+        'pool_size': settings['pool_size'],
+        'max_overflow': settings['max_overflow'],
+        'pool_timeout': POOL_TIMEOUT,
+        'pool_recycle': POOL_RECYCLE,
+        'pool_pre_ping': POOL_PRE_PING,
+        'pool_use_lifo': True,
+        'query_cache_size': QUERY_CACHE_SIZE,
+        'connect_args': connect_args,
+    }
+
+
+def database_config(database_url: str) -> dict:
+    """
+    Flask-SQLAlchemy settings for the primary, replica and analytics binds
+
+    Returns:
+        dict: SQLALCHEMY_ENGINE_OPTIONS and SQLALCHEMY_BINDS
+    """
+    binds = {
+        ANALYTICS_BIND: {'url': REPLICA_URL or database_url, **engine_options('analytics')},
+    }
+    if REPLICA_URL:
+        binds[REPLICA_BIND] = {'url': REPLICA_URL, **engine_options('replica')}
+    return {
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options('api'),
+        'SQLALCHEMY_BINDS': binds,
+    }
+
+
+def _replica_binds() -> set:
+    """Binds that point at the replica (subject to stickiness and health)"""
+    return {REPLICA_BIND, ANALYTICS_BIND} if REPLICA_URL else set()
+
+
+def init_engines(engines: dict):
+    """Per-engine hooks: SET LOCAL timeouts in PgBouncer mode, pool metrics, replica health (call once, in an app context)"""
+    analytics = engines.get(ANALYTICS_BIND)
+    if PGBOUNCER_MODE and analytics is not None:
+        settings = ROLES['analytics']
+
+        @event.listens_for(analytics, 'begin')
+        def _set_local_timeouts(conn):
+            conn.exec_driver_sql(
+                f"SET LOCAL statement_timeout = {settings['statement_timeout']}; "
+                f"SET LOCAL idle_in_transaction_session_timeout = {settings['idle_in_transaction_timeout']}"
+            )
+
+    for key, engine in engines.items():
+        _watch_pool(key or 'primary', engine)
+        if key in _replica_binds():
+            replica_monitor.watch(key, engine)
+    logger.info(
+        f"Database engines: {', '.join(str(key or 'primary') for key in engines)} "
+        f"(replica {'configured' if REPLICA_URL else 'not configured'}, pgbouncer {PGBOUNCER_MODE})"
+    )
+
+
+# Pool metrics (per worker), exposed at /metrics
+_pools = {}
+pool_connects = metrics.counter('db_pool_connects_total', 'New DBAPI connections opened', ('bind',))
+pool_invalidations = metrics.counter('db_pool_invalidations_total', 'Connections invalidated (errors, disconnects)', ('bind',))
+
+
+def _pool_values(method: str):
+    return {(name,): getattr(pool, method)() for name, pool in _pools.items() if hasattr(pool, method)}
+
+
+for _name, _method, _doc in (
+    ('db_pool_size', 'size', 'Configured pool size'),
+    ('db_pool_checked_out', 'checkedout', 'Connections in use'),
+    ('db_pool_checked_in', 'checkedin', 'Idle connections in the pool'),
+    ('db_pool_overflow', 'overflow', 'Connections above pool_size (negative: unopened slots)'),
+):
+    metrics.gauge(_name, _doc, ('bind',), callback=lambda method=_method: _pool_values(method))
+
+
+def _watch_pool(name: str, engine):
+    _pools[name] = engine.pool
+
+    @event.listens_for(engine, 'connect')
+    def _connected(dbapi_connection, connection_record):
+        pool_connects.inc(name)
+
+    @event.listens_for(engine, 'invalidate')
+    def _invalidated(dbapi_connection, connection_record, exception):
+        pool_invalidations.inc(name)
+
+
+def pool_status() -> dict:
+    """{bind: {size, checked_out, checked_in, overflow}} for this worker"""
+    return {
+        name: {
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+        }
+        for name, pool in _pools.items()
+        if hasattr(pool, 'checkedout')
+    }
+
+
+class ReplicaMonitor:
+    """Tracks whether the replica can serve reads (per process)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engine = None
+        self._down_until = 0.0
+        self.reason = None
+        self.lag = None
+
+    def watch(self, name: str, engine):
+        """Mark the replica down on connect errors and disconnects from this engine"""
+        if self._engine is None or name == REPLICA_BIND:
+            self._engine = engine
+
+        @event.listens_for(engine, 'handle_error')
+        def _replica_error(exception_context):
+            # No connection means the connect itself failed
+            if exception_context.is_disconnect or exception_context.connection is None:
+                self.mark_down(f"{name}: {exception_context.original_exception}")
+
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def mark_down(self, reason: str, seconds: float = REPLICA_CHECK_INTERVAL):
+        with self._lock:
+            was_up = self.available()
+            self._down_until = time.monotonic() + seconds
+            self.reason = reason
+        if was_up:
+            logger.warning(f"Replica unavailable for reads, using the primary: {reason}")
+
+    def mark_up(self):
+        with self._lock:
+            was_down = not self.available()
+            self._down_until = 0.0
+            self.reason = None
+        if was_down:
+            logger.info("Replica available for reads again")
+
+    def check(self):
+        """Background job: measure replay lag and mark the replica up or down"""
+        if self._engine is None:
+            return "no replica configured"
+        try:
+            with self._engine.connect() as conn:
+                # Caught up (or not a standby at all) counts as no lag, so an
+                # idle primary does not look like a lagging replica
+                lag = conn.execute(text("""
+                    SELECT CASE
+                        WHEN NOT pg_is_in_recovery() THEN 0
+                        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                    END
+                """)).scalar()
+        except Exception as e:
+            self.mark_down(f"health check failed: {e}")
+            return "down"
+        self.lag = float(lag)
+        if self.lag > REPLICA_MAX_LAG_SECONDS:
+            self.mark_down(f"replay lag {self.lag:.1f}s > {REPLICA_MAX_LAG_SECONDS:g}s")
+            return f"lagging {self.lag:.1f}s"
+        self.mark_up()
+        return f"ok (lag {self.lag:.1f}s)"
+
+    def status(self) -> dict:
+        return {
+            'configured': self._engine is not None,
+            'available': self._engine is not None and self.available(),
+            'lag_seconds': self.lag,
+            'reason': self.reason,
+        }
+
+
+replica_monitor = ReplicaMonitor()
+
+read_routing = metrics.counter(
+    'db_read_routing_total', 'Routed reads by target bind and outcome', ('bind', 'outcome')
+)
+
+
+def _sticky_to_primary() -> bool:
+    """The client wrote recently (db_primary_until cookie still in the future)"""
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _read_engine(engines: dict):
+    """Engine for a plain read in this request, or None for the primary"""
+    key = g.get('db_role')
+    engine = engines.get(key) if key else None
+    if engine is None:
+        return None
+    if g.get('db_wrote'):
+        outcome = 'wrote'
+    elif key in _replica_binds() and _sticky_to_primary():
+        outcome = 'sticky'
+    elif key in _replica_binds() and not replica_monitor.available():
+        outcome = 'unavailable'
+    else:
+        read_routing.inc(key, 'routed')
+        return engine
+    read_routing.inc(key, outcome)
+    return None
+
+
+def read_bind_arguments(engines: dict) -> dict:
+    """
+    bind_arguments for a read-only statement get_bind cannot classify
+
+    RoutingSession only routes statements it can tell are reads (ORM/Core
+    selects). A text() query in a routed view goes to the primary unless
+    it is executed with these:
+
+        db.session.execute(text(sql), params, bind_arguments=read_bind_arguments(db.engines))
+
+    Returns:
+        dict: {'bind': engine} for this request's read engine, or {} (primary)
+    """
+    if not has_request_context():
+        return {}
+    engine = _read_engine(engines)
+    return {'bind': engine} if engine is not None else {}
+
+
+def _is_plain_read(clause) -> bool:
+    return (
+        clause is not None
+        and getattr(clause, 'is_select', False)
+        and getattr(clause, '_for_update_arg', None) is None
+    )
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends routed reads to the replica / analytics binds"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or getattr(clause, 'is_dml', False):
+                # Later reads in this request, and from this client for a
+                # while (see init_read_routing), go to the primary
+                g.db_wrote = True
+            elif _is_plain_read(clause):
+                engine = _read_engine(self._db.engines)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_read_routing(app):
+    """Set the read-your-writes cookie on responses to requests that wrote"""
+    if not REPLICA_URL:
+        return
+
+    @app.after_request
+    def _stick_to_primary(response):
+        if g.get('db_wrote'):
+            response.set_cookie(
+                STICKY_COOKIE,
+                str(int(time.time()) + REPLICA_STICKY_SECONDS),
+                max_age=REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    logger.info(
+        f"Replica reads enabled (sticky {REPLICA_STICKY_SECONDS}s after writes, "
+        f"max lag {REPLICA_MAX_LAG_SECONDS:g}s)"
+    )
+
+
+def _route_reads(bind: str, f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        # Kept for the whole request so streamed responses stay on the same engine
+        g.db_role = bind
+        return f(*args, **kwargs)
+    return decorated
+
+
+def replica_reads(f):
+    """
+    Run a read-only view's SELECTs on the replica (primary when not configured)
+
+    Usage:
+        @book_bp.route('/', methods=['GET'])
+        @jwt_required(optional=True)
+        @replica_reads
+        def get_books():
+            ...
+    """
+    return _route_reads(REPLICA_BIND, f)
+
+
+def analytics_reads(f):
+    """
+    Run a view's SELECTs on the analytics engine (replica or dedicated pool)
+
+    Usage:
+        @admin_bp.route('/dashboard/stats')
+        @admin_required
+        @analytics_reads
+        def get_dashboard_stats():
+            ...
+    """
+    return _route_reads(ANALYTICS_BIND, f)
@@ -0,0 +1,262 @@
+"""
+Approximate distinct counts (online users, readers, unique viewers, room users).
+
+Write paths record ids into in-memory HyperLogLog sketches keyed by
+(metric, entity, bucket). A background job in every worker merges them
+into ``activity_sketches`` rows (and gunicorn's worker_exit hook flushes
+what is left when a worker stops). Windowed counts merge the stored sketches of
+the buckets in the window, plus this process's unflushed ones. The cost
+depends on the number of buckets, not on traffic. Estimates carry the
+HyperLogLog error bound of ``relative_error(HLL_PRECISION)`` (about 2.3%
+at the default precision of 11).
+
+Metrics:
+    online_users  - per minute, site-wide: users viewing or reading books
+    readers       - per day, site-wide: users reading books
+    book_viewers  - per day, per book: users opening a book page
+    room_users    - per day, per room: users sending messages
+"""
+
+import os
+import zlib
+import logging
+import threading
+from datetime import datetime, date, time, timedelta, timezone
+from sqlalchemy import tuple_, text
+from sqlalchemy.dialects.postgresql import insert
+from extensions import db
+from models.activity_sketch import ActivitySketch
+from utils.hyperloglog import HyperLogLog, relative_error
+
+logger = logging.getLogger(__name__)
+
+HLL_PRECISION = int(os.getenv('HLL_PRECISION', 11))
+FLUSH_INTERVAL = int(os.getenv('HLL_FLUSH_INTERVAL', 30))
+RETENTION_DAYS = int(os.getenv('HLL_RETENTION_DAYS', 400))
+MINUTE_RETENTION = timedelta(hours=1)
+BACKFILL_DAYS = 90
+# Serializes flushes across processes (transaction-level advisory lock)
+FLUSH_LOCK_KEY = zlib.crc32(b'activity_sketch_flush')
+
+MINUTE = 'minute'
+DAY = 'day'
+METRICS = {
+    'online_users': MINUTE,
+    'readers': DAY,
+    'book_viewers': DAY,
+    'room_users': DAY,
+}
+
+ERROR_BOUND = relative_error(HLL_PRECISION)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _bucket(metric: str, when) -> datetime:
+    if isinstance(when, date) and not isinstance(when, datetime):
+        return datetime.combine(when, time.min)
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    if METRICS[metric] == MINUTE:
+        return when.replace(second=0, microsecond=0)
+    return when.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class DistinctMetrics:
+    """Buffers sketch updates in memory and answers windowed distinct counts"""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self._pending = {}  # (metric, entity_id, bucket) -> HyperLogLog
+        self._lock = threading.Lock()
+        self._backfill_checked = False
+
+    def record(self, metric: str, item, entity_id: int = 0, when=None):
+        """Add an id (usually a user id) to a metric's current bucket"""
+        if item is None:
+            return
+        key = (metric, entity_id or 0, _bucket(metric, when or _utcnow()))
+        with self._lock:
+            sketch = self._pending.get(key)
+            if sketch is None:
+                sketch = self._pending[key] = HyperLogLog(self.precision)
+            sketch.add(item)
+
+    def record_view(self, user_id, book_id: int):
+        self.record('online_users', user_id)
+        self.record('book_viewers', user_id, book_id)
+
+    def record_read(self, user_id):
+        self.record('online_users', user_id)
+        self.record('readers', user_id)
+
+    def record_message(self, user_id, room_id: int):
+        self.record('room_users', user_id, room_id)
+
+    def _load(self, metric: str, start, end, entity_ids=None) -> dict:
+        """Merged sketch per entity for buckets in [start, end]"""
+        start, end = _bucket(metric, start), _bucket(metric, end)
+        query = db.session.query(ActivitySketch.entity_id, ActivitySketch.registers).filter(
+            ActivitySketch.metric == metric,
+            ActivitySketch.bucket >= start,
+            ActivitySketch.bucket <= end
+        )
+        if entity_ids is not None:
+            query = query.filter(ActivitySketch.entity_id.in_(list(entity_ids)))
+
+        merged = {}
+        for entity_id, registers in query:
+            sketch = HyperLogLog.from_bytes(registers)
+            if entity_id in merged:
+                merged[entity_id].merge(sketch)
+            else:
+                merged[entity_id] = sketch
+        with self._lock:
+            for (key_metric, entity_id, bucket), sketch in self._pending.items():
+                if key_metric != metric or not start <= bucket <= end:
+                    continue
+                if entity_ids is not None and entity_id not in entity_ids:
+                    continue
+                if entity_id in merged:
+                    merged[entity_id].merge(sketch)
+                else:
+                    merged[entity_id] = sketch.copy()
+        return merged
+
+    def count(self, metric: str, start, end=None, entity_id: int = 0) -> int:
+        """Distinct ids of one entity (0 = site-wide) between start and end"""
+        sketch = self._load(metric, start, end or _utcnow(), [entity_id]).get(entity_id)
+        return sketch.count() if sketch else 0
+
+    def count_union(self, metric: str, start, end=None) -> int:
+        """Distinct ids across every entity of a metric (e.g. users in any room)"""
+        union = HyperLogLog(self.precision)
+        for sketch in self._load(metric, start, end or _utcnow()).values():
+            union.merge(sketch)
+        return union.count()
+
+    def count_by_entity(self, metric: str, start, end=None, entity_ids=None) -> dict:
+        """Distinct ids per entity, e.g. {room_id: users}"""
+        if entity_ids is not None:
+            entity_ids = set(entity_ids)
+        return {
+            entity_id: sketch.count()
+            for entity_id, sketch in self._load(metric, start, end or _utcnow(), entity_ids).items()
+        }
+
+    def flush(self) -> dict:
+        """
+        Background job (every worker): merge pending sketches into the database
+
+        Every process holds sketches of its own, so each one flushes. The
+        read-merge-write below runs under a blocking transaction-level
+        advisory lock, so two processes never overwrite each other's merge
+        of the same rows.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        try:
+            db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': FLUSH_LOCK_KEY})
+            if not self._backfill_checked:
+                self._backfill_checked = True
+                if db.session.query(ActivitySketch.metric).first() is None:
+                    self.backfill()
+
+            if pending:
+                existing = db.session.query(
+                    ActivitySketch.metric, ActivitySketch.entity_id,
+                    ActivitySketch.bucket, ActivitySketch.registers
+                ).filter(
+                    tuple_(ActivitySketch.metric, ActivitySketch.entity_id, ActivitySketch.bucket).in_(list(pending))
+                ).all()
+                for metric, entity_id, bucket, registers in existing:
+                    pending[(metric, entity_id, bucket)].merge(HyperLogLog.from_bytes(registers))
+                self._save(pending)
+
+            now = _utcnow()
+            pruned = ActivitySketch.query.filter(
+                ActivitySketch.metric.in_([m for m, kind in METRICS.items() if kind == MINUTE]),
+                ActivitySketch.bucket < now - MINUTE_RETENTION
+            ).delete(synchronize_session=False)
+            pruned += ActivitySketch.query.filter(
+                ActivitySketch.bucket < now - timedelta(days=RETENTION_DAYS)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Put the updates back so the next run retries them
+            with self._lock:
+                for key, sketch in pending.items():
+                    if key in self._pending:
+                        self._pending[key].merge(sketch)
+                    else:
+                        self._pending[key] = sketch
+            raise
+        return {'sketches': len(pending), 'pruned': pruned}
+
+    def flush_at_exit(self, app):
+        """Flush this process's pending sketches before it exits (gunicorn worker_exit)"""
+        if not self._pending:
+            return
+        try:
+            with app.app_context():
+                result = self.flush()
+            logger.info(f"Activity sketches flushed at exit: {result}")
+        except Exception as e:
+            logger.warning(f"Activity sketch flush at exit failed, {len(self._pending)} sketches lost: {str(e)}")
+
+    def _save(self, sketches: dict):
+        now = _utcnow()
+        stmt = insert(ActivitySketch).values([
+            {
+                'metric': metric,
+                'entity_id': entity_id,
+                'bucket': bucket,
+                'registers': sketch.to_bytes(),
+                'updated_at': now
+            }
+            for (metric, entity_id, bucket), sketch in sketches.items()
+        ])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[ActivitySketch.metric, ActivitySketch.entity_id, ActivitySketch.bucket],
+            set_={'registers': stmt.excluded.registers, 'updated_at': stmt.excluded.updated_at}
+        ))
+
+    def backfill(self, days: int = BACKFILL_DAYS):
+        """Seed daily sketches from history tables (run once, on an empty table)"""
+        from models.message import Message
+        from models.reading_history import ReadingHistory
+        from models.view_history import ViewHistory
+
+        since = _bucket('readers', _utcnow()) - timedelta(days=days - 1)
+        sketches = {}
+
+        def add(metric, entity_id, when, user_id):
+            if when is None:
+                return
+            key = (metric, entity_id or 0, _bucket(metric, when))
+            if key not in sketches:
+                sketches[key] = HyperLogLog(self.precision)
+            sketches[key].add(user_id)
+
+        for user_id, when in db.session.query(ReadingHistory.user_id, ReadingHistory.last_read_at).filter(
+            ReadingHistory.last_read_at >= since
+        ).yield_per(5000):
+            add('readers', 0, when, user_id)
+        for user_id, book_id, when in db.session.query(
+            ViewHistory.user_id, ViewHistory.book_id, ViewHistory.viewed_at
+        ).filter(ViewHistory.viewed_at >= since).yield_per(5000):
+            add('book_viewers', book_id, when, user_id)
+        for user_id, room_id, when in db.session.query(
+            Message.user_id, Message.room_id, Message.created_at
+        ).filter(Message.created_at >= since).yield_per(5000):
+            add('room_users', room_id, when, user_id)
+
+        if sketches:
+            self._save(sketches)
+        logger.info(f"Backfilled {len(sketches)} activity sketches from the last {days} days")
+
+
+distinct_metrics = DistinctMetrics()
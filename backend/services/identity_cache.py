@@ -0,0 +1,170 @@
+"""
+Per-process cache of who a JWT belongs to (id, username, role, ban state).
+
+Access tokens carry the user's ``auth_version`` as the ``av`` claim next to
+``role`` and ``username``. Every ban/unban/role change bumps
+``users.auth_version`` and stamps ``auth_changed_at``. Each process polls
+for those changes every ``IDENTITY_POLL_INTERVAL`` seconds; that poll is the
+invalidation channel. So a request can be authorized:
+
+1. from a cached snapshot (no DB), or
+2. on a cache miss, from the token claims themselves when no newer
+   auth_version is known for that user (no DB), or
+3. from one small DB read, which is then cached for ``IDENTITY_CACHE_TTL``.
+
+Changes made in this process invalidate immediately. Other processes pick
+them up within one poll interval.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from tenacity import retry, stop_after_attempt, wait_fixed
+from extensions import db
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', 30))
+POLL_INTERVAL = int(os.getenv('IDENTITY_POLL_INTERVAL', 5))
+# Must be longer than the access token lifetime: changes older than this
+# are assumed to be reflected in every token still in circulation
+# (checked at startup, see validate_token_lifetime)
+VERSION_WINDOW = int(os.getenv('IDENTITY_VERSION_WINDOW', 3600))
+
+
+class UserSnapshot:
+    """Read-only identity used for authorization (stored in g.user)"""
+
+    __slots__ = ('id', 'username', 'role', 'is_banned', 'auth_version')
+
+    def __init__(self, id, username, role, is_banned, auth_version):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.is_banned = bool(is_banned)
+        self.auth_version = auth_version or 0
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.id} {self.role}{" banned" if self.is_banned else ""}>'
+
+
+def validate_token_lifetime(lifetime: timedelta, window: int = VERSION_WINDOW):
+    """
+    Check that access tokens expire within the version window
+
+    On a cache miss, get() trusts the token's claims (and treats the user as
+    not banned) when the poller knows no newer auth_version. The first poll
+    only looks back ``window`` seconds, so a token older than that could
+    predate a ban the poller never saw.
+
+    Raises:
+        ValueError: If the lifetime is not shorter than the window
+    """
+    if lifetime.total_seconds() >= window:
+        raise ValueError(
+            f"ACCESS_TOKEN_MINUTES ({lifetime.total_seconds() / 60:g}) must be shorter than "
+            f"IDENTITY_VERSION_WINDOW ({window} seconds)"
+        )
+
+
+def token_claims(user) -> dict:
+    """Identity claims to embed in access tokens"""
+    return {"role": user.role, "username": user.username, "av": user.auth_version or 0}
+
+
+class IdentityCache:
+    def __init__(self, ttl: int = CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}          # user_id -> (snapshot, loaded_at)
+        self._versions = {}         # user_id -> latest auth_version seen by the poller
+        self._polled_until = None   # None until the first poll succeeded
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.claim_hits = 0
+        self.misses = 0
+
+    @retry(stop=stop_after_attempt(3), wait=wait_fixed(0.2), reraise=True)
+    def _load(self, user_id: int):
+        row = db.session.query(
+            User.id, User.username, User.role, User.is_banned, User.auth_version
+        ).filter(User.id == user_id).first()
+        return UserSnapshot(*row) if row else None
+
+    def get(self, user_id, claims: dict = None):
+        """
+        Snapshot for a user id, or None if the user does not exist
+
+        Args:
+            user_id: JWT identity (str or int)
+            claims: Decoded access token claims, used to skip the DB on a miss
+        """
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            known_version = self._versions.get(user_id, 0)
+            polled = self._polled_until is not None
+        if entry and now - entry[1] <= self.ttl and entry[0].auth_version >= known_version:
+            self.hits += 1
+            return entry[0]
+
+        # Claims are trustworthy only if the poller has run and knows of no newer version
+        if claims and polled and 'av' in claims and claims['av'] >= known_version:
+            self.claim_hits += 1
+            return UserSnapshot(user_id, claims.get('username'), claims.get('role'), False, claims['av'])
+
+        self.misses += 1
+        snapshot = self._load(user_id)
+        if snapshot is not None:
+            with self._lock:
+                self._entries[user_id] = (snapshot, now)
+        return snapshot
+
+    def invalidate(self, user_id):
+        """Drop a user's cached snapshot in this process"""
+        with self._lock:
+            self._entries.pop(int(user_id), None)
+
+    def mark_changed(self, user):
+        """Record a committed auth change made in this process (no need to wait for the poll)"""
+        with self._lock:
+            self._versions[user.id] = max(self._versions.get(user.id, 0), user.auth_version or 0)
+            self._entries.pop(user.id, None)
+
+    def poll(self) -> dict:
+        """Per-process job: fetch auth changes since the last poll"""
+        started = datetime.utcnow()
+        since = self._polled_until or started - timedelta(seconds=VERSION_WINDOW)
+        # Small overlap so commits that straddle the previous poll are not missed
+        rows = db.session.query(User.id, User.auth_version).filter(
+            User.auth_changed_at >= since - timedelta(seconds=POLL_INTERVAL)
+        ).all()
+        db.session.rollback()
+        with self._lock:
+            for user_id, version in rows:
+                if version > self._versions.get(user_id, 0):
+                    self._versions[user_id] = version
+                    self._entries.pop(user_id, None)
+            self._polled_until = started
+        return {'changes': len(rows)}
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'claim_hits': self.claim_hits,
+            'misses': self.misses,
+        }
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,145 @@
+"""
+Periodic background jobs.
+
+Jobs run as SocketIO background tasks (green threads under eventlet) inside
+an application context. Each run of an exclusive job (the default) first
+takes a Postgres advisory lock named after the job, so when several workers
+run the same app only one of them does the work for a given interval; the
+others skip that run. Non-exclusive jobs refresh per-process state and run
+in every worker.
+"""
+
+import os
+import time
+import zlib
+import logging
+import threading
+from sqlalchemy import text
+from extensions import db
+from services.database import PGBOUNCER_MODE
+
+logger = logging.getLogger(__name__)
+
+JOBS_ENABLED = os.getenv('BACKGROUND_JOBS_ENABLED', 'true').lower() == 'true'
+
+
+class _Job:
+    __slots__ = ('name', 'interval', 'func', 'initial_delay', 'exclusive', 'last_run', 'last_duration', 'last_error', 'runs')
+
+    def __init__(self, name, interval, func, initial_delay, exclusive):
+        self.name = name
+        self.interval = max(interval, 1)
+        self.func = func
+        self.initial_delay = initial_delay
+        self.exclusive = exclusive
+        self.last_run = None
+        self.last_duration = None
+        self.last_error = None
+        self.runs = 0
+
+
+class PeriodicJobs:
+    """Registry of interval jobs started once per process"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._started = False
+        self._lock = threading.Lock()
+
+    def register(self, name: str, interval: float, func, initial_delay: float = 0, exclusive: bool = True):
+        """
+        Register a job
+
+        Args:
+            name: Unique job name (also the advisory lock key)
+            interval: Seconds between runs
+            func: Callable run inside an app context; its return value is logged
+            initial_delay: Seconds to wait before the first run
+            exclusive: Run in one process at a time (advisory lock) instead of every process
+        """
+        with self._lock:
+            self._jobs[name] = _Job(name, interval, func, initial_delay, exclusive)
+
+    def start(self, app, socketio_instance):
+        """Start one background task per registered job (once)"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        if not JOBS_ENABLED:
+            logger.info("Background jobs disabled (BACKGROUND_JOBS_ENABLED=false)")
+            return
+        for job in self._jobs.values():
+            socketio_instance.start_background_task(self._loop, app, socketio_instance, job)
+            logger.info(f"Background job '{job.name}' scheduled every {job.interval}s")
+
+    def run_now(self, name: str):
+        """Run a job synchronously in the current app context (skips the advisory lock)"""
+        return self._jobs[name].func()
+
+    def status(self) -> list:
+        return [{
+            'name': job.name,
+            'interval': job.interval,
+            'runs': job.runs,
+            'last_run': job.last_run,
+            'last_duration_ms': round(job.last_duration * 1000, 1) if job.last_duration is not None else None,
+            'last_error': job.last_error,
+        } for job in self._jobs.values()]
+
+    def _loop(self, app, socketio_instance, job):
+        if job.initial_delay:
+            socketio_instance.sleep(job.initial_delay)
+        while True:
+            with app.app_context():
+                self._run_once(job)
+            socketio_instance.sleep(job.interval)
+
+    def _run_once(self, job):
+        key = zlib.crc32(job.name.encode('utf-8'))
+        started = time.perf_counter()
+        try:
+            if not job.exclusive:
+                result = job.func()
+                job.last_error = None
+                logger.debug(f"Job '{job.name}' finished in {(time.perf_counter() - started) * 1000:.0f}ms: {result}")
+                return
+            # Dedicated connection so the lock survives commits made by the job
+            with db.engine.connect() as lock_conn:
+                if PGBOUNCER_MODE:
+                    # Transaction pooling: a session lock would outlive our hold on the
+                    # server connection, so hold a transaction-level lock instead
+                    lock_conn.execute(text("SET LOCAL idle_in_transaction_session_timeout = 0"))
+                    acquired = lock_conn.execute(
+                        text("SELECT pg_try_advisory_xact_lock(:key)"), {'key': key}
+                    ).scalar()
+                else:
+                    acquired = lock_conn.execute(
+                        text("SELECT pg_try_advisory_lock(:key)"), {'key': key}
+                    ).scalar()
+                    lock_conn.commit()
+                if not acquired:
+                    logger.debug(f"Job '{job.name}' is running elsewhere, skipping")
+                    return
+                try:
+                    result = job.func()
+                    job.last_error = None
+                    logger.info(f"Job '{job.name}' finished in {(time.perf_counter() - started) * 1000:.0f}ms: {result}")
+                finally:
+                    if PGBOUNCER_MODE:
+                        lock_conn.rollback()
+                    else:
+                        lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': key})
+                        lock_conn.commit()
+        except Exception as e:
+            db.session.rollback()
+            job.last_error = str(e)
+            logger.error(f"Job '{job.name}' failed: {str(e)}")
+        finally:
+            job.runs += 1
+            job.last_run = time.time()
+            job.last_duration = time.perf_counter() - started
+            db.session.remove()
+
+
+jobs = PeriodicJobs()
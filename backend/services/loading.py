@@ -0,0 +1,150 @@
+"""
+Relationship loading: N+1 detection and named eager-loading policies.
+
+Every relationship is declared ``lazy='select'``, so serializing a list of
+rows that touches a relationship (``post.user``, ``favorite.book.authors``)
+issues one query per row.
+
+Detector
+    With NPLUSONE_DETECT=log (or raise), every lazy relationship load in a
+    request is counted per relationship (``Post.user``). When one
+    relationship lazy-loads more than NPLUSONE_THRESHOLD times, the request
+    logs a warning (log) or raises NPlusOneError (raise). Loads answered
+    from the identity map issue no SQL and are not counted; selectinload /
+    joinedload batches are eager and not counted either. Run the app with
+    NPLUSONE_DETECT=raise in development or CI to make regressions fail
+    loudly. Off by default.
+
+Policies
+    LOADING_POLICIES declares named loader options for the listings the
+    detector flagged. Views name the policy they need explicitly (an
+    unknown name raises), so renaming or reusing a view never silently
+    drops its eager loading:
+
+        query = Post.query.options(*loading_policy('post_feed'))
+
+    selectinload is used rather than joinedload for collections: it adds one
+    ``WHERE id IN (...)`` query per relationship per page instead of
+    multiplying rows, and it does not interfere with LIMIT/OFFSET.
+"""
+
+import os
+import logging
+from collections import Counter
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import RelationshipProperty, selectinload
+from models.book import Book
+from models.bookmark import Bookmark
+from models.favorite import Favorite
+from models.post import Post
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+NPLUSONE_MODE = os.getenv('NPLUSONE_DETECT', 'off').lower()  # off | log | raise
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+
+# Book cards (book_to_dict) read category and authors
+def _book_card():
+    return (selectinload(Book.category), selectinload(Book.authors))
+
+
+# Built on first use: creating loader options configures every mapper, which
+# must not happen at import time (string relationships such as
+# User.recommendations need all models imported first)
+LOADING_POLICIES = {
+    # post.get_posts (Post.to_dict reads post.user)
+    'post_feed': lambda: (selectinload(Post.user),),
+    # book.get_bookmarks
+    'bookmark_listing': lambda: (selectinload(Bookmark.book).options(*_book_card()),),
+    # book.get_favorites, user.get_user_favorites
+    'favorite_listing': lambda: (selectinload(Favorite.book).options(*_book_card()),),
+}
+_resolved_policies = {}
+
+nplusone_detections = metrics.counter(
+    'nplusone_detections_total', 'Requests where a relationship lazy-loaded more than NPLUSONE_THRESHOLD times',
+    ('endpoint', 'relationship')
+)
+
+
+class NPlusOneError(Exception):
+    """A relationship lazy-loaded more than NPLUSONE_THRESHOLD times in one request"""
+    pass
+
+
+def loading_policy(name: str) -> tuple:
+    """
+    Loader options of a named policy
+
+    Args:
+        name: Key in LOADING_POLICIES
+
+    Returns:
+        tuple: Loader options to pass to Query.options()
+
+    Raises:
+        KeyError: Unknown policy name
+    """
+    options = _resolved_policies.get(name)
+    if options is None:
+        try:
+            build = LOADING_POLICIES[name]
+        except KeyError:
+            raise KeyError(f"Unknown loading policy {name!r} (declared: {', '.join(sorted(LOADING_POLICIES))})") from None
+        options = _resolved_policies[name] = build()
+    return options
+
+
+def _relationship_name(orm_execute_state) -> str:
+    path = orm_execute_state.loader_strategy_path
+    for element in reversed(path.path if path is not None else ()):
+        if isinstance(element, RelationshipProperty):
+            return f"{element.parent.class_.__name__}.{element.key}"
+    parent = orm_execute_state.lazy_loaded_from
+    return f"{parent.class_.__name__}.?" if parent is not None else 'unknown'
+
+
+def init_nplusone_detector(app, session):
+    """
+    Count lazy relationship loads per request and report N+1 patterns
+
+    Args:
+        app: Flask app (summary logged after each request)
+        session: Session class or scoped session to listen on (db.session)
+    """
+    if NPLUSONE_MODE not in ('log', 'raise'):
+        return
+
+    @event.listens_for(session, 'do_orm_execute')
+    def _count_lazy_load(orm_execute_state):
+        if orm_execute_state.lazy_loaded_from is None or not has_request_context():
+            return
+        name = _relationship_name(orm_execute_state)
+        counts = g.setdefault('_lazy_loads', Counter())
+        counts[name] += 1
+        if counts[name] == NPLUSONE_THRESHOLD + 1 and NPLUSONE_MODE == 'raise':
+            nplusone_detections.inc(request.endpoint or 'unmatched', name)
+            raise NPlusOneError(
+                f"N+1: {name} lazy-loaded more than {NPLUSONE_THRESHOLD} times in {request.endpoint}; "
+                f"declare selectinload({name}) in LOADING_POLICIES"
+            )
+
+    @app.after_request
+    def _report_lazy_loads(response):
+        counts = g.pop('_lazy_loads', None)
+        if not counts or NPLUSONE_MODE != 'log':
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        for name, count in counts.items():
+            if count > NPLUSONE_THRESHOLD:
+                nplusone_detections.inc(endpoint, name)
+                logger.warning(
+                    f"N+1: {name} lazy-loaded {count} times in {request.method} {request.path} ({endpoint}); "
+                    f"declare selectinload({name}) in LOADING_POLICIES",
+                    extra={'endpoint': endpoint, 'relationship': name, 'lazy_loads': count}
+                )
+        return response
+
+    logger.info(f"N+1 detector enabled ({NPLUSONE_MODE}, threshold {NPLUSONE_THRESHOLD})")
@@ -0,0 +1,173 @@
+"""
+Per-room hot cache for the latest chat messages.
+
+Every client that opens a room asks for the newest page of top-level
+messages. The cache keeps a ring buffer of the latest serialized messages
+per room so that first page can be answered without touching the database.
+Older pages (and thread replies) always fall through to the DB.
+
+The buffers are per process. A write updates this worker's buffer and
+invalidates the room on the other workers through the worker bus
+(services/worker_bus.py), so they re-read it on the next request. With
+several gunicorn workers and no shared bus (no redis:// queue) the cache
+is disabled: other workers' writes would not be seen until the TTL.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from services.worker_bus import worker_bus
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAPACITY = int(os.getenv('MESSAGE_CACHE_SIZE', 50))
+DEFAULT_TTL = int(os.getenv('MESSAGE_CACHE_TTL', 300))
+# Set by gunicorn.conf.py
+WORKER_COUNT = int(os.getenv('GUNICORN_WORKER_COUNT', 1))
+INVALIDATE_TOPIC = 'message_cache_invalidate'
+
+
+class _RoomBuffer:
+    """Ring buffer of serialized messages for a single room (oldest first)"""
+
+    __slots__ = ('items', 'total', 'loaded_at')
+
+    def __init__(self, capacity: int, items: list, total: int):
+        self.items = deque(items, maxlen=capacity)
+        self.total = total
+        self.loaded_at = time.monotonic()
+
+
+class RoomMessageCache:
+    """
+    Ring buffer of the latest N top-level messages per room.
+
+    Buffers are only created from a DB read (``warm``) so the cache never
+    claims to know a room it has not seen. Writes (send/edit/delete) keep
+    warm buffers in sync and invalidate the room on the other workers;
+    buffers older than ``ttl`` seconds are dropped as a backstop.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, ttl: int = DEFAULT_TTL, enabled: bool = True):
+        self.capacity = max(capacity, 1)
+        self.ttl = ttl
+        self.enabled = enabled
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def _notify_workers(self, room_id: int):
+        worker_bus.publish(INVALIDATE_TOPIC, room_id, local=False)
+
+    def _get_buffer(self, room_id: int):
+        buffer = self._rooms.get(room_id)
+        if buffer is None:
+            return None
+        if self.ttl and time.monotonic() - buffer.loaded_at > self.ttl:
+            del self._rooms[room_id]
+            return None
+        return buffer
+
+    def get_page(self, room_id: int, per_page: int):
+        """
+        Return the newest ``per_page`` messages of a room in chronological order
+
+        Returns:
+            tuple: (messages, total) or None when the cache cannot answer
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            buffer = self._get_buffer(room_id)
+            if buffer is None:
+                return None
+            cached = len(buffer.items)
+            # Only serve if the buffer holds the full page, or the whole room
+            if cached < per_page and cached < buffer.total:
+                return None
+            items = list(buffer.items)[-per_page:]
+            return items, buffer.total
+
+    def warm(self, room_id: int, messages: list, total: int):
+        """
+        Seed a room buffer from a DB read
+
+        Args:
+            room_id: Room the messages belong to
+            messages: Serialized top-level messages in chronological order
+            total: Total number of visible top-level messages in the room
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._rooms[room_id] = _RoomBuffer(
+                self.capacity, messages[-self.capacity:], total
+            )
+
+    def push(self, message: dict):
+        """Append a newly sent top-level message to its room buffer"""
+        if message.get('parent_id'):
+            return
+        self._notify_workers(message['room_id'])
+        with self._lock:
+            buffer = self._get_buffer(message['room_id'])
+            if buffer is None:
+                return
+            buffer.items.append(message)
+            buffer.total += 1
+
+    def update(self, message: dict):
+        """Replace an edited message in its room buffer"""
+        self._notify_workers(message['room_id'])
+        with self._lock:
+            buffer = self._get_buffer(message['room_id'])
+            if buffer is None:
+                return
+            for index, item in enumerate(buffer.items):
+                if item['id'] == message['id']:
+                    buffer.items[index] = message
+                    break
+
+    def remove(self, message_id: int, room_id: int, parent_id: int = None):
+        """Drop a deleted message from its room buffer"""
+        if parent_id:
+            return
+        self._notify_workers(room_id)
+        with self._lock:
+            buffer = self._get_buffer(room_id)
+            if buffer is None:
+                return
+            for item in buffer.items:
+                if item['id'] == message_id:
+                    buffer.items.remove(item)
+                    break
+            buffer.total = max(buffer.total - 1, 0)
+
+    def set_replies_count(self, parent_id: int, room_id: int, replies_count: int):
+        """Refresh the cached reply counter of a thread root"""
+        self._notify_workers(room_id)
+        with self._lock:
+            buffer = self._get_buffer(room_id)
+            if buffer is None:
+                return
+            for index, item in enumerate(buffer.items):
+                if item['id'] == parent_id:
+                    buffer.items[index] = {**item, 'replies_count': replies_count}
+                    break
+
+    def invalidate(self, room_id: int = None):
+        """Forget one room, or every room when room_id is None"""
+        with self._lock:
+            if room_id is None:
+                self._rooms.clear()
+            else:
+                self._rooms.pop(room_id, None)
+
+
+room_message_cache = RoomMessageCache(enabled=WORKER_COUNT <= 1 or worker_bus.shared)
+if not room_message_cache.enabled:
+    logger.warning(f"{WORKER_COUNT} workers without a worker bus (redis:// queue): message cache disabled")
+worker_bus.subscribe(INVALIDATE_TOPIC, room_message_cache.invalidate)
+# Invalidations published while the listener was disconnected are lost
+worker_bus.on_resync(room_message_cache.invalidate)
@@ -0,0 +1,104 @@
+"""
+Password hashing off the event loop.
+
+bcrypt is deliberately slow (~250 ms at cost 12) and, called inline, blocks
+every greenlet in an eventlet worker for that long. Hashes and checks are
+run in a bounded pool instead:
+
+- ``thread`` (default): native OS threads. Under eventlet this is
+  ``eventlet.tpool``; without it, a ``ThreadPoolExecutor``. bcrypt releases
+  the GIL while hashing, so this runs in parallel.
+- ``process``: a ``ProcessPoolExecutor``. Use it if another extension holds
+  the GIL.
+- ``inline``: no pool (scripts, shells).
+
+At most ``PASSWORD_HASH_WORKERS`` hashes run at once; further callers wait
+(cooperatively, under eventlet) for a free slot. ``BCRYPT_ROUNDS`` sets the
+cost of new hashes. ``needs_rehash`` tells login to upgrade hashes made at
+another cost.
+"""
+
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import bcrypt
+from utils.native import is_green, run_native
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+HASH_POOL = os.getenv('PASSWORD_HASH_POOL', 'thread').lower()
+HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 4))
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_cost(hashed: str):
+    """Cost factor of a bcrypt hash ('$2b$12$...' -> 12), or None if unreadable"""
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, mode: str = HASH_POOL, workers: int = HASH_WORKERS, rounds: int = BCRYPT_ROUNDS):
+        if mode not in ('thread', 'process', 'inline'):
+            raise ValueError(f"Unknown PASSWORD_HASH_POOL: {mode}")
+        self.mode = mode
+        self.workers = max(workers, 1)
+        self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    if self.mode == 'process':
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers, thread_name_prefix='bcrypt'
+                        )
+        return self._executor
+
+    def _run(self, func, *args):
+        if self.mode == 'inline':
+            return func(*args)
+        with self._slots:
+            if self.mode == 'thread' and is_green():
+                return run_native(func, *args)
+            future = self._get_executor().submit(func, *args)
+            # Under eventlet, wait in a native thread so the hub keeps running
+            return run_native(future.result)
+
+    def hash(self, password: str) -> str:
+        if not password:
+            raise ValueError("Password cannot be empty")
+        return self._run(_hashpw, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def verify(self, password: str, hashed: str) -> bool:
+        if not password or not hashed:
+            return False
+        try:
+            return self._run(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+        except ValueError:
+            # Malformed hash
+            logger.warning("Password verification against an invalid hash")
+            return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True if the hash was made with a different cost than BCRYPT_ROUNDS"""
+        return hash_cost(hashed) != self.rounds
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,206 @@
+"""
+Rate limiting with a shared counter store and a per-process fast path.
+
+Limits are fixed windows counted in a shared store, so every worker sees
+the same totals. Going to the store on every request would put a network
+round-trip on the hot path. Instead, each process leases a small batch of
+tokens per (limit, client) with one ``INCRBY`` and spends them locally
+under a lock, which costs microseconds. It only syncs again when the batch
+runs out, i.e. every ``RATE_LIMIT_SYNC_EVERY`` requests at most. Batches
+shrink for small limits (a 5/minute limit syncs on every request). Unused
+leased tokens expire with their window. A lease can therefore only make
+a limit slightly stricter, never looser. Once the store reports a window as
+exhausted, the process rejects that client locally until the window ends.
+
+Stores:
+    memory://          in-process stand-in (development, single worker)
+    redis://host:6379  shared (needs the ``redis`` package)
+
+If the store is unreachable, requests are allowed and a warning is logged.
+
+The RATE_LIMIT_* settings are read from the environment when the limiter
+is first used, not at import: routes are decorated while app.py is still
+importing them.
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORAGE_URL = 'memory://'
+DEFAULT_SYNC_EVERY = 10
+MAX_LEASES = 100000
+
+# Named limits for expensive endpoints, overridable with RATE_LIMIT_<NAME>
+DEFAULT_LIMITS = {
+    'chat': '20/minute',
+    'upload': '10/minute',
+    'refresh': '30/minute',
+    'refresh_token': '10/minute',
+    'search': '60/minute',
+}
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_LIMIT_PATTERN = re.compile(r'^\s*(\d+)\s*(?:/|per)\s*(second|minute|hour|day)s?\s*$')
+
+
+def parse_limit(value: str):
+    """
+    Parse '20/minute' or '20 per minute'
+
+    Returns:
+        tuple: (count, period_seconds)
+    """
+    match = _LIMIT_PATTERN.match(value or '')
+    if not match:
+        raise ValueError(f"Invalid rate limit: {value!r}")
+    return int(match.group(1)), PERIODS[match.group(2)]
+
+
+def configured_limits(name: str) -> list:
+    """Limits for a named group: RATE_LIMIT_<NAME> (comma separated) or the default"""
+    value = os.getenv(f'RATE_LIMIT_{name.upper()}', DEFAULT_LIMITS[name])
+    return [parse_limit(part) for part in value.split(',') if part.strip()]
+
+
+class MemoryStore:
+    """Process-local stand-in for the shared store"""
+
+    def __init__(self):
+        self._counters = {}  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def incr(self, key: str, amount: int, expiry: int) -> int:
+        now = time.time()
+        with self._lock:
+            value, expires_at = self._counters.get(key, (0, 0))
+            if expires_at <= now:
+                value, expires_at = 0, now + expiry
+                if len(self._counters) > MAX_LEASES:
+                    self._counters = {k: v for k, v in self._counters.items() if v[1] > now}
+            value += amount
+            self._counters[key] = (value, expires_at)
+            return value
+
+
+class RedisStore:
+    """Shared store speaking the Redis protocol"""
+
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def incr(self, key: str, amount: int, expiry: int) -> int:
+        pipe = self.client.pipeline()
+        pipe.incrby(key, amount)
+        pipe.expire(key, expiry)
+        value, _ = pipe.execute()
+        return value
+
+
+def create_store(url: str):
+    if url.startswith('memory://'):
+        return MemoryStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url)
+    raise ValueError(f"Unsupported RATE_LIMIT_STORAGE_URL: {url}")
+
+
+class _Lease:
+    __slots__ = ('window', 'remaining', 'exhausted')
+
+    def __init__(self, window, remaining, exhausted):
+        self.window = window
+        self.remaining = remaining
+        self.exhausted = exhausted
+
+
+class RateLimiter:
+    def __init__(self, store=None, sync_every: int = None, enabled: bool = None):
+        """
+        Args:
+            store: Counter store (default: RATE_LIMIT_STORAGE_URL, created on first use)
+            sync_every: Tokens leased per store round-trip (default: RATE_LIMIT_SYNC_EVERY)
+            enabled: Whether limits apply (default: RATE_LIMIT_ENABLED)
+        """
+        self.store = store
+        self._sync_every = sync_every
+        self._enabled = enabled
+        self._named_limits = {}  # name -> [(count, period)]
+        self._leases = {}  # (scope, key, period) -> _Lease
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.syncs = 0
+
+    @property
+    def enabled(self) -> bool:
+        if self._enabled is None:
+            self._enabled = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+        return self._enabled
+
+    @property
+    def sync_every(self) -> int:
+        if self._sync_every is None:
+            self._sync_every = int(os.getenv('RATE_LIMIT_SYNC_EVERY', DEFAULT_SYNC_EVERY))
+        return max(self._sync_every, 1)
+
+    def limits(self, name: str) -> list:
+        """configured_limits(name), read once"""
+        limits = self._named_limits.get(name)
+        if limits is None:
+            limits = self._named_limits[name] = configured_limits(name)
+        return limits
+
+    def _get_store(self):
+        if self.store is None:
+            self.store = create_store(os.getenv('RATE_LIMIT_STORAGE_URL', DEFAULT_STORAGE_URL))
+        return self.store
+
+    def hit(self, scope: str, key: str, count: int, period: int):
+        """
+        Count one request against a limit
+
+        Returns:
+            tuple: (allowed, retry_after_seconds)
+        """
+        now = time.time()
+        window = int(now // period)
+        retry_after = int((window + 1) * period - now) + 1
+        lease_key = (scope, key, period)
+
+        with self._lock:
+            lease = self._leases.get(lease_key)
+            if lease is not None and lease.window == window:
+                if lease.remaining > 0:
+                    lease.remaining -= 1
+                    self.local_hits += 1
+                    return True, 0
+                if lease.exhausted:
+                    return False, retry_after
+
+        batch = max(1, min(self.sync_every, count // 10))
+        try:
+            total = self._get_store().incr(f'rl:{scope}:{key}:{period}:{window}', batch, period + 1)
+        except Exception as e:
+            logger.warning(f"Rate limit store unavailable, allowing request: {str(e)}")
+            return True, 0
+        granted = min(batch, count - (total - batch))
+
+        with self._lock:
+            self.syncs += 1
+            if len(self._leases) > MAX_LEASES:
+                self._leases = {k: v for k, v in self._leases.items() if v.window * k[2] + k[2] > now}
+            self._leases[lease_key] = _Lease(window, max(granted - 1, 0), granted < batch)
+        if granted <= 0:
+            return False, retry_after
+        return True, 0
+
+    def stats(self) -> dict:
+        return {'leases': len(self._leases), 'local_hits': self.local_hits, 'syncs': self.syncs}
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,170 @@
+"""
+Refresh token lifetime policy, rotation and cleanup.
+
+Access tokens live ``ACCESS_TOKEN_MINUTES`` and refresh tokens
+``REFRESH_TOKEN_DAYS``. Every refresh rotates the refresh token in a single
+statement: one ``UPDATE ... RETURNING`` CTE revokes the presented token and
+inserts its successor in the same family, so two concurrent refreshes can
+never both rotate the same token.
+
+The successor is derived from the presented token with an HMAC under the
+JWT secret instead of being random. When several tabs send the same cookie
+at once, the one that loses the race can recompute the exact token the
+winner got, and within ``REFRESH_GRACE_SECONDS`` it is answered with that
+same token instead of an error. A rotated token presented after the grace
+window is treated as reuse, and its whole family is revoked.
+
+Rotated tokens only need to exist for reuse detection, so rotation also
+shortens their ``expires_at`` to ``REFRESH_REVOKED_RETENTION_HOURS``. The
+cleanup job then only has to delete rows with ``expires_at`` in the past,
+which it does in batches through the ``expires_at`` index.
+"""
+
+import os
+import hmac
+import base64
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select, update, delete, literal, func
+from sqlalchemy.dialects.postgresql import insert
+from extensions import db
+from models.refresh_token import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_MINUTES = int(os.getenv('ACCESS_TOKEN_MINUTES', 15))
+REFRESH_TOKEN_DAYS = int(os.getenv('REFRESH_TOKEN_DAYS', 30))
+REFRESH_GRACE_SECONDS = int(os.getenv('REFRESH_GRACE_SECONDS', 30))
+REVOKED_RETENTION_HOURS = int(os.getenv('REFRESH_REVOKED_RETENTION_HOURS', 24))
+CLEANUP_INTERVAL = int(os.getenv('REFRESH_TOKEN_CLEANUP_INTERVAL', 3600))
+CLEANUP_BATCH_SIZE = int(os.getenv('REFRESH_TOKEN_CLEANUP_BATCH', 5000))
+CLEANUP_MAX_BATCHES = 50
+
+ACCESS_TOKEN_LIFETIME = timedelta(minutes=ACCESS_TOKEN_MINUTES)
+REFRESH_TOKEN_LIFETIME = timedelta(days=REFRESH_TOKEN_DAYS)
+REFRESH_COOKIE_MAX_AGE = int(REFRESH_TOKEN_LIFETIME.total_seconds())
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def successor_token(token: str) -> str:
+    """Refresh token that replaces ``token`` on rotation (deterministic)"""
+    key = current_app.config['JWT_SECRET_KEY'].encode('utf-8')
+    digest = hmac.new(key, token.encode('utf-8'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def _rotate_statement(token_hash: str, new_hash: str, device_info, now: datetime):
+    rotated = (
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_hash,
+            RefreshToken.is_revoked.is_(False),
+            RefreshToken.expires_at > now
+        )
+        .values(
+            is_revoked=True,
+            revoked_at=now,
+            replaced_by_hash=new_hash,
+            expires_at=now + timedelta(hours=REVOKED_RETENTION_HOURS)
+        )
+        .returning(RefreshToken.user_id, RefreshToken.family_id, RefreshToken.device_info)
+        .cte('rotated')
+    )
+    return insert(RefreshToken).from_select(
+        ['user_id', 'token_hash', 'family_id', 'expires_at', 'is_revoked', 'device_info', 'created_at'],
+        select(
+            rotated.c.user_id,
+            literal(new_hash),
+            rotated.c.family_id,
+            literal(now + REFRESH_TOKEN_LIFETIME),
+            literal(False),
+            func.coalesce(literal(device_info, db.String), rotated.c.device_info),
+            literal(now)
+        )
+    ).returning(RefreshToken.user_id)
+
+
+def rotate_refresh_token(token: str, device_info=None):
+    """
+    Rotate a refresh token
+
+    Args:
+        token: Refresh token presented by the client
+        device_info: Device string stored on the new token
+
+    Returns:
+        tuple: (user_id, new_token, rotated). rotated is False when the
+        request was answered from the grace window. None if the token is
+        invalid or expired.
+
+    Raises:
+        ValueError: Token reuse detected (the token family has been revoked)
+    """
+    now = _utcnow()
+    token_hash = RefreshToken.hash_token(token)
+    new_token = successor_token(token)
+    new_hash = RefreshToken.hash_token(new_token)
+
+    user_id = db.session.execute(_rotate_statement(token_hash, new_hash, device_info, now)).scalar()
+    if user_id is not None:
+        db.session.commit()
+        return user_id, new_token, True
+    db.session.rollback()
+
+    previous = db.session.query(
+        RefreshToken.user_id, RefreshToken.family_id, RefreshToken.revoked_at,
+        RefreshToken.replaced_by_hash, RefreshToken.expires_at
+    ).filter(RefreshToken.token_hash == token_hash).first()
+    if previous is None or previous.replaced_by_hash is None or previous.expires_at <= now:
+        # Unknown, expired, or revoked by logout/ban
+        return None
+
+    if previous.revoked_at >= now - timedelta(seconds=REFRESH_GRACE_SECONDS):
+        # Concurrent refresh from another tab: hand out the same successor
+        successor_alive = db.session.query(RefreshToken.id).filter(
+            RefreshToken.token_hash == new_hash,
+            RefreshToken.is_revoked.is_(False),
+            RefreshToken.expires_at > now
+        ).first()
+        db.session.rollback()
+        if previous.replaced_by_hash == new_hash and successor_alive:
+            return previous.user_id, new_token, False
+        return None
+
+    revoked = db.session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == previous.family_id, RefreshToken.is_revoked.is_(False))
+        .values(is_revoked=True, revoked_at=now)
+    ).rowcount
+    db.session.commit()
+    logger.warning(
+        f"Refresh token reuse for user {previous.user_id}: revoked {revoked} token(s) in family"
+    )
+    raise ValueError("Token reuse detected - all tokens revoked")
+
+
+def cleanup_refresh_tokens() -> dict:
+    """Background job: delete expired refresh tokens (including retired rotated ones) in batches"""
+    now = _utcnow()
+    expired = (
+        select(RefreshToken.id)
+        .where(RefreshToken.expires_at < now)
+        .order_by(RefreshToken.expires_at)
+        .limit(CLEANUP_BATCH_SIZE)
+    )
+    deleted = 0
+    for _ in range(CLEANUP_MAX_BATCHES):
+        count = db.session.execute(
+            delete(RefreshToken).where(RefreshToken.id.in_(expired))
+        ).rowcount
+        # Commit per batch to keep locks and WAL bursts small
+        db.session.commit()
+        deleted += count
+        if count < CLEANUP_BATCH_SIZE:
+            break
+    return {'deleted': deleted}
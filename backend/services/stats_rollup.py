@@ -0,0 +1,192 @@
+"""
+Daily rollups for the admin dashboard.
+
+``daily_stats`` holds one row of site-wide counters per UTC day and
+``daily_room_stats`` one row per (day, room) with message activity. The
+rollup job recomputes only "open" days - the last ``STATS_ROLLUP_OPEN_DAYS``
+days, plus any day in the backfill window that has no final row yet - using
+one grouped query per source table. Once a day falls out of the open
+window its last recomputation marks it final and it is never scanned again,
+so dashboard endpoints read O(days) rollup rows instead of raw tables.
+"""
+
+import os
+import logging
+from datetime import datetime, date, time, timedelta, timezone
+from sqlalchemy import func, distinct, case, and_, or_
+from sqlalchemy.dialects.postgresql import insert
+from extensions import db
+from models.user import User
+from models.message import Message
+from models.bot_conversation import BotConversation
+from models.view_history import ViewHistory
+from models.daily_stat import DailyStat
+from models.daily_room_stat import DailyRoomStat
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_INTERVAL = int(os.getenv('STATS_ROLLUP_INTERVAL', 300))
+OPEN_DAYS = max(int(os.getenv('STATS_ROLLUP_OPEN_DAYS', 2)), 1)
+BACKFILL_DAYS = max(int(os.getenv('STATS_ROLLUP_BACKFILL_DAYS', 90)), OPEN_DAYS)
+
+COUNTER_COLUMNS = (
+    'signups', 'messages', 'visible_messages', 'message_rooms', 'message_users',
+    'bot_conversations', 'bot_positive', 'bot_negative', 'bot_neutral',
+    'views', 'unique_viewers',
+)
+
+
+def utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def date_range(start_day: date, end_day: date) -> list:
+    """Every day from start_day to end_day inclusive"""
+    return [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+
+
+def _day_ranges(days: list) -> list:
+    """Collapse sorted days into [start, end) datetime ranges of consecutive days"""
+    ranges = []
+    for day in days:
+        start = datetime.combine(day, time.min)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = start + timedelta(days=1)
+        else:
+            ranges.append([start, start + timedelta(days=1)])
+    return ranges
+
+
+def _in_days(column, ranges):
+    return or_(*[and_(column >= start, column < end) for start, end in ranges])
+
+
+def rollup_days(days) -> int:
+    """
+    Recompute rollup rows for the given UTC days and commit
+
+    Args:
+        days: Iterable of ``date`` objects
+
+    Returns:
+        int: Number of days written
+    """
+    days = sorted(set(days))
+    if not days:
+        return 0
+    ranges = _day_ranges(days)
+    closed_before = utc_today() - timedelta(days=OPEN_DAYS - 1)
+    now = datetime.now(timezone.utc)
+
+    stats = {day: dict.fromkeys(COUNTER_COLUMNS, 0) for day in days}
+
+    user_day = func.date(User.created_at)
+    for day, signups in db.session.query(user_day, func.count(User.id)).filter(
+        _in_days(User.created_at, ranges)
+    ).group_by(user_day):
+        stats[day]['signups'] = signups
+
+    message_day = func.date(Message.created_at)
+    for row in db.session.query(
+        message_day.label('day'),
+        func.count(Message.id).label('messages'),
+        func.sum(case((Message.is_deleted.is_(False), 1), else_=0)).label('visible'),
+        func.count(distinct(Message.room_id)).label('rooms'),
+        func.count(distinct(Message.user_id)).label('users')
+    ).filter(
+        _in_days(Message.created_at, ranges)
+    ).group_by(message_day):
+        stats[row.day].update(
+            messages=row.messages,
+            visible_messages=int(row.visible or 0),
+            message_rooms=row.rooms,
+            message_users=row.users
+        )
+
+    bot_day = func.date(BotConversation.created_at)
+    for row in db.session.query(
+        bot_day.label('day'),
+        func.count(BotConversation.id).label('total'),
+        func.sum(case((BotConversation.is_positive.is_(True), 1), else_=0)).label('positive'),
+        func.sum(case((BotConversation.is_positive.is_(False), 1), else_=0)).label('negative'),
+        func.sum(case((BotConversation.is_positive.is_(None), 1), else_=0)).label('neutral')
+    ).filter(
+        _in_days(BotConversation.created_at, ranges)
+    ).group_by(bot_day):
+        stats[row.day].update(
+            bot_conversations=row.total,
+            bot_positive=int(row.positive or 0),
+            bot_negative=int(row.negative or 0),
+            bot_neutral=int(row.neutral or 0)
+        )
+
+    view_day = func.date(ViewHistory.viewed_at)
+    for row in db.session.query(
+        view_day.label('day'),
+        func.count(ViewHistory.id).label('views'),
+        func.count(distinct(ViewHistory.user_id)).label('viewers')
+    ).filter(
+        _in_days(ViewHistory.viewed_at, ranges)
+    ).group_by(view_day):
+        stats[row.day].update(views=row.views, unique_viewers=row.viewers)
+
+    room_rows = db.session.query(
+        message_day.label('day'),
+        Message.room_id,
+        func.count(Message.id).label('messages'),
+        func.count(distinct(Message.user_id)).label('users'),
+        func.max(Message.created_at).label('last_active')
+    ).filter(
+        _in_days(Message.created_at, ranges)
+    ).group_by(message_day, Message.room_id).all()
+
+    values = [
+        {'day': day, **counters, 'is_final': day < closed_before, 'computed_at': now}
+        for day, counters in stats.items()
+    ]
+    stmt = insert(DailyStat).values(values)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[DailyStat.day],
+        set_={column: stmt.excluded[column] for column in (*COUNTER_COLUMNS, 'is_final', 'computed_at')}
+    ))
+
+    # Room rows are replaced wholesale: a room can drop out of a day entirely
+    DailyRoomStat.query.filter(DailyRoomStat.day.in_(days)).delete(synchronize_session=False)
+    if room_rows:
+        db.session.execute(insert(DailyRoomStat).values([
+            {
+                'day': row.day,
+                'room_id': row.room_id,
+                'messages': row.messages,
+                'users': row.users,
+                'last_active': row.last_active
+            }
+            for row in room_rows
+        ]))
+
+    db.session.commit()
+    return len(days)
+
+
+def refresh_daily_stats() -> dict:
+    """Rollup job: recompute open days and any non-final day in the backfill window"""
+    today = utc_today()
+    window_start = today - timedelta(days=BACKFILL_DAYS - 1)
+    final_days = {
+        day for (day,) in db.session.query(DailyStat.day).filter(
+            DailyStat.day >= window_start,
+            DailyStat.is_final.is_(True)
+        )
+    }
+    pending = [day for day in date_range(window_start, today) if day not in final_days]
+    written = rollup_days(pending)
+    return {'days': written, 'from': pending[0].isoformat() if pending else None}
+
+
+def load_daily_stats(start_day: date, end_day: date) -> dict:
+    """Rollup rows for a day window keyed by day (missing days are absent)"""
+    rows = DailyStat.query.filter(
+        DailyStat.day >= start_day,
+        DailyStat.day <= end_day
+    ).all()
+    return {row.day: row for row in rows}
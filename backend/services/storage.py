@@ -0,0 +1,125 @@
+"""
+Object storage for user assets (images, book PDFs).
+
+One storage client is created per process and reused. For Supabase that
+means a single HTTP client, so uploads share pooled keep-alive connections
+instead of a new client and TLS handshake per request. Backends:
+
+    supabase  Supabase Storage bucket ``STORAGE_BUCKET`` (default)
+    local     files under ``STORAGE_LOCAL_ROOT``, served by the app under
+              ``/uploads`` (development and tests)
+"""
+
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'supabase').lower()
+STORAGE_BUCKET = os.getenv('STORAGE_BUCKET', 'user-assets')
+LOCAL_ROOT = os.getenv(
+    'STORAGE_LOCAL_ROOT',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads')
+)
+LOCAL_PUBLIC_URL = os.getenv('STORAGE_LOCAL_PUBLIC_URL', '/uploads')
+
+
+class StorageError(Exception):
+    pass
+
+
+class SupabaseStorage:
+    def __init__(self, url: str, key: str, bucket: str = STORAGE_BUCKET):
+        from supabase import create_client
+        self.client = create_client(url, key)
+        self.bucket = bucket
+
+    def _bucket(self):
+        return self.client.storage.from_(self.bucket)
+
+    def upload(self, path: str, data: bytes, content_type: str) -> str:
+        """Store bytes at path and return the public URL"""
+        result = self._bucket().upload(path, data, {"content-type": content_type, "upsert": "true"})
+        if hasattr(result, 'error') and result.error:
+            raise StorageError(f"Supabase upload error: {result.error}")
+        return self.public_url(path)
+
+    def public_url(self, path: str) -> str:
+        return self._bucket().get_public_url(path)
+
+    def path_from_url(self, url: str):
+        """Object path of one of our public URLs, or None"""
+        marker = f'{self.bucket}/'
+        if not url or marker not in url:
+            return None
+        return url.split(marker, 1)[1].split('?', 1)[0]
+
+    def remove(self, paths: list):
+        self._bucket().remove(paths)
+
+
+class LocalStorage:
+    def __init__(self, root: str = LOCAL_ROOT, public_url: str = LOCAL_PUBLIC_URL):
+        self.root = os.path.abspath(root)
+        self.base_url = public_url.rstrip('/')
+
+    def _full_path(self, path: str) -> str:
+        full_path = os.path.abspath(os.path.join(self.root, path))
+        if not full_path.startswith(self.root + os.sep):
+            raise StorageError(f"Invalid storage path: {path}")
+        return full_path
+
+    def upload(self, path: str, data: bytes, content_type: str) -> str:
+        full_path = self._full_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        tmp_path = f'{full_path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, full_path)
+        return self.public_url(path)
+
+    def public_url(self, path: str) -> str:
+        return f'{self.base_url}/{path}'
+
+    def path_from_url(self, url: str):
+        prefix = f'{self.base_url}/'
+        if not url or not url.startswith(prefix):
+            return None
+        return url[len(prefix):]
+
+    def remove(self, paths: list):
+        for path in paths:
+            try:
+                os.remove(self._full_path(path))
+            except FileNotFoundError:
+                pass
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """
+    Shared storage client for this process
+
+    Returns:
+        SupabaseStorage | LocalStorage | None: None if Supabase is not configured
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == 'local':
+                    _storage = LocalStorage()
+                elif STORAGE_BACKEND == 'supabase':
+                    key = os.getenv("SUPABASE_SERVICE_ROLE")
+                    if not key:
+                        logger.error("SUPABASE_SERVICE_ROLE not set, storage unavailable")
+                        return None
+                    url = os.getenv("SUPABASE_URL", "https://vcqhwonimqsubvqymgjx.supabase.co")
+                    _storage = SupabaseStorage(url, key)
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _storage
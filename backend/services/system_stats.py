@@ -0,0 +1,170 @@
+"""
+System statistics snapshot for the admin system page.
+
+Row counts come from planner statistics (``pg_class.reltuples``, falling
+back to ``pg_stat_user_tables.n_live_tup`` for never-analyzed tables), so
+they cost nothing regardless of table size. Those counts, the database
+size and the recent activity lists are fetched in a single statement.
+Exact ``COUNT(*)`` is available on demand.
+
+Snapshots are cached per process, refreshed by a background job every
+``SYSTEM_STATS_REFRESH_INTERVAL`` seconds, and served stale-while-revalidate:
+a request that finds the snapshot older than the interval gets it
+immediately and triggers a refresh in the background.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import text
+from extensions import db, socketio
+from services.distinct_metrics import distinct_metrics
+from services.database import read_bind_arguments
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = int(os.getenv('SYSTEM_STATS_REFRESH_INTERVAL', 60))
+# Older than this the snapshot is recomputed inline instead of served stale
+MAX_STALE = int(os.getenv('SYSTEM_STATS_MAX_STALE', 600))
+
+# Response key -> table
+COUNTED_TABLES = {
+    'user_count': 'users',
+    'book_count': 'books',
+    'message_count': 'messages',
+    'comment_count': 'book_comments',
+    'rating_count': 'book_ratings',
+    'reading_history_count': 'reading_history',
+    'bookmark_count': 'bookmarks',
+    'chat_count': 'bot_conversations',
+}
+
+_ESTIMATES_SQL = """
+    SELECT json_object_agg(c.relname, CASE
+        WHEN c.reltuples < 0 THEN COALESCE(s.n_live_tup, 0)
+        ELSE c.reltuples::bigint
+    END)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+    WHERE n.nspname = current_schema()
+      AND c.relkind IN ('r', 'p')
+      AND c.relname IN ({tables})
+"""
+
+_RECENT_SQL = """
+    SELECT COALESCE(json_agg(r ORDER BY r.date DESC), '[]'::json) FROM (
+        (SELECT 'user' AS type, username AS title, created_at AS date
+         FROM users WHERE created_at >= :since ORDER BY created_at DESC LIMIT 3)
+        UNION ALL
+        (SELECT 'book', title, created_at
+         FROM books WHERE created_at >= :since ORDER BY created_at DESC LIMIT 3)
+        UNION ALL
+        (SELECT 'comment', left(content, 50), created_at
+         FROM book_comments WHERE created_at >= :since ORDER BY created_at DESC LIMIT 3)
+    ) r
+"""
+
+
+def _snapshot_sql(exact: bool) -> str:
+    tables = sorted(set(COUNTED_TABLES.values()))
+    if exact:
+        counts = "json_build_object({})".format(", ".join(
+            f"'{table}', (SELECT COUNT(*) FROM {table})" for table in tables
+        ))
+    else:
+        counts = "({})".format(_ESTIMATES_SQL.format(tables=", ".join(f"'{table}'" for table in tables)))
+    return f"""
+        SELECT
+            {counts} AS counts,
+            pg_size_pretty(pg_database_size(current_database())) AS db_size,
+            ({_RECENT_SQL}) AS recent
+    """
+
+
+class SystemStatsCollector:
+    """Per-process cache of the system stats snapshot"""
+
+    def __init__(self, refresh_interval: int = REFRESH_INTERVAL, max_stale: int = MAX_STALE):
+        self.refresh_interval = refresh_interval
+        self.max_stale = max(max_stale, refresh_interval)
+        self._snapshot = None
+        self._taken_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def collect(self, exact: bool = False) -> dict:
+        """Compute a snapshot in one round-trip"""
+        since = datetime.utcnow() - timedelta(hours=24)
+        # text() is not routed by RoutingSession: bind it to the request's
+        # analytics engine explicitly (primary from the background job)
+        row = db.session.execute(
+            text(_snapshot_sql(exact)), {'since': since},
+            bind_arguments=read_bind_arguments(db.engines)
+        ).one()
+        counts = row.counts or {}
+        return {
+            **{key: int(counts.get(table, 0)) for key, table in COUNTED_TABLES.items()},
+            'active_users_last_7_days': distinct_metrics.count(
+                'readers', datetime.utcnow().date() - timedelta(days=6)
+            ),
+            'database_size': row.db_size or 'Unknown',
+            'recent_activity': (row.recent or [])[:8],
+            'counts_estimated': not exact,
+        }
+
+    def refresh(self) -> str:
+        """Recompute the cached snapshot (background job / revalidation)"""
+        try:
+            snapshot = self.collect()
+            with self._lock:
+                self._snapshot = snapshot
+                self._taken_at = time.time()
+            return 'refreshed'
+        finally:
+            self._refreshing = False
+
+    def _revalidate(self, app):
+        with app.app_context():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"System stats refresh failed: {str(e)}")
+            finally:
+                db.session.remove()
+
+    def get(self, exact: bool = False):
+        """
+        Return the system stats snapshot
+
+        Returns:
+            tuple: (stats, meta) where meta has taken_at, age_seconds and stale
+        """
+        if exact:
+            stats = self.collect(exact=True)
+            return stats, {'taken_at': datetime.utcnow().isoformat(), 'age_seconds': 0, 'stale': False}
+
+        with self._lock:
+            snapshot, taken_at = self._snapshot, self._taken_at
+        age = time.time() - taken_at
+
+        if snapshot is None or age > self.max_stale:
+            self.refresh()
+            with self._lock:
+                snapshot, taken_at = self._snapshot, self._taken_at
+            age = 0
+        elif age > self.refresh_interval and not self._refreshing:
+            self._refreshing = True
+            socketio.start_background_task(self._revalidate, current_app._get_current_object())
+
+        return snapshot, {
+            'taken_at': datetime.utcfromtimestamp(taken_at).isoformat(),
+            'age_seconds': round(age, 1),
+            'stale': age > self.refresh_interval,
+        }
+
+
+system_stats = SystemStatsCollector()
@@ -0,0 +1,251 @@
+"""
+Background image upload pipeline.
+
+The request thread only validates the upload: the size, and the image
+header via ``inspect_image``, without decoding any pixels. It then hashes
+the bytes. Images are content-addressed: the asset id is the SHA-256 of
+the source, and every derivative is stored at
+``images/<hash>/<variant>.webp``.
+
+- If an ``image_assets`` row already exists for the hash, the upload is a
+  duplicate. Nothing is encoded or stored, and the request gets the
+  existing URLs (status ``ready``).
+- Otherwise, if the client sent ``Prefer: respond-async`` (it listens for
+  the events below), the request returns immediately (HTTP 202, status
+  ``pending``) with the URLs the asset will have and the rest runs in a
+  background task. Clients that don't ask for it get the same steps
+  inline and a ``ready`` response, so a URL is never handed out before
+  it exists:
+
+1. one decode and a WebP per ``IMAGE_VARIANTS`` width (``encode_derivatives``)
+   in a ``ProcessPoolExecutor`` (CPU-bound, off the GIL and off the event loop),
+2. upload through the shared storage client (``services.storage``),
+3. the ``image_assets`` row, then an optional ``on_complete(variants)``
+   callback inside an app context (e.g. store the new avatar URLs),
+4. (background only) an ``asset_ready`` (or ``asset_failed``) Socket.IO
+   event to the uploader's ``user_<id>`` room on ``/chat``.
+
+At most ``UPLOAD_PIPELINE_CONCURRENCY`` assets are processed at once per
+process.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app, request, has_request_context
+from sqlalchemy.dialects.postgresql import insert
+from extensions import db, socketio
+from models.image_asset import ImageAsset
+from services.storage import get_storage
+from services.metrics import span
+from utils.image_utils import inspect_image, encode_derivatives, parse_variant_widths, ImageValidationError
+from utils.native import run_native
+
+logger = logging.getLogger(__name__)
+
+ENCODE_WORKERS = int(os.getenv('UPLOAD_ENCODE_WORKERS', 2))
+PIPELINE_CONCURRENCY = int(os.getenv('UPLOAD_PIPELINE_CONCURRENCY', 8))
+# name:max_width (0 = original); 'full' is the asset's main URL
+VARIANT_WIDTHS = parse_variant_widths(os.getenv('IMAGE_VARIANTS', 'thumb:160,card:480,full:1600'))
+VARIANT_WIDTHS.setdefault('full', 0)
+
+_ASSET_PATH = re.compile(r'images/([0-9a-f]{64})/')
+
+
+def client_accepts_async() -> bool:
+    """Whether the current request asked for a 202 + asset_ready event (Prefer: respond-async)"""
+    if not has_request_context():
+        return False
+    prefer = request.headers.get('Prefer', '')
+    return 'respond-async' in [p.split('=', 1)[0].strip().lower() for p in prefer.split(',')]
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def read_upload(file, max_bytes: int) -> bytes:
+    """
+    Read and validate an uploaded image (header only)
+
+    Raises:
+        UploadError: Missing, too large, or not a supported image
+    """
+    if file is None or not file.filename:
+        raise UploadError("No file selected")
+    file.seek(0, 2)
+    size = file.tell()
+    file.seek(0)
+    if size > max_bytes:
+        raise UploadError(f"File size must be less than {max_bytes // (1024 * 1024)}MB")
+    with span('upload'):
+        data = file.read()
+        try:
+            inspect_image(data)
+        except ImageValidationError as e:
+            raise UploadError(str(e))
+    return data
+
+
+def asset_path(content_hash: str, variant: str) -> str:
+    return f"images/{content_hash}/{variant}.webp"
+
+
+def is_pipeline_asset(url) -> bool:
+    """
+    Whether a URL points at a content-addressed pipeline image
+
+    These are deduplicated, so the same object can back other posts,
+    avatars and covers: never remove them when one row goes away.
+    """
+    return bool(_ASSET_PATH.search(url or ''))
+
+
+def variants_for_url(url):
+    """
+    Derivative URLs of a pipeline image URL (e.g. a post's image_url), or None
+
+    Derived from the content hash in the URL, exactly as submit() returns
+    them, so this also works while the asset is still pending (no
+    image_assets row yet).
+    """
+    match = _ASSET_PATH.search(url or '')
+    storage = get_storage() if match else None
+    if storage is None:
+        return None
+    content_hash = match.group(1)
+    if url != storage.public_url(asset_path(content_hash, 'full')):
+        # Not one of our stored assets
+        return None
+    return {name: storage.public_url(asset_path(content_hash, name)) for name in VARIANT_WIDTHS}
+
+
+class UploadPipeline:
+    def __init__(self, encode_workers: int = ENCODE_WORKERS, concurrency: int = PIPELINE_CONCURRENCY):
+        self.encode_workers = max(encode_workers, 1)
+        self._slots = threading.BoundedSemaphore(max(concurrency, 1))
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # spawn: workers start clean instead of inheriting the monkey-patched server
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.encode_workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+        return self._executor
+
+    def _encode(self, data: bytes) -> dict:
+        future = self._get_executor().submit(encode_derivatives, data, VARIANT_WIDTHS)
+        # Wait in a native thread so the hub keeps serving other greenlets
+        return run_native(future.result)
+
+    def submit(self, user_id, data: bytes, on_complete=None, background=None) -> dict:
+        """
+        Store an image and its derivatives
+
+        Args:
+            user_id: Uploader (receives the completion event)
+            data: Validated image bytes (see read_upload)
+            on_complete: Optional callable(variants) run in an app context once stored
+            background: Process in a background task and return 'pending';
+                defaults to client_accepts_async()
+
+        Returns:
+            dict: asset_id (content hash), status ('ready' or 'pending'),
+            url (full size) and variants ({name: url})
+
+        Raises:
+            UploadError: Storage unavailable, or inline processing failed
+        """
+        storage = get_storage()
+        if storage is None:
+            raise UploadError("Storage service not available", 503)
+        with span('upload'):
+            content_hash = hashlib.sha256(data).hexdigest()
+            existing = db.session.get(ImageAsset, content_hash)
+        if existing is not None:
+            logger.info(f"Duplicate image {content_hash[:12]}, reusing stored derivatives")
+            if on_complete is not None:
+                on_complete(existing.variants)
+            return {'asset_id': content_hash, 'status': 'ready', 'url': existing.variants['full'], 'variants': existing.variants}
+
+        if background is None:
+            background = client_accepts_async()
+        if not background:
+            with self._slots:
+                try:
+                    variants = self._store(content_hash, data, on_complete)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Image {content_hash[:12]} failed: {str(e)}")
+                    raise UploadError("Failed to process image", 500)
+            return {'asset_id': content_hash, 'status': 'ready', 'url': variants['full'], 'variants': variants}
+
+        variants = {name: storage.public_url(asset_path(content_hash, name)) for name in VARIANT_WIDTHS}
+        socketio.start_background_task(
+            self._process, current_app._get_current_object(),
+            content_hash, user_id, data, on_complete
+        )
+        return {'asset_id': content_hash, 'status': 'pending', 'url': variants['full'], 'variants': variants}
+
+    def _store(self, content_hash, data, on_complete) -> dict:
+        """Encode, upload, record the asset and run on_complete; returns the variant URLs"""
+        storage = get_storage()
+        with span('image_encode'):
+            encoded = self._encode(data)
+        with span('image_store'):
+            variants = {
+                name: storage.upload(asset_path(content_hash, name), content, 'image/webp')
+                for name, (content, _, _) in encoded.items()
+            }
+        _, width, height = encoded['full']
+        stored_bytes = sum(len(content) for content, _, _ in encoded.values())
+        db.session.execute(insert(ImageAsset).values(
+            content_hash=content_hash,
+            variants=variants,
+            width=width,
+            height=height,
+            source_bytes=len(data),
+            stored_bytes=stored_bytes
+        ).on_conflict_do_nothing(index_elements=[ImageAsset.content_hash]))
+        db.session.commit()
+        if on_complete is not None:
+            on_complete(variants)
+        logger.info(
+            f"Image {content_hash[:12]} stored: {len(variants)} variants, "
+            f"{len(data)} -> {stored_bytes} bytes"
+        )
+        return variants
+
+    def _process(self, app, content_hash, user_id, data, on_complete):
+        with self._slots, app.app_context():
+            try:
+                variants = self._store(content_hash, data, on_complete)
+                socketio.emit('asset_ready', {
+                    'asset_id': content_hash,
+                    'url': variants['full'],
+                    'variants': variants
+                }, namespace='/chat', room=f'user_{user_id}')
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Image {content_hash[:12]} failed: {str(e)}")
+                socketio.emit('asset_failed', {
+                    'asset_id': content_hash,
+                    'error': 'Failed to process image'
+                }, namespace='/chat', room=f'user_{user_id}')
+            finally:
+                db.session.remove()
+
+
+upload_pipeline = UploadPipeline()
@@ -0,0 +1,162 @@
+"""
+Monthly partitions and retention for ``view_history``.
+
+``view_history`` is range-partitioned by ``viewed_at``, one partition per
+UTC month (``view_history_p2026_10``), plus ``view_history_default`` for
+rows outside them. Queries with a ``viewed_at`` bound (get_book's 24h
+dedupe, today's history, the activity sketch backfill) only touch the
+partitions in range.
+
+The maintenance job (exclusive, VIEW_HISTORY_MAINTENANCE_INTERVAL) does
+two things:
+
+1. Keeps partitions ready from the current month to
+   VIEW_HISTORY_PARTITIONS_AHEAD months ahead. Rows that already landed in
+   the default partition for a new month are moved into it.
+2. Compacts partitions older than VIEW_HISTORY_RETENTION_MONTHS. Their
+   rows are rolled up into ``view_history_daily`` (views and distinct
+   viewers per book per day), then the partition is dropped. The
+   book_popularity all-time view count includes these aggregates. Per-user
+   history, dedupe and distinct viewers cover the retained months only.
+
+Retention is kept above the daily stats and activity sketch backfill
+windows (90 days), so rollups never lose their source rows.
+"""
+
+import os
+import re
+import logging
+from datetime import date, datetime, timezone
+from sqlalchemy import text
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL = int(os.getenv('VIEW_HISTORY_MAINTENANCE_INTERVAL', 3600))
+PARTITIONS_AHEAD = max(int(os.getenv('VIEW_HISTORY_PARTITIONS_AHEAD', 3)), 1)
+RETENTION_MONTHS = max(int(os.getenv('VIEW_HISTORY_RETENTION_MONTHS', 12)), 4)
+
+PARENT = 'view_history'
+DEFAULT_PARTITION = 'view_history_default'
+_PARTITION_NAME = re.compile(r'^view_history_p(\d{4})_(\d{2})$')
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'view_history_p{month.year:04d}_{month.month:02d}'
+
+
+def existing_partitions() -> dict:
+    """{month: partition name} for the monthly partitions of view_history"""
+    rows = db.session.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:parent AS regclass)
+    """), {'parent': PARENT}).scalars()
+    partitions = {}
+    for name in rows:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def create_partition(month: date) -> int:
+    """
+    Create the partition for a month, moving matching rows out of the default partition
+
+    Returns:
+        int: Rows moved from the default partition
+    """
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    bounds = {'start': start, 'end': end}
+    stray = db.session.execute(text(
+        f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE viewed_at >= :start AND viewed_at < :end"
+    ), bounds).scalar()
+
+    if not stray:
+        db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT} FOR VALUES FROM ('{start}') TO ('{end}')"
+        ))
+        return 0
+
+    # A new range cannot overlap rows in the default partition: detach it,
+    # create the partition, move the rows over and attach it again
+    db.session.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {DEFAULT_PARTITION}"))
+    db.session.execute(text(
+        f"CREATE TABLE {name} PARTITION OF {PARENT} FOR VALUES FROM ('{start}') TO ('{end}')"
+    ))
+    db.session.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION}
+            WHERE viewed_at >= :start AND viewed_at < :end
+            RETURNING id, user_id, book_id, viewed_at
+        )
+        INSERT INTO {PARENT} (id, user_id, book_id, viewed_at)
+        SELECT id, user_id, book_id, viewed_at FROM moved
+    """), bounds)
+    db.session.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    return stray
+
+
+def compact_partition(name: str) -> int:
+    """
+    Roll a partition up into view_history_daily and drop it
+
+    Returns:
+        int: Raw rows compacted
+    """
+    rows = db.session.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+    db.session.execute(text(f"""
+        INSERT INTO view_history_daily (day, book_id, views, viewers)
+        SELECT viewed_at::date, book_id, count(*), count(DISTINCT user_id)
+        FROM {name}
+        GROUP BY viewed_at::date, book_id
+        ON CONFLICT (day, book_id) DO UPDATE
+        SET views = view_history_daily.views + EXCLUDED.views,
+            viewers = GREATEST(view_history_daily.viewers, EXCLUDED.viewers)
+    """))
+    db.session.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+    db.session.execute(text(f"DROP TABLE {name}"))
+    return rows
+
+
+def maintain_view_history() -> dict:
+    """Maintenance job: create upcoming partitions, compact expired ones"""
+    current = month_start(datetime.now(timezone.utc).date())
+    partitions = existing_partitions()
+
+    created, moved = [], 0
+    for offset in range(PARTITIONS_AHEAD + 1):
+        month = add_months(current, offset)
+        if month not in partitions:
+            moved += create_partition(month)
+            db.session.commit()
+            created.append(partition_name(month))
+
+    cutoff = add_months(current, -RETENTION_MONTHS)
+    compacted, compacted_rows = [], 0
+    for month, name in sorted(partitions.items()):
+        if month >= cutoff:
+            break
+        # One transaction per partition: the rollup and the drop commit together
+        compacted_rows += compact_partition(name)
+        db.session.commit()
+        compacted.append(name)
+
+    if created or compacted:
+        logger.info(
+            f"view_history partitions: created {created or 'none'} ({moved} rows moved from default), "
+            f"compacted {compacted or 'none'} ({compacted_rows} rows into view_history_daily)"
+        )
+    return {'created': len(created), 'moved': moved, 'compacted': len(compacted), 'compacted_rows': compacted_rows}
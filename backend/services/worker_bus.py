@@ -0,0 +1,134 @@
+"""
+Cross-worker notifications for per-process state.
+
+Socket.IO emits reach clients on every worker through
+SOCKETIO_MESSAGE_QUEUE, but some state only lives in one worker's memory:
+the compact-protocol sessions (which connections sit in which room and
+which users they already know) and the room message cache. ``publish``
+runs the handlers subscribed to a topic on every worker:
+
+- in this process first, synchronously (the publishing request sees the
+  effect before it returns),
+- then on the other workers, over Redis pub/sub on WORKER_BUS_URL
+  (default: SOCKETIO_MESSAGE_QUEUE when it is a redis:// URL). Each
+  worker's listener runs as a SocketIO background task and skips its own
+  messages.
+
+Without a Redis URL the bus is process-local, which is correct for a
+single worker. Payloads are JSON. After the listener (re)subscribes,
+``on_resync`` callbacks run, since notifications published while it was
+disconnected are lost.
+"""
+
+import os
+import json
+import uuid
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_URL = os.getenv('SOCKETIO_MESSAGE_QUEUE') or ''
+BUS_URL = os.getenv('WORKER_BUS_URL') or (_QUEUE_URL if _QUEUE_URL.startswith(('redis://', 'rediss://', 'unix://')) else '')
+BUS_CHANNEL = os.getenv('WORKER_BUS_CHANNEL', 'book-worker-bus')
+RECONNECT_DELAY = 1.0
+
+
+class WorkerBus:
+    def __init__(self, url: str = BUS_URL, channel: str = BUS_CHANNEL):
+        self.url = url
+        self.channel = channel
+        self.worker_id = uuid.uuid4().hex
+        self._handlers = {}  # topic -> [handler(data)]
+        self._resync = []
+        self._client = None
+        self._socketio = None
+        self._lock = threading.Lock()
+        self.published = 0
+        self.received = 0
+
+    @property
+    def shared(self) -> bool:
+        """Whether notifications reach other workers"""
+        return bool(self.url)
+
+    def subscribe(self, topic: str, handler):
+        """Run handler(data) on every worker for each publish(topic, data)"""
+        with self._lock:
+            self._handlers.setdefault(topic, []).append(handler)
+
+    def on_resync(self, callback):
+        """Run callback() after the listener (re)subscribes: notifications may have been missed"""
+        with self._lock:
+            self._resync.append(callback)
+
+    def publish(self, topic: str, data=None, local: bool = True):
+        """
+        Run the topic's handlers on every worker
+
+        Args:
+            topic: Topic name
+            data: JSON-serializable payload
+            local: Also run them in this process (False: other workers only)
+        """
+        if local:
+            self._dispatch(topic, data)
+        if not self.url:
+            return
+        try:
+            message = json.dumps({'w': self.worker_id, 't': topic, 'd': data})
+            self._get_client().publish(self.channel, message)
+            self.published += 1
+        except Exception as e:
+            logger.warning(f"Worker bus publish failed ({topic}): {str(e)}")
+
+    def start(self, socketio_instance):
+        """Start the listener as a SocketIO background task (once, only with a Redis URL)"""
+        with self._lock:
+            if self._socketio is not None or not self.url:
+                return
+            self._socketio = socketio_instance
+        socketio_instance.start_background_task(self._listen)
+        logger.info(f"Worker bus listening on {self.channel}")
+
+    def _get_client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url, socket_connect_timeout=0.5)
+        return self._client
+
+    def _dispatch(self, topic, data):
+        for handler in self._handlers.get(topic, ()):
+            try:
+                handler(data)
+            except Exception as e:
+                logger.error(f"Worker bus handler for {topic} failed: {str(e)}")
+
+    def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for callback in self._resync:
+                    callback()
+                for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    payload = json.loads(message['data'])
+                    if payload.get('w') == self.worker_id:
+                        continue
+                    self.received += 1
+                    self._dispatch(payload['t'], payload.get('d'))
+            except Exception as e:
+                logger.warning(f"Worker bus listener error, reconnecting: {str(e)}")
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            self._socketio.sleep(RECONNECT_DELAY)
+
+
+worker_bus = WorkerBus()
@@ -1,15 +1,19 @@
 #!/bin/bash
-# Start script for Render deployment
+# Start script for Render deployment (render.yaml startCommand)
+# Stop on the first failure: never serve against a schema that did not migrate
+set -e
 
 # Wait for database to be ready
 echo "Waiting for database..."
 sleep 2
 
-# Run database migrations if needed
-# Uncomment the next line if you want to run migrations on startup
-# python -m flask db upgrade
+# Apply database migrations (the app no longer creates tables on boot).
+# Background jobs and the chatbot preload stay off in this one-shot process.
+BACKGROUND_JOBS_ENABLED=false CHATBOT_PRELOAD=false \
+    python -m flask --app app:create_app db upgrade --directory ../migrations
 
-# Start the application
+# Start the application (gunicorn.conf.py: eventlet workers, recycling, reloads)
+# Development: python app.py
 echo "Starting application..."
-python app.py
+exec gunicorn -c gunicorn.conf.py wsgi:app
 
@@ -0,0 +1,14 @@
+import os
+import sys
+import pkgutil
+import importlib
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# String relationships (User.favorites -> 'Favorite', ...) need every model mapped
+import models  # noqa: E402
+
+for module in pkgutil.iter_modules(models.__path__):
+    importlib.import_module(f'models.{module.name}')
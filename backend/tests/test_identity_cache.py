@@ -0,0 +1,14 @@
+"""Startup check of the access token lifetime (services/identity_cache.py)"""
+
+import pytest
+from datetime import timedelta
+from services.identity_cache import validate_token_lifetime
+
+
+def test_lifetime_within_window():
+    validate_token_lifetime(timedelta(minutes=15), window=3600)
+
+
+def test_lifetime_reaching_window_rejected():
+    with pytest.raises(ValueError, match='IDENTITY_VERSION_WINDOW'):
+        validate_token_lifetime(timedelta(minutes=60), window=3600)
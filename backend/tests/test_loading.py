@@ -0,0 +1,53 @@
+"""N+1 detector and loading policies (services/loading.py)"""
+
+import pytest
+from flask import Flask
+from extensions import db
+from models.user import User
+from models.post import Post
+from services import loading
+
+
+@pytest.fixture(scope='module')
+def app():
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(loading, 'NPLUSONE_MODE', 'raise')
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+        db.init_app(app)
+        loading.init_nplusone_detector(app, db.session)
+
+        with app.app_context():
+            db.metadata.create_all(db.engine, tables=[User.__table__, Post.__table__])
+            # One author per post: every post.user is a separate lazy load
+            users = [
+                User(username=f'reader{i}', email=f'reader{i}@example.com', password_hash='x')
+                for i in range(loading.NPLUSONE_THRESHOLD + 1)
+            ]
+            db.session.add_all(users)
+            db.session.flush()
+            db.session.add_all([Post(user_id=user.id, content=f'post {user.id}') for user in users])
+            db.session.commit()
+        yield app
+
+
+def _serialize_feed(app, *options):
+    with app.test_request_context('/api/posts'):
+        posts = Post.query.options(*options).order_by(Post.id).all()
+        return [post.to_dict() for post in posts]
+
+
+def test_detector_raises_on_lazy_loaded_feed(app):
+    with pytest.raises(loading.NPlusOneError, match='Post.user'):
+        _serialize_feed(app)
+
+
+def test_detector_silent_with_policy(app):
+    feed = _serialize_feed(app, *loading.loading_policy('post_feed'))
+    assert len(feed) == loading.NPLUSONE_THRESHOLD + 1
+    assert all(post['user']['username'] for post in feed)
+
+
+def test_unknown_policy_raises():
+    with pytest.raises(KeyError, match='post.get_posts'):
+        loading.loading_policy('post.get_posts')
@@ -0,0 +1,65 @@
+"""Rate limit decorator and limiter settings (middleware/rate_limiting.py, services/rate_limiter.py)"""
+
+import pytest
+from flask import Flask
+from middleware import rate_limiting
+from middleware.auth_middleware import get_ip_identifier, get_refresh_token_identifier
+from services.rate_limiter import RateLimiter, MemoryStore
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    # A fresh limiter: settings are read on its first use
+    limiter = RateLimiter(MemoryStore())
+    monkeypatch.setattr(rate_limiting, 'rate_limiter', limiter)
+    return limiter
+
+
+def _route(**limit):
+    # Decorated before the test sets RATE_LIMIT_*, like routes imported by app.py
+    app = Flask(__name__)
+
+    @app.route('/limited')
+    @rate_limiting.rate_limit(key_func=lambda: 'client', **limit)
+    def limited():
+        return 'ok'
+
+    return app.test_client()
+
+
+def test_named_limit_read_on_first_request(limiter, monkeypatch):
+    client = _route(name='search')
+    monkeypatch.setenv('RATE_LIMIT_SEARCH', '2/minute')
+
+    statuses = [client.get('/limited').status_code for _ in range(3)]
+
+    assert statuses == [200, 200, 429]
+
+
+def test_disabled_after_decoration(limiter, monkeypatch):
+    client = _route(requests_per_minute=1)
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'false')
+
+    statuses = [client.get('/limited').status_code for _ in range(3)]
+
+    assert statuses == [200, 200, 200]
+
+
+def test_refresh_keyed_by_ip_not_by_presented_token(limiter, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_REFRESH', '3/minute')
+    app = Flask(__name__)
+
+    @app.route('/refresh', methods=['POST'])
+    @rate_limiting.rate_limit(name='refresh', key_func=get_ip_identifier)
+    @rate_limiting.rate_limit(name='refresh_token', key_func=get_refresh_token_identifier)
+    def refresh():
+        return 'ok'
+
+    client = app.test_client()
+    # A fresh random token per request does not buy a fresh budget
+    statuses = [
+        client.post('/refresh', json={'refresh_token': f'guess-{i}'}).status_code
+        for i in range(4)
+    ]
+
+    assert statuses == [200, 200, 200, 429]
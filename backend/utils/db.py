@@ -1,8 +1,16 @@
 from extensions import db
+from sqlalchemy import event
 from sqlalchemy.exc import SQLAlchemyError
+import os
+import time
 import logging
 
 logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('sql.slow')
+
+# Log statements slower than this (ms); 0 disables
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 0))
+SLOW_QUERY_MAX_CHARS = 2000
 
 def execute_query(query, params=None, fetch=False):
     """Execute SQL query using SQLAlchemy"""
@@ -47,4 +55,40 @@ def fetch_one(query, params=None):
 
 def fetch_all(query, params=None):
     """Fetch all rows using SQLAlchemy"""
-    return execute_query(query, params, fetch=True)
\ No newline at end of file
+    return execute_query(query, params, fetch=True)
+
+def log_slow_queries(engine, threshold_ms: float = SLOW_QUERY_MS):
+    """
+    Log statements that take at least threshold_ms to the 'sql.slow' logger
+
+    Replaces SQLALCHEMY_ECHO: only slow statements are logged, with their
+    duration and row count, parameters omitted.
+
+    Returns:
+        bool: True if the listener was installed
+    """
+    if threshold_ms <= 0:
+        return False
+    threshold = threshold_ms / 1000
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _log_if_slow(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        if elapsed >= threshold:
+            slow_query_logger.warning(
+                f"Slow query ({elapsed * 1000:.1f}ms): {statement[:SLOW_QUERY_MAX_CHARS]}",
+                extra={'duration_ms': round(elapsed * 1000, 1), 'rows': cursor.rowcount, 'executemany': executemany}
+            )
+
+    @event.listens_for(engine, 'handle_error')
+    def _discard_timer(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('query_start'):
+            conn.info['query_start'].pop()
+
+    logger.info(f"Slow query logging enabled (>= {threshold_ms}ms)")
+    return True
@@ -0,0 +1,32 @@
+"""
+Sentence embedding models shared by the chatbot
+
+Loading the weights is the expensive part of starting the chatbot, and they
+are read-only afterwards. gunicorn.conf.py calls load_embedding_model() in
+the master so forked workers share the pages copy-on-write; everything that
+holds a connection or a lock (chroma client, Postgres, the app modules) is
+still created per worker.
+
+This module is imported in the gunicorn master before eventlet patches the
+workers, so it must stay free of app imports, locks and open resources.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+
+# model name -> SentenceTransformer (a duplicate load under a race is harmless)
+_models = {}
+
+
+def load_embedding_model(model_name: str = DEFAULT_EMBEDDING_MODEL):
+    """The SentenceTransformer for model_name, loaded once per process (or inherited from the master)"""
+    model = _models.get(model_name)
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        logger.info(f"Loading embedding model: {model_name}")
+        model = SentenceTransformer(model_name)
+        _models[model_name] = model
+    return model
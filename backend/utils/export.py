@@ -0,0 +1,76 @@
+"""
+Streaming encoders for tabular exports.
+
+Both encoders consume an iterator of row tuples lazily and yield text
+chunks of ``batch_size`` rows, so a response built from them holds at most
+one batch in memory no matter how many rows the source produces.
+"""
+
+import io
+import csv
+import json
+from datetime import date, datetime
+from typing import Iterable, Iterator, Sequence
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_ndjson(columns: Sequence[str], rows: Iterable, batch_size: int = 500) -> Iterator[str]:
+    """
+    Encode rows as newline-delimited JSON objects
+
+    Args:
+        columns: Field names, in row order
+        rows: Iterable of tuples
+        batch_size: Rows per yielded chunk
+
+    Returns:
+        Iterator[str]: Text chunks
+    """
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(
+            {column: _plain(value) for column, value in zip(columns, row)},
+            ensure_ascii=False
+        ))
+        if len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def iter_csv(columns: Sequence[str], rows: Iterable, batch_size: int = 500) -> Iterator[str]:
+    """
+    Encode rows as CSV with a header line
+
+    Args:
+        columns: Header names, in row order
+        rows: Iterable of tuples
+        batch_size: Rows per yielded chunk
+
+    Returns:
+        Iterator[str]: Text chunks
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
@@ -1,14 +1,137 @@
 """
 Image utility functions for converting images to WebP format
+
+Pillow is imported inside the functions that decode images, so importing
+this module (and the upload routes) stays cheap at startup.
 """
 
 import io
+import os
 import logging
-from PIL import Image
 from werkzeug.datastructures import FileStorage
 
 logger = logging.getLogger(__name__)
 
+# 6 is the slowest/smallest WebP setting; 4 is the encoder default
+WEBP_METHOD = int(os.getenv('WEBP_METHOD', 4))
+# Reject decompression bombs before decoding any pixel data
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 40_000_000))
+ALLOWED_IMAGE_FORMATS = {'PNG', 'JPEG', 'GIF', 'WEBP'}
+
+
+class ImageValidationError(ValueError):
+    pass
+
+
+def inspect_image(data: bytes, max_pixels: int = MAX_IMAGE_PIXELS) -> dict:
+    """
+    Validate an uploaded image from its header only (no pixel decoding)
+
+    Args:
+        data: Raw file bytes
+        max_pixels: Largest accepted width * height
+
+    Returns:
+        dict: format, width, height
+
+    Raises:
+        ImageValidationError: Not a supported image, or too large
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            image_format, (width, height) = img.format, img.size
+    except Exception:
+        raise ImageValidationError("File is not a valid image")
+    if image_format not in ALLOWED_IMAGE_FORMATS:
+        raise ImageValidationError("Only image files (PNG, JPG, JPEG, GIF, WebP) are allowed")
+    if width * height > max_pixels:
+        raise ImageValidationError(f"Image is too large ({width}x{height})")
+    return {'format': image_format, 'width': width, 'height': height}
+
+
+def _to_rgb(img):
+    """Flatten RGBA/palette images onto white, convert anything else to RGB"""
+    from PIL import Image
+
+    if img.mode in ('RGBA', 'LA', 'P'):
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+        rgb_img.paste(img, mask=img.split()[-1])
+        return rgb_img
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def parse_variant_widths(value: str) -> dict:
+    """
+    Parse a derivative spec like 'thumb:160,card:480,full:1600'
+
+    Returns:
+        dict: {name: max_width}, 0 meaning the original width
+    """
+    widths = {}
+    for part in value.split(','):
+        if not part.strip():
+            continue
+        name, _, width = part.partition(':')
+        widths[name.strip()] = int(width or 0)
+    return widths
+
+
+def encode_derivatives(data: bytes, widths: dict, quality: int = 80, method: int = WEBP_METHOD) -> dict:
+    """
+    Decode an image once and encode a WebP per target width (runs in the upload process pool)
+
+    JPEG sources are decoded straight at the smallest DCT scale (1/2, 1/4,
+    1/8) that still covers the largest target (``Image.draft``). Each
+    variant is then produced with ``reducing_gap`` so large reductions use a
+    fast integer ``reduce()`` before the final resample. Images are never
+    upscaled.
+
+    Args:
+        data: Raw image bytes
+        widths: {name: max_width}, 0 meaning the original width
+        quality: WebP quality (1-100)
+        method: WebP effort (0-6)
+
+    Returns:
+        dict: {name: (webp_bytes, width, height)}
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as source:
+        original_width, original_height = source.size
+        largest = min(max(width or original_width for width in widths.values()), original_width)
+        if source.format == 'JPEG' and largest < original_width:
+            source.draft('RGB', (largest, max(1, original_height * largest // original_width)))
+        img = _to_rgb(source)
+        img.load()
+
+        results = {}
+        for name, width in widths.items():
+            target = min(width or original_width, img.width)
+            if target < img.width:
+                height = max(1, round(img.height * target / img.width))
+                variant = img.resize((target, height), Image.LANCZOS, reducing_gap=3.0)
+            else:
+                variant = img
+            buffer = io.BytesIO()
+            variant.save(buffer, 'WEBP', quality=quality, method=method)
+            results[name] = (buffer.getvalue(), variant.width, variant.height)
+    return results
+
+
+def pick_variant(variants, name: str, fallback=None):
+    """URL of a stored derivative, falling back to the original URL"""
+    if variants and variants.get(name):
+        return variants[name]
+    return fallback
+
+
 def convert_image_to_webp(file: FileStorage, quality: int = 80) -> tuple:
     """
     Convert uploaded image to WebP format
@@ -20,6 +143,8 @@ def convert_image_to_webp(file: FileStorage, quality: int = 80) -> tuple:
     Returns:
         tuple: (webp_bytes, filename_with_webp_ext, success: bool)
     """
+    from PIL import Image
+
     try:
         # Read file content
         file.seek(0)
@@ -33,19 +158,11 @@ def convert_image_to_webp(file: FileStorage, quality: int = 80) -> tuple:
             filename_without_ext = original_filename
         
         # Convert RGBA/PNG to RGB
-        if img.mode in ('RGBA', 'LA', 'P'):
-            rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'RGBA':
-                rgb_img.paste(img, mask=img.split()[-1])
-            else:
-                rgb_img.paste(img)
-            img = rgb_img
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
+        img = _to_rgb(img)
         
         # Save as WebP to bytes
         webp_buffer = io.BytesIO()
-        img.save(webp_buffer, 'WEBP', quality=quality, method=6)
+        img.save(webp_buffer, 'WEBP', quality=quality, method=WEBP_METHOD)
         webp_buffer.seek(0)
         
         # Generate new filename
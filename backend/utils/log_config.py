@@ -0,0 +1,172 @@
+"""
+Application logging: structured output written off the request thread.
+
+Loggers only put records on an in-memory queue (``QueueHandler``); one
+``QueueListener`` thread formats them and does the I/O. Under eventlet the
+listener is a native OS thread, so a slow stderr or log file never blocks the
+hub. Configuration comes from the environment:
+
+    LOG_LEVEL          root level (default INFO)
+    LOG_FORMAT         json (default) or text
+    LOG_LEVELS         per-logger levels, e.g. "sqlalchemy.engine=WARNING,routes.message=DEBUG"
+    LOG_SAMPLE_RATES   fraction of DEBUG records kept per logger, e.g. "routes.message=0.01"
+    LOG_FILE           optional file written next to stderr
+
+A single record can also carry its own rate:
+``logger.debug(..., extra={'sample_rate': 0.01})``.
+"""
+
+import os
+import sys
+import atexit
+import json
+import queue
+import random
+import logging
+import logging.handlers
+import threading
+from datetime import datetime, timezone
+
+from utils.native import original
+
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'sample_rate'}
+
+_listener = None
+
+
+def parse_logger_map(value: str, convert) -> dict:
+    """
+    Parse 'name=value,name=value'
+
+    Returns:
+        dict: {logger name: convert(value)}, '' / 'root' meaning the root logger
+    """
+    result = {}
+    for part in (value or '').split(','):
+        name, sep, raw = part.partition('=')
+        if not sep:
+            continue
+        name = name.strip()
+        result['' if name == 'root' else name] = convert(raw.strip())
+    return result
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, any `extra` fields, exc"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a random fraction of DEBUG records (per logger prefix or per record)"""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+        self._cache = {}
+
+    def _rate_for(self, name):
+        rate = self._cache.get(name)
+        if rate is None:
+            rate, prefix = 1.0, name
+            while True:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                if not prefix:
+                    break
+                prefix = prefix.rpartition('.')[0]
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', None)
+        if rate is None:
+            if record.levelno > logging.DEBUG:
+                return True
+            rate = self._rate_for(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Only resolve the message here; formatting happens on the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    thread_module = threading
+
+    def start(self):
+        self._thread = self.thread_module.Thread(target=self._monitor, name='log-listener', daemon=True)
+        self._thread.start()
+
+
+def _native_modules():
+    """(queue, threading) that are not green under eventlet"""
+    return original('queue'), original('threading')
+
+
+def configure_logging():
+    """Route all logging through a queue to a background listener (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    if os.getenv('LOG_FORMAT', 'json').lower() == 'text':
+        formatter = logging.Formatter(TEXT_FORMAT)
+    else:
+        formatter = JsonFormatter()
+
+    handlers = [logging.StreamHandler(sys.stderr)]
+    log_file = os.getenv('LOG_FILE')
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_module, thread_module = _native_modules()
+    log_queue = queue_module.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(parse_logger_map(os.getenv('LOG_SAMPLE_RATES'), float)))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    for name, level in parse_logger_map(os.getenv('LOG_LEVELS'), str.upper).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = _QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.thread_module = thread_module
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
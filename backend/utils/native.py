@@ -0,0 +1,31 @@
+"""
+Blocking work inside the eventlet server.
+
+In a monkey-patched worker, a blocking call (CPU-bound work, waiting on a
+future or a pool) stalls every greenlet in the process. ``run_native`` runs
+it in a native OS thread (``eventlet.tpool``) so the hub keeps serving
+requests and Socket.IO heartbeats. Without monkey patching (scripts, shells,
+tests) it simply calls the function.
+"""
+
+import importlib
+from eventlet import patcher, tpool
+
+
+def is_green() -> bool:
+    """Whether threading is monkey-patched (running inside the eventlet server)"""
+    return patcher.is_monkey_patched('thread')
+
+
+def run_native(fn, *args, **kwargs):
+    """fn(*args, **kwargs), in a native thread when running under eventlet"""
+    if is_green():
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def original(module_name: str):
+    """The unpatched module (e.g. 'threading', 'queue'), for code that needs real OS threads"""
+    if is_green():
+        return patcher.original(module_name)
+    return importlib.import_module(module_name)
@@ -0,0 +1,15 @@
+"""
+Production entrypoint.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+See gunicorn.conf.py for workers, recycling, reloads and the Socket.IO
+message queue. `python app.py` remains the single-process development server.
+"""
+
+# app must be the first project import: it monkey-patches eventlet and loads
+# backend/.env before extensions, services and routes read their settings
+# (SOCKETIO_MESSAGE_QUEUE, rate limits, ...) at import time
+from app import create_app
+
+app = create_app()
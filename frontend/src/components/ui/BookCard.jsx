@@ -22,7 +22,7 @@ const BookCard = ({
     author: Array.isArray(book.authors)
       ? book.authors.map((author) => author.name || author).join(", ")
       : book.authors || "Unknown author",
-    cover_image: book.cover_image || "/default-cover.webp",
+    cover_image: book.cover_thumbnail || book.cover_image || "/default-cover.webp",
     view_count: book.view_count || 0,
     avg_rating: book.avg_rating || 0,
     category: book.category?.name || book.category_name || "Uncategorized",
@@ -78,7 +78,7 @@ const Search = ({ className, placeholder = "Dive into knowledge..." }) => {
         id: book.id,
         title: book.title,
         authors: book.authors || [],
-        cover_image: book.cover_image,
+        cover_image: book.cover_thumbnail || book.cover_image,
         rating: typeof book.rating === 'number' 
           ? book.rating 
           : (book.rating?.average || 0),
@@ -12,6 +12,7 @@ class MessageService {
     this.maxReconnectAttempts = 5;
     this.isJoiningRoom = false; // Flag to prevent duplicate joins
     this.joinRoomQueue = null; // Queue for pending join operations
+    this.typingSnapshots = new Map(); // room_id -> Map(user_id -> username)
   }
 
   on(event, callback) {
@@ -152,6 +153,8 @@ class MessageService {
     this.socket.off('message_deleted');
     this.socket.off('message_updated');
     this.socket.off('user_typing');
+    this.socket.off('typing_users');
+    this.socket.off('presence_update');
     this.socket.off('room_invitation');
     this.socket.off('member_joined');
     this.socket.off('user_online');
@@ -227,6 +230,22 @@ class MessageService {
       this.emit('user_typing', data);
     });
 
+    // ✅ Server coalesces typing into one snapshot per room per tick -
+    // fan it out locally as start/stop user_typing events
+    this.socket.on('typing_users', (data) => {
+      const previous = this.typingSnapshots.get(data.room_id) || new Map();
+      const current = new Map(data.users.map((u) => [u.user_id, u.username]));
+      current.forEach((username, userId) => {
+        this.emit('user_typing', { room_id: data.room_id, user_id: userId, username, is_typing: true });
+      });
+      previous.forEach((username, userId) => {
+        if (!current.has(userId)) {
+          this.emit('user_typing', { room_id: data.room_id, user_id: userId, username, is_typing: false });
+        }
+      });
+      this.typingSnapshots.set(data.room_id, current);
+    });
+
     // ✅ Listen for room invitation
     this.socket.on('room_invitation', (data) => {
       console.log('📬 Room invitation received:', data);
@@ -248,6 +267,12 @@ class MessageService {
       this.emit('user_offline', data);
     });
 
+    // ✅ Presence changes arrive batched per tick
+    this.socket.on('presence_update', (data) => {
+      data.online.forEach((u) => this.emit('user_online', { ...u, room_id: data.room_id, timestamp: data.timestamp }));
+      data.offline.forEach((u) => this.emit('user_offline', { ...u, room_id: data.room_id, timestamp: data.timestamp }));
+    });
+
     this.socket.on('error', (data) => {
       console.error('❌ Socket error:', data);
       this.emit('error', data);
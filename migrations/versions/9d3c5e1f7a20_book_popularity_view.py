@@ -0,0 +1,43 @@
+"""book popularity materialized view
+
+Revision ID: 9d3c5e1f7a20
+Revises: 4e7b0a9d2f15
+Create Date: 2026-10-19 12:52:09.631875
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3c5e1f7a20'
+down_revision = '4e7b0a9d2f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # view_history.viewed_at is a naive UTC timestamp
+    op.execute("""
+        CREATE MATERIALIZED VIEW book_popularity AS
+        SELECT
+            b.id AS book_id,
+            COUNT(v.id) FILTER (WHERE v.viewed_at >= (now() AT TIME ZONE 'utc') - interval '24 hours')::int AS views_24h,
+            COUNT(DISTINCT v.user_id) FILTER (WHERE v.viewed_at >= (now() AT TIME ZONE 'utc') - interval '24 hours')::int AS viewers_24h,
+            COUNT(v.id) FILTER (WHERE v.viewed_at >= (now() AT TIME ZONE 'utc') - interval '7 days')::int AS views_7d,
+            COUNT(DISTINCT v.user_id) FILTER (WHERE v.viewed_at >= (now() AT TIME ZONE 'utc') - interval '7 days')::int AS viewers_7d,
+            COUNT(v.id)::int AS views_all,
+            COUNT(DISTINCT v.user_id)::int AS viewers_all,
+            (now() AT TIME ZONE 'utc') AS refreshed_at
+        FROM books b
+        LEFT JOIN view_history v ON v.book_id = b.id
+        GROUP BY b.id
+    """)
+    # Unique index is required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.execute("CREATE UNIQUE INDEX idx_book_popularity_book_id ON book_popularity (book_id)")
+    op.execute("CREATE INDEX idx_book_popularity_views_24h ON book_popularity (views_24h DESC)")
+    op.execute("CREATE INDEX idx_book_popularity_views_7d ON book_popularity (views_7d DESC)")
+
+
+def downgrade():
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS book_popularity")
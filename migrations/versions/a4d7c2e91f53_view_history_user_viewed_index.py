@@ -0,0 +1,31 @@
+"""view history user viewed index
+
+Revision ID: a4d7c2e91f53
+Revises: 3f8b1d6c9e24
+Create Date: 2026-10-19 20:14:37.602118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d7c2e91f53'
+down_revision = '3f8b1d6c9e24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Serves the history lists: WHERE user_id = ? [AND viewed_at range]
+    # with DISTINCT ON (book_id), index-only
+    op.create_index(
+        'idx_view_history_user_viewed_book',
+        'view_history',
+        ['user_id', sa.text('viewed_at DESC'), 'book_id'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('idx_view_history_user_viewed_book', table_name='view_history')
@@ -0,0 +1,195 @@
+"""partition view history by month
+
+Revision ID: b8e2f4a61c07
+Revises: a4d7c2e91f53
+Create Date: 2026-10-19 21:03:52.418207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2f4a61c07'
+down_revision = 'a4d7c2e91f53'
+branch_labels = None
+depends_on = None
+
+# Partitions created ahead of the current month here; afterwards the
+# view_history_maintenance job keeps VIEW_HISTORY_PARTITIONS_AHEAD months ready
+MONTHS_AHEAD = 3
+
+# book_popularity reads view_history, so it is recreated around the swap.
+# views_all adds the compacted per-day views; viewers_all counts distinct
+# viewers over the retained (uncompacted) rows.
+BOOK_POPULARITY_PARTITIONED = """
+    CREATE MATERIALIZED VIEW book_popularity AS
+    SELECT
+        b.id AS book_id,
+        COALESCE(v.views_24h, 0) AS views_24h,
+        COALESCE(v.viewers_24h, 0) AS viewers_24h,
+        COALESCE(v.views_7d, 0) AS views_7d,
+        COALESCE(v.viewers_7d, 0) AS viewers_7d,
+        (COALESCE(v.views_all, 0) + COALESCE(d.views, 0))::int AS views_all,
+        COALESCE(v.viewers_all, 0) AS viewers_all,
+        (now() AT TIME ZONE 'utc') AS refreshed_at
+    FROM books b
+    LEFT JOIN (
+        SELECT
+            book_id,
+            COUNT(*) FILTER (WHERE viewed_at >= (now() AT TIME ZONE 'utc') - interval '24 hours')::int AS views_24h,
+            COUNT(DISTINCT user_id) FILTER (WHERE viewed_at >= (now() AT TIME ZONE 'utc') - interval '24 hours')::int AS viewers_24h,
+            COUNT(*) FILTER (WHERE viewed_at >= (now() AT TIME ZONE 'utc') - interval '7 days')::int AS views_7d,
+            COUNT(DISTINCT user_id) FILTER (WHERE viewed_at >= (now() AT TIME ZONE 'utc') - interval '7 days')::int AS viewers_7d,
+            COUNT(*)::int AS views_all,
+            COUNT(DISTINCT user_id)::int AS viewers_all
+        FROM view_history
+        GROUP BY book_id
+    ) v ON v.book_id = b.id
+    LEFT JOIN (
+        SELECT book_id, SUM(views) AS views
+        FROM view_history_daily
+        GROUP BY book_id
+    ) d ON d.book_id = b.id
+"""
+
+# As created by 9d3c5e1f7a20
+BOOK_POPULARITY_ORIGINAL = """
+    CREATE MATERIALIZED VIEW book_popularity AS
+    SELECT
+        b.id AS book_id,
+        COUNT(v.id) FILTER (WHERE v.viewed_at >= (now() AT TIME ZONE 'utc') - interval '24 hours')::int AS views_24h,
+        COUNT(DISTINCT v.user_id) FILTER (WHERE v.viewed_at >= (now() AT TIME ZONE 'utc') - interval '24 hours')::int AS viewers_24h,
+        COUNT(v.id) FILTER (WHERE v.viewed_at >= (now() AT TIME ZONE 'utc') - interval '7 days')::int AS views_7d,
+        COUNT(DISTINCT v.user_id) FILTER (WHERE v.viewed_at >= (now() AT TIME ZONE 'utc') - interval '7 days')::int AS viewers_7d,
+        COUNT(v.id)::int AS views_all,
+        COUNT(DISTINCT v.user_id)::int AS viewers_all,
+        (now() AT TIME ZONE 'utc') AS refreshed_at
+    FROM books b
+    LEFT JOIN view_history v ON v.book_id = b.id
+    GROUP BY b.id
+"""
+
+
+def _create_book_popularity(definition):
+    op.execute(definition)
+    # Unique index is required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.execute("CREATE UNIQUE INDEX idx_book_popularity_book_id ON book_popularity (book_id)")
+    op.execute("CREATE INDEX idx_book_popularity_views_24h ON book_popularity (views_24h DESC)")
+    op.execute("CREATE INDEX idx_book_popularity_views_7d ON book_popularity (views_7d DESC)")
+
+
+def _create_view_history_indexes():
+    op.create_index('idx_view_history_viewed_at', 'view_history', ['viewed_at'], unique=False)
+    op.create_index(
+        'idx_view_history_user_viewed_book',
+        'view_history',
+        ['user_id', sa.text('viewed_at DESC'), 'book_id'],
+        unique=False
+    )
+
+
+def upgrade():
+    op.create_table('view_history_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('views', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('viewers', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('day', 'book_id')
+    )
+    op.create_index('idx_view_history_daily_book_id_day', 'view_history_daily', ['book_id', 'day'], unique=False)
+
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS book_popularity")
+
+    # Keep the id sequence: detach it from the old table before that is dropped
+    op.execute("ALTER TABLE view_history RENAME TO view_history_unpartitioned")
+    op.execute("ALTER SEQUENCE view_history_id_seq OWNED BY NONE")
+
+    op.execute("""
+        CREATE TABLE view_history (
+            id integer NOT NULL DEFAULT nextval('view_history_id_seq'),
+            user_id integer NOT NULL REFERENCES users (id),
+            book_id integer NOT NULL REFERENCES books (id),
+            viewed_at timestamp without time zone NOT NULL
+        ) PARTITION BY RANGE (viewed_at)
+    """)
+    # One partition per month from the oldest view to MONTHS_AHEAD months out
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month date;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', COALESCE(
+                        (SELECT min(viewed_at) FROM view_history_unpartitioned),
+                        now() AT TIME ZONE 'utc'
+                    )),
+                    date_trunc('month', now() AT TIME ZONE 'utc') + interval '{MONTHS_AHEAD} months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF view_history FOR VALUES FROM (%L) TO (%L)',
+                    'view_history_p' || to_char(month, 'YYYY_MM'), month, (month + interval '1 month')::date
+                );
+            END LOOP;
+        END $$
+    """)
+    # Catches rows outside the monthly partitions (clock skew, job not running)
+    op.execute("CREATE TABLE view_history_default PARTITION OF view_history DEFAULT")
+
+    # viewed_at has always been set by the model default; rows without one
+    # cannot be placed in a partition and are not carried over
+    op.execute("""
+        INSERT INTO view_history (id, user_id, book_id, viewed_at)
+        SELECT id, user_id, book_id, viewed_at
+        FROM view_history_unpartitioned
+        WHERE viewed_at IS NOT NULL
+    """)
+    op.execute("DROP TABLE view_history_unpartitioned")
+    op.execute("ALTER SEQUENCE view_history_id_seq OWNED BY view_history.id")
+
+    # Keys must include the partition key
+    op.execute("ALTER TABLE view_history ADD CONSTRAINT view_history_pkey PRIMARY KEY (id, viewed_at)")
+    op.execute("ALTER TABLE view_history ADD CONSTRAINT unique_user_book_view UNIQUE (user_id, book_id, viewed_at)")
+    _create_view_history_indexes()
+
+    _create_book_popularity(BOOK_POPULARITY_PARTITIONED)
+
+
+def downgrade():
+    # Compacted per-day aggregates cannot be expanded back into views
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS book_popularity")
+
+    op.execute("ALTER TABLE view_history RENAME TO view_history_partitioned")
+    op.execute("ALTER TABLE view_history_partitioned DROP CONSTRAINT view_history_pkey")
+    op.execute("ALTER TABLE view_history_partitioned DROP CONSTRAINT unique_user_book_view")
+    op.execute("DROP INDEX idx_view_history_viewed_at")
+    op.execute("DROP INDEX idx_view_history_user_viewed_book")
+    op.execute("ALTER SEQUENCE view_history_id_seq OWNED BY NONE")
+
+    op.execute("""
+        CREATE TABLE view_history (
+            id integer NOT NULL DEFAULT nextval('view_history_id_seq'),
+            user_id integer NOT NULL REFERENCES users (id),
+            book_id integer NOT NULL REFERENCES books (id),
+            viewed_at timestamp without time zone,
+            CONSTRAINT view_history_pkey PRIMARY KEY (id),
+            CONSTRAINT unique_user_book_view UNIQUE (user_id, book_id, viewed_at)
+        )
+    """)
+    op.execute("""
+        INSERT INTO view_history (id, user_id, book_id, viewed_at)
+        SELECT id, user_id, book_id, viewed_at
+        FROM view_history_partitioned
+    """)
+    op.execute("DROP TABLE view_history_partitioned")
+    op.execute("ALTER SEQUENCE view_history_id_seq OWNED BY view_history.id")
+    _create_view_history_indexes()
+
+    _create_book_popularity(BOOK_POPULARITY_ORIGINAL)
+
+    op.drop_index('idx_view_history_daily_book_id_day', table_name='view_history_daily')
+    op.drop_table('view_history_daily')
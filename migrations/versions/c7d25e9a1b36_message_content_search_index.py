@@ -0,0 +1,31 @@
+"""message content search index
+
+Revision ID: c7d25e9a1b36
+Revises: 8b41e6d0c5a2
+Create Date: 2026-10-19 11:26:53.904118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d25e9a1b36'
+down_revision = '8b41e6d0c5a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Expression must match Message.search_vector() for the planner to use it
+    op.create_index(
+        'idx_message_content_tsv',
+        'messages',
+        [sa.text("to_tsvector('simple', coalesce(content, ''))")],
+        unique=False,
+        postgresql_using='gin'
+    )
+
+
+def downgrade():
+    op.drop_index('idx_message_content_tsv', table_name='messages', postgresql_using='gin')